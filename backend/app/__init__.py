@@ -24,6 +24,9 @@ def get_db():
     return db
 
 def create_app(config_class=Config):
+    from app.services.logging_service import configure_logging
+    configure_logging()
+
     app = Flask(__name__)
     app.config.from_object(config_class)
     
@@ -62,7 +65,8 @@ def create_app(config_class=Config):
         db = mongo.db
 
     # Initialize other extensions
-    socketio.init_app(app, cors_allowed_origins="*")
+    from app.socket_queue import get_socketio_options
+    socketio.init_app(app, cors_allowed_origins="*", **get_socketio_options(app, socketio))
     jwt.init_app(app) 
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     
@@ -75,6 +79,7 @@ def create_app(config_class=Config):
     from app.api.webhook import webhook_bp
     from app.api.investment import investment_bp
     from app.api.admin import admin_bp
+    from app.api.exports import exports_bp
     from app.api.dashboard import dashboard_bp
     from app.api.test import test_bp
     from app.api.moralis import moralis_bp
@@ -87,6 +92,7 @@ def create_app(config_class=Config):
     app.register_blueprint(webhook_bp, url_prefix='/api/webhook')
     app.register_blueprint(investment_bp, url_prefix='/api/investment')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(exports_bp, url_prefix='/api/admin/export')
     app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
     app.register_blueprint(test_bp, url_prefix='/api/test')
     app.register_blueprint(moralis_bp)  # url_prefix already defined in blueprint
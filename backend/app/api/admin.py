@@ -3,8 +3,14 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from functools import wraps
 import os
+import re
 from datetime import datetime
 from bson.objectid import ObjectId
+from app.api.pagination import (
+    keyset_page, keyset_seek, keyset_sort, trim_page, cached_count, wants_total, InvalidCursorError
+)
+from app.models.platform_counters import PlatformCounters
+from app.services.aggregation import lookup_eq
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -21,7 +27,7 @@ def admin_required(f):
         
         # Check if user is admin
         from app import db
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"role": 1})
         
         if not user or user.get('role') != 'admin':
             return jsonify({
@@ -40,6 +46,8 @@ def get_users_with_sponsor_ids():
     """
     Get all users with their properly formatted sponsor IDs
     Returns users sorted by sponsor_id by default
+    
+    Optional filters: sponsor_id, email_prefix, created_from, created_to (ISO dates)
     """
     try:
         from app import db
@@ -49,19 +57,63 @@ def get_users_with_sponsor_ids():
         sort_order = request.args.get('sort_order', 'asc')   # Default ascending order
         limit = request.args.get('limit', 100, type=int)     # Default limit 100 users
         page = request.args.get('page', 1, type=int)         # Default page 1
+        cursor = request.args.get('cursor')                  # Continuation token (keyset pagination)
         
         # Build query with sorting
         sort_direction = 1 if sort_order.lower() == 'asc' else -1
         sort_field = sort_by if sort_by in ['sponsor_id', 'created_at'] else '_id'
         
-        # Calculate skip value for pagination
-        skip = (page - 1) * limit
+        # Optional server-side filters (all backed by users indexes)
+        match = {}
+        if request.args.get('sponsor_id'):
+            match['sponsor_id'] = request.args.get('sponsor_id').strip()
+        if request.args.get('email_prefix'):
+            # Anchored, case-sensitive prefix so the email index can be used
+            match['email'] = {'$regex': f"^{re.escape(request.args.get('email_prefix').strip())}"}
+        created_range = {}
+        for param, op in (('created_from', '$gte'), ('created_to', '$lte')):
+            if request.args.get(param):
+                try:
+                    created_range[op] = datetime.fromisoformat(request.args.get(param))
+                except ValueError:
+                    return jsonify({'success': False, 'message': f"Invalid {param}, expected ISO date"}), 400
+        if created_range:
+            match['created_at'] = created_range
+        
+        # Keyset pagination seeks from the cursor instead of skipping rows.
+        # A page number without a cursor is still honoured for older clients.
+        use_keyset = bool(cursor) or page <= 1
+        seek = keyset_seek(cursor, sort_field, sort_direction) if use_keyset else {}
+        page_match = {'$and': [match, seek]} if match and seek else (match or seek)
+        
+        # One aggregation joins each user to its referral_tree entry and referrer
+        # instead of two find_one calls per listed user
+        pipeline = [
+            {'$match': page_match},
+            {'$sort': dict(keyset_sort(sort_field, sort_direction))}
+        ]
+        if not use_keyset:
+            pipeline.append({'$skip': (page - 1) * limit})
+        pipeline += [
+            {'$limit': limit + 1 if use_keyset else limit},
+            {'$project': {'sponsor_id': 1, 'user_name': 1, 'email': 1, 'created_at': 1, 'balance': 1}},
+            lookup_eq('referral_tree', '_id', 'user_id', 'referral', project={'_id': 0, 'referrer_id': 1}),
+            # referrer_id is stored as ObjectId, but older rows may hold a string
+            {'$addFields': {'referrer_id': {'$let': {
+                'vars': {'rid': {'$arrayElemAt': ['$referral.referrer_id', 0]}},
+                'in': {'$convert': {'input': '$$rid', 'to': 'objectId', 'onError': '$$rid', 'onNull': None}}
+            }}}},
+            lookup_eq('users', 'referrer_id', '_id', 'referrer', project={'sponsor_id': 1, 'user_name': 1}),
+            {'$project': {'referral': 0, 'referrer_id': 0}}
+        ]
+        users = list(db.users.aggregate(pipeline))
         
-        # Query MongoDB with pagination
-        users = list(db.users.find().sort(sort_field, sort_direction).skip(skip).limit(limit))
+        next_cursor = None
+        if use_keyset:
+            users, next_cursor = trim_page(users, limit, sort_field)
         
-        # Get total count for pagination
-        total_users = db.users.count_documents({})
+        # Total count is optional and cached
+        total_users = cached_count(db.users, match) if wants_total(request.args) else None
         
         # Format user data with proper sponsor IDs
         formatted_users = []
@@ -69,22 +121,15 @@ def get_users_with_sponsor_ids():
             # Ensure sponsor_id is properly formatted (AL0000001 format)
             sponsor_id = user.get('sponsor_id') if user.get('sponsor_id') else f"AL{str(user.get('_id')).zfill(7)}"
             
-            # Get referrer information if available
+            # Referrer information joined by the pipeline
             referrer = None
-            referral_entry = db.referral_tree.find_one({"user_id": user.get('_id')})
-            
-            if referral_entry and referral_entry.get('referrer_id'):
-                referrer_id = referral_entry.get('referrer_id')
-                if isinstance(referrer_id, str) and ObjectId.is_valid(referrer_id):
-                    referrer_id = ObjectId(referrer_id)
-                
-                referrer_user = db.users.find_one({"_id": referrer_id})
-                if referrer_user:
-                    referrer = {
-                        'id': str(referrer_user.get('_id')),
-                        'sponsor_id': referrer_user.get('sponsor_id') or f"AL{str(referrer_user.get('_id')).zfill(7)}",
-                        'name': referrer_user.get('user_name')
-                    }
+            if user.get('referrer'):
+                referrer_user = user['referrer'][0]
+                referrer = {
+                    'id': str(referrer_user.get('_id')),
+                    'sponsor_id': referrer_user.get('sponsor_id') or f"AL{str(referrer_user.get('_id')).zfill(7)}",
+                    'name': referrer_user.get('user_name')
+                }
             
             # Format basic user data
             user_data = {
@@ -100,7 +145,7 @@ def get_users_with_sponsor_ids():
             formatted_users.append(user_data)
         
         # Calculate pagination info
-        total_pages = (total_users + limit - 1) // limit  # Ceiling division
+        total_pages = (total_users + limit - 1) // limit if total_users is not None else None  # Ceiling division
         
         # Return formatted response with pagination info
         return jsonify({
@@ -110,10 +155,14 @@ def get_users_with_sponsor_ids():
                 'total_items': total_users,
                 'total_pages': total_pages,
                 'current_page': page,
-                'per_page': limit
+                'per_page': limit,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None if use_keyset else None
             }
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Error fetching users with sponsor IDs: {str(e)}")
         return jsonify({
@@ -133,62 +182,19 @@ def admin_dashboard():
         from app import db
         
         # Check if user is admin
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
         
-        # Get system statistics
-        total_users = db.users.count_documents({})
-        active_users = db.users.count_documents({"is_active": True})
-        total_investments = db.user_investments.count_documents({})
-        
-        # Aggregate sum of investment amounts
-        investment_pipeline = [
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]
-        investment_result = list(db.user_investments.aggregate(investment_pipeline))
-        total_investment_amount = investment_result[0]['total'] if investment_result else 0
-        
-        # Aggregate sum of earnings
-        earnings_pipeline = [
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]
-        earnings_result = list(db.user_earnings.aggregate(earnings_pipeline))
-        total_earnings = earnings_result[0]['total'] if earnings_result else 0
-        
-        # Current cycle status
-        current_cycle = db.bid_cycles.find_one({}, sort=[("_id", -1)])
-        
-        # Pending withdrawals
-        pending_withdrawals = db.withdrawals.count_documents({"withdrawal_status": "pending"})
-        
-        # Aggregate sum of pending withdrawal amounts
-        withdrawal_pipeline = [
-            {"$match": {"withdrawal_status": "pending"}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]
-        withdrawal_result = list(db.withdrawals.aggregate(withdrawal_pipeline))
-        pending_withdrawal_amount = withdrawal_result[0]['total'] if withdrawal_result else 0
+        # Served from the precomputed snapshot (refreshed by the scheduler)
+        # instead of counting and aggregating whole collections per request
+        snapshot = PlatformCounters.get_snapshot()
         
         return jsonify({
             'success': True,
-            'statistics': {
-                'total_users': total_users,
-                'active_users': active_users,
-                'total_investments': total_investments,
-                'total_investment_amount': float(total_investment_amount),
-                'total_earnings_distributed': float(total_earnings),
-                'pending_withdrawals': pending_withdrawals,
-                'pending_withdrawal_amount': float(pending_withdrawal_amount),
-                'current_cycle': {
-                    'id': str(current_cycle.get('_id')) if current_cycle else None,
-                    'date': current_cycle.get('cycle_date').strftime('%Y-%m-%d') if current_cycle and current_cycle.get('cycle_date') else None,
-                    'status': current_cycle.get('cycle_status') if current_cycle else None,
-                    'filled': current_cycle.get('bids_filled') if current_cycle else 0,
-                    'total': current_cycle.get('total_bids_allowed') if current_cycle else 0
-                }
-            }
+            'statistics': snapshot['statistics'],
+            'generated_at': snapshot['generated_at'].isoformat()
         }), 200
     
     except Exception as e:
@@ -206,7 +212,7 @@ def get_users():
         from app import db
         
         # Check if user is admin
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -214,16 +220,21 @@ def get_users():
         # Get all users with pagination
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
         
-        # Calculate skip for pagination
-        skip = (page - 1) * per_page
+        # Keyset pagination on _id; plain page numbers still work for older clients
+        next_cursor = None
+        if cursor or page <= 1:
+            users, next_cursor = keyset_page(db.users, {}, '_id', 1, per_page, cursor)
+        else:
+            skip = (page - 1) * per_page
+            users = list(db.users.find().sort('_id', 1).skip(skip).limit(per_page))
         
-        # Get users with pagination
-        users = list(db.users.find().skip(skip).limit(per_page))
-        total = db.users.count_documents({})
+        # Total count is optional and cached
+        total = cached_count(db.users) if wants_total(request.args) else None
         
         # Calculate total pages
-        total_pages = (total + per_page - 1) // per_page
+        total_pages = (total + per_page - 1) // per_page if total is not None else None
         
         # Convert user documents to dictionaries for JSON serialization
         user_dicts = []
@@ -242,9 +253,12 @@ def get_users():
             'users': user_dicts,
             'total': total,
             'pages': total_pages,
-            'current_page': page
+            'current_page': page,
+            'next_cursor': next_cursor
         }), 200
     
+    except InvalidCursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -262,7 +276,7 @@ def get_pending_withdrawals():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -298,6 +312,83 @@ def get_pending_withdrawals():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@admin_bp.route('/reconciliation', methods=['GET'])
+@jwt_required()
+def get_reconciliation_report():
+    """Latest balance reconciliation run and its largest discrepancies"""
+    try:
+        # Check if user is admin
+        current_user_id = get_jwt_identity()['id']
+        if isinstance(current_user_id, str) and ObjectId.is_valid(current_user_id):
+            current_user_id = ObjectId(current_user_id)
+        
+        from app import db
+        from app.services.reconciliation_service import latest_report
+        
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
+        
+        if not user or not user.get('is_admin'):
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+        
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        report = latest_report(limit)
+        
+        run = report['run']
+        if run:
+            run = {
+                'id': str(run['_id']),
+                'status': run.get('status'),
+                'users_checked': run.get('users_checked', 0),
+                'discrepancies': run.get('discrepancies', 0),
+                'started_at': run['started_at'].isoformat() if run.get('started_at') else None,
+                'finished_at': run['finished_at'].isoformat() if run.get('finished_at') else None
+            }
+        
+        discrepancies = [{
+            'user_id': str(d['user_id']),
+            'sponsor_id': d.get('sponsor_id'),
+            'balance': d.get('balance'),
+            'expected': d.get('expected'),
+            'difference': d.get('difference'),
+            'components': d.get('components', {}),
+            'detected_at': d['detected_at'].isoformat() if d.get('detected_at') else None
+        } for d in report['discrepancies']]
+        
+        return jsonify({
+            'success': True,
+            'run': run,
+            'discrepancies': discrepancies
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@admin_bp.route('/pending-transactions/stats', methods=['GET'])
+@jwt_required()
+def get_pending_transaction_stats():
+    """Payment queue depth, per-status counts and claim latency"""
+    try:
+        # Check if user is admin
+        current_user_id = get_jwt_identity()['id']
+        if isinstance(current_user_id, str) and ObjectId.is_valid(current_user_id):
+            current_user_id = ObjectId(current_user_id)
+        
+        from app import db
+        from app.models.pending_transaction import PendingTransaction
+        
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
+        
+        if not user or not user.get('is_admin'):
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+        
+        return jsonify({
+            'success': True,
+            'stats': PendingTransaction.queue_stats()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @admin_bp.route('/withdrawals/process/<withdrawal_id>', methods=['POST'])
 @jwt_required()
 def process_withdrawal(withdrawal_id):
@@ -310,7 +401,7 @@ def process_withdrawal(withdrawal_id):
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -353,6 +444,7 @@ def process_withdrawal(withdrawal_id):
                 }
             }
         )
+        PlatformCounters.record_withdrawal_status_change(withdrawal.get('amount'), 'pending', 'processed')
         
         return jsonify({
             'success': True,
@@ -376,7 +468,7 @@ def reject_withdrawal(withdrawal_id):
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -389,35 +481,33 @@ def reject_withdrawal(withdrawal_id):
         if ObjectId.is_valid(withdrawal_id):
             withdrawal_id = ObjectId(withdrawal_id)
             
-        withdrawal = db.withdrawals.find_one({"_id": withdrawal_id})
+        # Claim the pending withdrawal first so a repeated request cannot refund twice
+        withdrawal = db.withdrawals.find_one_and_update(
+            {"_id": withdrawal_id, "withdrawal_status": "pending"},
+            {
+                "$set": {
+                    "withdrawal_status": "rejected",
+                    "processed_at": datetime.utcnow()
+                }
+            }
+        )
         
         if not withdrawal:
-            return jsonify({'success': False, 'message': 'Withdrawal not found'}), 404
-            
-        if withdrawal.get('withdrawal_status') != 'pending':
-            return jsonify({'success': False, 'message': f'Withdrawal is already {withdrawal.get("withdrawal_status")}'}, 400)
+            existing = db.withdrawals.find_one({"_id": withdrawal_id}, {"withdrawal_status": 1})
+            if not existing:
+                return jsonify({'success': False, 'message': 'Withdrawal not found'}), 404
+            return jsonify({'success': False, 'message': f'Withdrawal is already {existing.get("withdrawal_status")}'}), 400
         
         # Get user
         user_id = withdrawal.get('user_id')
         if isinstance(user_id, str) and ObjectId.is_valid(user_id):
             user_id = ObjectId(user_id)
             
-        # Update user's balance
-        db.users.update_one(
-            {"_id": user_id},
-            {"$inc": {"balance": withdrawal.get('amount')}}
-        )
+        # Return the funds to the user's balance
+        from app.models.ledger import Ledger
+        Ledger.credit(user_id, withdrawal.get('amount'), 'withdrawal_refund', reference=withdrawal_id)
         
-        # Update withdrawal status
-        db.withdrawals.update_one(
-            {"_id": withdrawal_id},
-            {
-                "$set": {
-                    "withdrawal_status": "rejected",
-                    "processed_at": datetime.utcnow()
-                }
-            }
-        )
+        PlatformCounters.record_withdrawal_status_change(withdrawal.get('amount'), 'pending', 'rejected')
         
         # Add activity log
         activity = {
@@ -450,7 +540,7 @@ def distribute_daily_returns():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -488,7 +578,7 @@ def calculate_team_rewards():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -499,11 +589,13 @@ def calculate_team_rewards():
         
         # Get all users with sufficient active legs
         from app.services.system_service import get_system_setting
+        from app.models.team_rewards import TeamReward
+        from app.services.team_reward_evaluator import load_candidates, evaluate_rank_rewards, apply_team_rewards
         
         min_legs = int(get_system_setting('min_legs_for_reward', 5))
-        eligible_legs = list(db.user_legs.find({"active_legs": {"$gte": min_legs}}))
+        candidates = load_candidates(db, min_legs)
         
-        if not eligible_legs:
+        if not len(candidates):
             return jsonify({
                 'success': True,
                 'message': 'No users with sufficient active legs found',
@@ -511,7 +603,7 @@ def calculate_team_rewards():
             }), 200
         
         # Get team reward levels from database
-        reward_levels = list(db.team_rewards.find({"is_active": 1}).sort("business_volume", 1))
+        reward_levels = TeamReward.payout_levels()
         
         if not reward_levels:
             return jsonify({
@@ -519,63 +611,12 @@ def calculate_team_rewards():
                 'message': 'No active reward levels defined'
             }), 400
         
-        # Process each eligible user
-        processed_count = 0
-        failed_count = 0
-        total_amount = 0
-        
-        for legs in eligible_legs:
-            try:
-                user_id = legs.get('user_id')
-                if isinstance(user_id, str) and ObjectId.is_valid(user_id):
-                    user_id = ObjectId(user_id)
-                
-                # Get user's business volume
-                business = db.team_business.find_one({"user_id": user_id})
-                
-                if not business:
-                    continue
-                
-                # Find matching reward level
-                reward_level = None
-                for level in sorted(reward_levels, key=lambda x: x.get('business_volume', 0), reverse=True):
-                    if business.get('business_volume', 0) >= level.get('business_volume', 0):
-                        reward_level = level
-                        break
-                
-                if not reward_level:
-                    continue
-                
-                # Check if current rank is different from calculated rank
-                if business.get('current_rank_level') != reward_level.get('rank_level'):
-                    # User has reached a new rank, distribute reward
-                    result = transaction_service.process_team_reward(
-                        user_id=user_id,
-                        amount=float(reward_level.get('reward_amount')),
-                        team_level=reward_level.get('rank_level')
-                    )
-                    
-                    if result['success']:
-                        # Update rank level
-                        db.team_business.update_one(
-                            {"_id": business.get('_id')},
-                            {"$set": {"current_rank_level": reward_level.get('rank_level')}}
-                        )
-                        processed_count += 1
-                        total_amount += float(reward_level.get('reward_amount'))
-                    else:
-                        failed_count += 1
-                
-                # Update last calculated timestamp
-                db.team_business.update_one(
-                    {"_id": business.get('_id')},
-                    {"$set": {"last_calculated_at": datetime.utcnow()}}
-                )
-                
-            except Exception as e:
-                print(f"Error processing team reward for user {legs.get('user_id')}: {str(e)}")
-                failed_count += 1
-                continue
+        # Match every user to a reward level at once, then pay users whose rank changed
+        decisions = evaluate_rank_rewards(candidates, reward_levels)
+        result = apply_team_rewards(db, candidates, decisions, transaction_service)
+        processed_count = result['processed']
+        failed_count = result['failed']
+        total_amount = result['total_amount']
         
         return jsonify({
             'success': True,
@@ -600,7 +641,7 @@ def get_system_settings():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -632,7 +673,7 @@ def update_system_settings():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -654,6 +695,11 @@ def update_system_settings():
             )
             updated_settings.append(key)
         
+        # Settings that feed precomputed flags trigger a background refresh
+        from app.services.eligibility_service import on_setting_changed
+        for key in updated_settings:
+            on_setting_changed(key)
+        
         # Log the activity
         log = {
             "log_type": "settings_update",
@@ -686,7 +732,7 @@ def wallet_encryption_status():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -737,7 +783,7 @@ def encrypt_wallets():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -858,7 +904,7 @@ def rotate_encryption_keys():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -916,7 +962,7 @@ def wallet_access_logs():
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -924,16 +970,21 @@ def wallet_access_logs():
         # Parse query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
         
-        # Calculate skip for pagination
-        skip = (page - 1) * per_page
+        # Newest first, seeking on (accessed_at, _id); page numbers kept for older clients
+        next_cursor = None
+        if cursor or page <= 1:
+            logs, next_cursor = keyset_page(db.wallet_key_access_logs, {}, 'accessed_at', -1, per_page, cursor)
+        else:
+            skip = (page - 1) * per_page
+            logs = list(db.wallet_key_access_logs.find().sort([("accessed_at", -1), ("_id", -1)]).skip(skip).limit(per_page))
         
-        # Get access logs with pagination
-        logs = list(db.wallet_key_access_logs.find().sort("accessed_at", -1).skip(skip).limit(per_page))
-        total = db.wallet_key_access_logs.count_documents({})
+        # Total count is optional and cached
+        total = cached_count(db.wallet_key_access_logs) if wants_total(request.args) else None
         
         # Calculate total pages
-        total_pages = (total + per_page - 1) // per_page
+        total_pages = (total + per_page - 1) // per_page if total is not None else None
         
         # Format the logs
         formatted_logs = []
@@ -969,9 +1020,12 @@ def wallet_access_logs():
             'logs': formatted_logs,
             'total': total,
             'pages': total_pages,
-            'current_page': page
+            'current_page': page,
+            'next_cursor': next_cursor
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -987,7 +1041,7 @@ def encrypt_single_wallet(wallet_id):
         
         from app import db
         
-        user = db.users.find_one({"_id": current_user_id})
+        user = db.users.find_one({"_id": current_user_id}, {"is_admin": 1})
         
         if not user or not user.get('is_admin'):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
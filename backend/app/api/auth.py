@@ -1,8 +1,12 @@
 # app/api/auth.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db
+from app import db, socketio
+from app.services.log_sink import log_sink
 from app.models.user import User
+from app.models.platform_counters import PlatformCounters
+from app.models.team_counters import TeamCounters
+from app.services.eligibility_service import refresh_eligibility
 from app.services.auth_service import AuthService
 from datetime import datetime, timedelta
 
@@ -78,6 +82,7 @@ def register():
         "wallet_address": data['wallet_address'],  # Use the user's provided wallet address
         "security_pin": user_obj.security_pin,
         "balance": 0.00,
+        "balance_micros": 0,
         "is_active": True,
         "is_admin": False,
         "created_at": now,
@@ -86,7 +91,6 @@ def register():
         "facebook_profile": "",
         "twitter_profile": "",
         "instagram_profile": "",
-        "profile_image": None,
         # Store referrer ID directly in user document for easier access
         "referred_by": referrer.get("sponsor_id") if referrer else None
     }
@@ -94,6 +98,7 @@ def register():
     # Insert user into MongoDB
     result = db.users.insert_one(user_doc)
     user_id = result.inserted_id
+    PlatformCounters.record_user_created(is_active=user_doc["is_active"])
     
     if referrer:
         referrer_id_obj = referrer.get("_id")
@@ -111,6 +116,8 @@ def register():
         "updated_at": now
     }
     db.referral_tree.insert_one(referral_doc)
+    if referrer:
+        TeamCounters.record_member_joined(user_id)
     
     # Create user legs entry
     legs_doc = {
@@ -130,6 +137,9 @@ def register():
             {"$inc": {"total_legs": 1, "active_legs": 1}}
         )
     
+    # Leg counts changed: refresh the stored level income eligibility
+    refresh_eligibility([user_id] + ([referrer.get("_id")] if referrer else []))
+    
     # Generate Tatum.io wallet for new user automatically with retry mechanism
     # Using TatumHybridService which properly implements v3 for wallet generation
     from app.services.tatum_hybrid_service import TatumHybridService
@@ -155,7 +165,7 @@ def register():
                         "log_message": f"Failed to generate wallet for new user {user_id} after {max_retries} attempts: {error}",
                         "created_at": datetime.utcnow()
                     }
-                    db.system_logs.insert_one(log_doc)
+                    log_sink.write('system_logs', log_doc)
                     return None
                 else:
                     print(f"Successfully generated wallet {wallet.deposit_address} for user {user_id}")
@@ -181,7 +191,7 @@ def register():
                         "log_message": f"Generated wallet {wallet.deposit_address} for new user {user_id}",
                         "created_at": datetime.utcnow()
                     }
-                    db.system_logs.insert_one(log_doc)
+                    log_sink.write('system_logs', log_doc)
                     
                     # Do a final verification query to confirm success
                     verification = db.user_wallets.find_one({"user_id": user_id})
@@ -204,34 +214,16 @@ def register():
                     "log_message": f"Exception during wallet generation for user {user_id} after {max_retries} attempts: {str(e)}",
                     "created_at": datetime.utcnow()
                 }
-                db.system_logs.insert_one(log_doc)
+                log_sink.write('system_logs', log_doc)
                 return None
         return None
     
-    # Create wallet with retry
-    wallet = create_wallet_with_retry(user_id)
-    
-    # Only proceed if we successfully created a wallet
-    if not wallet:
-        # Delete the user and related records if wallet generation fails
-        db.users.delete_one({"_id": user_id})
-        db.referral_tree.delete_one({"user_id": user_id})
-        db.user_legs.delete_one({"user_id": user_id})
-        
-        # Revert the referrer's legs count if applicable
-        if referrer_id and referrer:
-            referrer_id_obj = referrer.get("_id")
-            db.user_legs.update_one(
-                {"user_id": referrer_id_obj},
-                {"$inc": {"total_legs": -1, "active_legs": -1}}
-            )
-        
-        return jsonify({
-            'success': False, 
-            'message': 'Registration failed: Could not generate Tatum.io wallet. Please try again.'
-        }), 500
+    # Create the deposit wallet in the background so registration latency no longer
+    # depends on Tatum/Moralis. /api/wallet/generate creates it on demand if this
+    # hasn't finished (or gave up) by the time the user needs a deposit address.
+    socketio.start_background_task(create_wallet_with_retry, user_id)
     
-    # Record activity now that we have the final wallet address
+    # Record registration activity
     activity_doc = {
         "user_id": user_id,
         "activity_type": "registration",
@@ -239,15 +231,15 @@ def register():
         "ip_address": request.remote_addr,
         "created_at": datetime.utcnow()
     }
-    db.user_activities.insert_one(activity_doc)
+    log_sink.write('user_activities', activity_doc)
     
     # Create system log
     log_doc = {
         "log_type": "user_registration",
-        "log_message": f"New user registered: {data['user_name']} ({data['email']}) with wallet {wallet.deposit_address}",
+        "log_message": f"New user registered: {data['user_name']} ({data['email']}), deposit wallet queued",
         "created_at": datetime.utcnow()
     }
-    db.system_logs.insert_one(log_doc)
+    log_sink.write('system_logs', log_doc)
     
     # Get the updated user document
     updated_user_doc = db.users.find_one({"_id": user_id})
@@ -287,27 +279,30 @@ def login():
         # Insert login attempt
         db.login_attempts.insert_one(login_attempt)
         
-        # Find user with wallet address - with various matching strategies
+        # Find user with wallet address - with various matching strategies.
+        # Only the fields needed to check the PIN are read until it matches.
+        from app.models.user import User
+        auth_fields = User.projection('auth')
         wallet_address = data['wallet_address'].strip()
         user_doc = None
         
         print(f"Looking up user with wallet address: {wallet_address}")
         
         # Try simple exact match first
-        user_doc = db.users.find_one({"wallet_address": wallet_address})
+        user_doc = db.users.find_one({"wallet_address": wallet_address}, auth_fields)
         
         # If not found, try case variants and prefixes
         if not user_doc:
             # Try lowercase
-            user_doc = db.users.find_one({"wallet_address": wallet_address.lower()})
+            user_doc = db.users.find_one({"wallet_address": wallet_address.lower()}, auth_fields)
             
             # Try without 0x prefix if it exists
             if not user_doc and wallet_address.startswith('0x'):
-                user_doc = db.users.find_one({"wallet_address": wallet_address[2:]})
+                user_doc = db.users.find_one({"wallet_address": wallet_address[2:]}, auth_fields)
             
             # Try with 0x prefix if it doesn't exist
             if not user_doc and not wallet_address.startswith('0x'):
-                user_doc = db.users.find_one({"wallet_address": f"0x{wallet_address}"})
+                user_doc = db.users.find_one({"wallet_address": f"0x{wallet_address}"}, auth_fields)
             
         # Debug results after all lookup attempts
         if user_doc:
@@ -323,7 +318,6 @@ def login():
             return jsonify({'success': False, 'message': 'Invalid wallet address or PIN'}), 401
             
         # User found - convert document to User model for PIN checking
-        from app.models.user import User
         user = User.from_dict(user_doc)
         print(f"User object created from document: {user is not None}")
         print(f"User ID: {user.id if user else 'None'}")
@@ -355,11 +349,14 @@ def login():
             "ip_address": request.remote_addr,
             "created_at": datetime.utcnow()
         }
-        db.user_activities.insert_one(activity)
+        log_sink.write('user_activities', activity)
         
         # Generate JWT token
         token = auth_service.generate_token(user)
         
+        # Full user (with cold fields) for the response
+        user = User.find_by_id(user.id, 'profile') or user.load_cold_fields()
+        
         # Return successful login response
         return jsonify({
             'success': True,
@@ -416,7 +413,7 @@ def get_profile():
         
         # Convert document to User model
         from app.models.user import User
-        user = User.from_dict(user_doc)
+        user = User.from_dict(user_doc).load_cold_fields()
         
         # Make sure social media fields are included in the response
         user_dict = user.to_dict()
@@ -484,7 +481,7 @@ def update_user_profile():
         
         # Get the user
         from app.models.user import User
-        user = User.find_by_id(user_id)
+        user = User.find_by_id(user_id, projection='profile')
         
         if not user:
             print(f"DEBUG - User not found for ID: {user_id}")
@@ -580,7 +577,7 @@ def update_profile_picture():
         
         # Get the user
         from app.models.user import User
-        user = User.find_by_id(user_id)
+        user = User.find_by_id(user_id, projection='profile')
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
@@ -595,36 +592,30 @@ def update_profile_picture():
         if file.filename == '':
             return jsonify({'success': False, 'message': 'No file selected'}), 400
         
-        # In production, upload to a storage service (S3, Google Cloud Storage, etc.)
-        # For this implementation, save the image as base64 in the database
-        
-        import base64
-        from io import BytesIO
+        # Resized variants are stored in GridFS; the user only keeps their image_id
+        from app.services import profile_image_service
         
-        # Read the file into memory
-        file_bytes = BytesIO()
-        file.save(file_bytes)
-        file_bytes.seek(0)
-        
-        # Convert to base64
-        encoded_image = base64.b64encode(file_bytes.read()).decode('utf-8')
-        
-        # Save with data URI scheme for direct embedding in HTML/CSS
-        file_type = file.content_type or 'image/jpeg'  # Default to jpeg if content type is not provided
-        data_uri = f"data:{file_type};base64,{encoded_image}"
+        # Read one byte past the limit so oversized uploads are rejected without reading them whole
+        data = file.stream.read(profile_image_service.MAX_UPLOAD_BYTES + 1)
+        try:
+            image_id = profile_image_service.store_profile_image(user.id, data)
+        except profile_image_service.InvalidImage as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
-        # Update user profile picture
-        user.profile_image = data_uri
+        previous_image_id = user.profile_image_id
+        user.profile_image_id = image_id
         
         # Save changes
         if user.save():
+            profile_image_service.delete_profile_image(previous_image_id)
             return jsonify({
                 'success': True,
                 'message': 'Profile picture updated successfully',
-                'profileUrl': data_uri,
+                'profileUrl': profile_image_service.profile_image_url(image_id),
                 'user': user.to_dict()
             }), 200
         else:
+            profile_image_service.delete_profile_image(image_id)
             return jsonify({'success': False, 'message': 'Failed to update profile picture'}), 500
         
     except Exception as e:
@@ -633,6 +624,34 @@ def update_profile_picture():
         print(traceback.format_exc())
         return jsonify({'success': False, 'message': f'Profile picture update error: {str(e)}'}), 500
 
+@auth_bp.route('/profile-images/<image_id>/<size>', methods=['GET'])
+def get_profile_image(image_id, size):
+    """
+    Stream a stored profile image variant
+    
+    Public so it can be used as an <img> src. Variant URLs are immutable, so
+    responses carry a long-lived Cache-Control and an ETag; a matching
+    If-None-Match is answered with 304 without reading the file.
+    """
+    from app.services import profile_image_service
+    
+    grid_file = profile_image_service.open_variant(image_id, size)
+    if grid_file is None:
+        return jsonify({'success': False, 'message': 'Image not found'}), 404
+    
+    metadata = grid_file.metadata or {}
+    etag = metadata.get('etag') or str(grid_file._id)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': profile_image_service.CACHE_CONTROL}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    
+    def generate():
+        for chunk in grid_file:
+            yield chunk
+    
+    headers['Content-Length'] = str(grid_file.length)
+    return Response(generate(), mimetype=metadata.get('content_type', 'image/jpeg'), headers=headers)
+
 @auth_bp.route('/reset-pin', methods=['POST'])
 def reset_pin():
     """
@@ -699,7 +718,7 @@ def reset_pin():
             "ip_address": request.remote_addr,
             "created_at": now
         }
-        db.user_activities.insert_one(activity)
+        log_sink.write('user_activities', activity)
         
         # In a production environment, send an email to the user with the reset link
         # Here we'll just return a success message with the token for demonstration
@@ -714,7 +733,7 @@ def reset_pin():
             "log_message": f'PIN reset requested for user {user.id} ({user.email})',
             "created_at": now
         }
-        db.system_logs.insert_one(log)
+        log_sink.write('system_logs', log)
         
         # For development: return the token in the response
         # In production: return a message asking user to check their email
@@ -808,7 +827,7 @@ def set_new_pin():
             "ip_address": request.remote_addr,
             "created_at": now
         }
-        db.user_activities.insert_one(activity)
+        log_sink.write('user_activities', activity)
         
         # System log entry using MongoDB
         log = {
@@ -816,10 +835,11 @@ def set_new_pin():
             "log_message": f'PIN reset completed for user {user.id} ({user.email})',
             "created_at": now
         }
-        db.system_logs.insert_one(log)
+        log_sink.write('system_logs', log)
         
         # Generate JWT token to immediately log in the user
         token = auth_service.generate_token(user)
+        user.load_cold_fields()
         
         return jsonify({
             'success': True,
@@ -3,6 +3,9 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.bid_cycle_service import BidCycleService
 from app import db
+from app.services.logging_service import get_logger
+
+logger = get_logger(__name__)
 
 bidding_bp = Blueprint('bidding', __name__)
 
@@ -28,7 +31,7 @@ def get_bid_status():
     local_time = timezone_aware_time.astimezone(timezone)
     
     # Log the request with timezone info
-    print(f"Bid status check at UTC: {current_time}, Local ({timezone_str}): {local_time}")
+    logger.debug("Bid status check at UTC: %s, Local (%s): %s", current_time, timezone_str, local_time)
     
     # Check if we have any open cycles first
     open_cycles = BidCycle.find_by_status('open')
@@ -61,13 +64,13 @@ def get_bid_status():
     
     # Log current settings before opening cycle
     open_time_setting = SystemSettings.get_value('bid_open_time', '08:10:00')
-    print(f"Current bid_open_time setting: {open_time_setting}")
+    logger.debug("Current bid_open_time setting: %s", open_time_setting)
     
     # If time-based cycle opening is needed, use our fixed open_cycle_if_time
     cycle = BidCycleService.open_cycle_if_time()
     
     # Log the result of the cycle status check
-    print(f"Cycle status after check: {cycle.cycle_status}, ID: {cycle.id}, Open time: {cycle.open_time}")
+    logger.debug("Cycle status after check: %s, ID: %s, Open time: %s", cycle.cycle_status, cycle.id, cycle.open_time)
     
     # Also check if we need to close it
     if cycle.cycle_status == 'open':
@@ -105,7 +108,7 @@ def purchase_unit():
         return jsonify({'success': False, 'message': 'Quantity must be positive'}), 400
         
     # Log the received data for debugging
-    print(f"Purchase request received: {data}")
+    logger.debug("Purchase request received: %s", data)
     
     # Check if bid cycle is open
     cycle = BidCycleService.open_cycle_if_time()
@@ -170,14 +173,11 @@ def purchase_unit():
                     }), 400
     
     # Check user balance
-    from app.models.user import User
     from app.models.system_settings import SystemSettings
     from app.models.user_investments import UserInvestment
     from app.models.transaction import TatumTransaction
     from app.models.pending_transaction import PendingTransaction
     
-    # Use MongoDB-compatible User.find_by_id instead of User.query.get
-    user = User.find_by_id(current_user_id)
     unit_price = float(SystemSettings.get_value('min_investment_amount', '20'))
     
     # Use amount directly from request if provided, otherwise calculate it
@@ -187,7 +187,7 @@ def purchase_unit():
         # Verify the amount matches expected calculation to prevent abuse
         expected_cost = unit_price * quantity
         if abs(total_cost - expected_cost) > 0.001:  # Allow small float precision differences
-            print(f"Warning: Amount mismatch. Received: {total_cost}, Expected: {expected_cost}")
+            logger.warning("Amount mismatch. Received: %s, Expected: %s", total_cost, expected_cost)
             # Use the expected cost instead to ensure correct pricing
             total_cost = expected_cost
     else:
@@ -220,69 +220,33 @@ def purchase_unit():
         "deposit_address": wallet_doc.get("deposit_address")
     }
     
-    # Use database balance from User model for validation
-    from decimal import Decimal
-    
-    # Directly access the balance from the user model (already fetched)
-    # Ensure proper type conversion for consistent comparison
-    
-    # Default to zero if balance is None
-    if user.balance is None:
-        print("WARNING: User balance is None, defaulting to 0")
-        user.balance = Decimal('0')
-    
-    # Convert to string then Decimal to avoid floating point precision issues
-    if isinstance(user.balance, float):
-        current_database_balance = Decimal(str(user.balance))
-    elif isinstance(user.balance, int):
-        current_database_balance = Decimal(str(user.balance))
-    elif isinstance(user.balance, str):
-        current_database_balance = Decimal(user.balance)
-    else:
-        # Already a Decimal or other type
-        current_database_balance = user.balance
-    
-    # Convert total cost to Decimal for exact comparison
-    if isinstance(total_cost, float):
-        total_cost_decimal = Decimal(str(total_cost))
-    elif isinstance(total_cost, int):
-        total_cost_decimal = Decimal(str(total_cost))
-    elif isinstance(total_cost, str):
-        total_cost_decimal = Decimal(total_cost)
-    else:
-        # Already a Decimal or other type
-        total_cost_decimal = total_cost
+    # Use database balance for validation, compared in integer micro-units
+    # to avoid floating point precision issues. This is only a fast pre-check;
+    # the ledger debit below re-checks the funds atomically.
+    from app.models.ledger import Ledger, to_micros
     
-    # Detailed logging
-    print(f"DEBUG - Database balance validation:")
-    print(f"  User ID: {current_user_id}")
-    print(f"  Original balance: {user.balance} (type: {type(user.balance)})")
-    print(f"  Normalized balance: {current_database_balance} (type: {type(current_database_balance)})")
-    print(f"  Purchase cost: {total_cost_decimal} (type: {type(total_cost_decimal)})")
-    print(f"  Has sufficient funds: {current_database_balance >= total_cost_decimal}")
+    available_balance = Ledger.balance_of(current_user_id)
+    has_funds = to_micros(available_balance) >= to_micros(total_cost)
     
-    # Use only the database balance (not blockchain)
-    available_balance = current_database_balance
+    logger.debug("Balance validation for user %s: balance %s, cost %s, sufficient: %s",
+                 current_user_id, available_balance, total_cost, has_funds)
     
     # Log that we're using only database balance for this purchase
     from app.models.system_log import SystemLog
     log = SystemLog(
         log_type='database_balance_only',
-        log_message=f"Using database balance of {current_database_balance} USDT for purchase of {total_cost_decimal} USDT"
+        log_message=f"Using database balance of {available_balance} USDT for purchase of {total_cost} USDT"
     )
     log.save()
     
-    # Check if user has sufficient balance using exact Decimal comparison
-    if available_balance < total_cost_decimal:
-        print(f"ERROR: Insufficient balance. User has {available_balance} USDT but needs {total_cost_decimal} USDT")
+    # Check if user has sufficient balance
+    if not has_funds:
+        logger.info("Insufficient balance for user %s: has %s USDT, needs %s USDT", current_user_id, available_balance, total_cost)
         return jsonify({
             'success': False, 
-            'message': f'Insufficient balance. You need {total_cost_decimal} USDT but only have {available_balance} USDT.'
+            'message': f'Insufficient balance. You need {total_cost} USDT but only have {available_balance} USDT.'
         }), 400
     
-    # If we get here, user has sufficient database balance
-    print(f"SUCCESS: Balance validation passed. User has {available_balance} USDT for purchase of {total_cost_decimal} USDT")
-    
     # Create a temporary pending transaction record to lock these funds using MongoDB
     pending_tx_data = {
         "source_wallet_id": wallet["id"],
@@ -296,8 +260,63 @@ def purchase_unit():
     pending_tx_result = db.pending_transactions.insert_one(pending_tx_data)
     pending_tx_id = pending_tx_result.inserted_id
     
+    from app.models.platform_counters import PlatformCounters
+    from app.models.team_counters import TeamCounters
+    from app.services.eligibility_service import refresh_eligibility
+    
+    # Everything applied so far, so a failed purchase can be undone before the refund
+    investment_ids = []
+    platform_counted = False
+    team_counted = 0
+    cycle_filled = False
+    rolled_back = False
+    
+    def rollback_purchase():
+        """
+        Remove the created units, their counter updates and the cycle fill,
+        then refund the cost. Runs at most once per purchase.
+        """
+        nonlocal rolled_back
+        if rolled_back:
+            return
+        rolled_back = True
+        amount = unit_price * len(investment_ids)
+        if cycle_filled:
+            db.bid_cycles.update_one({"_id": cycle.id}, {"$inc": {"bids_filled": -quantity}})
+        if investment_ids:
+            db.user_investments.delete_many({"_id": {"$in": investment_ids}})
+        if platform_counted:
+            PlatformCounters.record_investments_created(-amount, count=-len(investment_ids))
+        if team_counted:
+            TeamCounters.record_investment_activated(current_user_id, -amount)
+        if investment_ids:
+            refresh_eligibility([current_user_id])
+        Ledger.credit(current_user_id, total_cost, 'unit_purchase_refund', reference=pending_tx_id)
+    
     # Process the purchase
+    debited = False
+    overfilled = False
     try:
+        # Deduct the cost first; the funds check and deduction are one atomic update
+        new_balance = Ledger.debit(
+            current_user_id, total_cost, 'unit_purchase',
+            reference=pending_tx_id, details={'bid_cycle_id': cycle.id, 'units': quantity}
+        )
+        if new_balance is None:
+            db.pending_transactions.update_one(
+                {"_id": pending_tx_id},
+                {"$set": {
+                    "status": "failed",
+                    "error_message": "Insufficient balance",
+                    "processed_at": datetime.utcnow()
+                }}
+            )
+            return jsonify({
+                'success': False,
+                'message': f'Insufficient balance. You need {total_cost} USDT.'
+            }), 400
+        debited = True
+        
         # Create new investment records using MongoDB directly
         investments = []
         current_time = datetime.utcnow()
@@ -316,75 +335,69 @@ def purchase_unit():
             }
             investment_result = db.user_investments.insert_one(investment_data)
             investments.append({"id": investment_result.inserted_id})
+            investment_ids.append(investment_result.inserted_id)
         
-        # Update user balance - convert float to Decimal to avoid type mismatch
-        from decimal import Decimal
-        user.balance -= Decimal(str(total_cost))  # Convert via string to avoid precision issues
+        PlatformCounters.record_investments_created(unit_price * quantity, count=quantity)
+        platform_counted = True
         
-        # Ensure user.balance is never negative which would cause display issues
-        if user.balance < 0:
-            user.balance = Decimal('0')
+        team_counted = TeamCounters.record_investment_activated(current_user_id, unit_price * quantity)
         
-        # Save the updated user balance
-        user.save()
+        refresh_eligibility([current_user_id])
         
         # Update bid cycle count with final safety check
         if cycle.bids_filled + quantity <= cycle.total_bids_allowed:
             cycle.bids_filled += quantity
             cycle.save()  # Save the updated cycle
-        else:
-            # This should never happen because of our earlier checks, but it's a final failsafe
-            # For MongoDB, we don't need to rollback - we just don't make further changes
-            print(f"CRITICAL SAFETY: Prevented overfilling cycle #{cycle.id} ({cycle.bids_filled}/{cycle.total_bids_allowed})")
-            # Mark the pending transaction as failed
+            cycle_filled = True
+            
+            # Update the pending transaction to completed using MongoDB update
             db.pending_transactions.update_one(
                 {"_id": pending_tx_id},
                 {"$set": {
-                    "status": "failed",
-                    "error_message": "Prevented overfilling cycle",
+                    "status": "completed",
                     "processed_at": datetime.utcnow()
                 }}
             )
-            return jsonify({'error': 'Cannot exceed maximum allowed units for this cycle'}), 400
-            
-        # Update the pending transaction to completed using MongoDB update
+        else:
+            # Handled below, outside the try, so a later error can't roll back twice
+            overfilled = True
+    except Exception as e:
+        if debited:
+            rollback_purchase()
+        
+        # Mark the pending transaction as failed using MongoDB update
         db.pending_transactions.update_one(
             {"_id": pending_tx_id},
             {"$set": {
-                "status": "completed",
+                "status": "failed",
+                "error_message": str(e),
                 "processed_at": datetime.utcnow()
             }}
         )
-    except Exception as e:
-        # Mark the pending transaction as failed using MongoDB update
+        logger.exception("Error processing purchase: %s", e)
+        return jsonify({'success': False, 'message': f'Error processing purchase: {str(e)}'}), 500
+    
+    if overfilled:
+        # This should never happen because of our earlier checks, but it's a final failsafe
+        logger.error("Prevented overfilling cycle #%s (%s/%s)", cycle.id, cycle.bids_filled, cycle.total_bids_allowed)
+        rollback_purchase()
+        # Mark the pending transaction as failed
         db.pending_transactions.update_one(
             {"_id": pending_tx_id},
             {"$set": {
                 "status": "failed",
-                "error_message": str(e),
+                "error_message": "Prevented overfilling cycle",
                 "processed_at": datetime.utcnow()
             }}
         )
-        print(f"ERROR processing purchase: {str(e)}")
-        return jsonify({'success': False, 'message': f'Error processing purchase: {str(e)}'}), 500
+        return jsonify({'error': 'Cannot exceed maximum allowed units for this cycle'}), 400
     
     # Log successful purchase for audit trail
-    print(f"Purchase confirmed: User #{current_user_id} bought {quantity} units in cycle #{cycle.id} ({cycle.bids_filled}/{cycle.total_bids_allowed})")
-    
-    # BYPASS ISSUE: Skip user_cycles operations as they may be causing the 400 error
-    print("BYPASS ISSUE: Skipping user_cycles operations to isolate core functionality")
-    
-    # Log that we're skipping these operations for diagnostic purposes
-    print(f"Would normally update user_cycle with cycle_number={cycle.id // 5}, user_id={current_user_id}")
-    
-    # Log the BidCycleService close operation that would normally happen
-    print("Would normally check if cycle needs to be closed with BidCycleService.close_cycle_if_filled()")
-    
-    # RADICAL SIMPLIFICATION: Skip all optional operations for testing
-    print("RADICAL SIMPLIFICATION: Skipping all optional operations to isolate core functionality")
+    logger.info("Purchase confirmed: User #%s bought %s units in cycle #%s (%s/%s)",
+                current_user_id, quantity, cycle.id, cycle.bids_filled, cycle.total_bids_allowed)
     
-    # Return the simplest possible successful response
-    print("Returning ultra-simple success response")
+    # user_cycles updates and BidCycleService.close_cycle_if_filled() are
+    # intentionally skipped here; get_bid_status closes filled cycles
     
     # Return a bare minimum success response with no complex fields
     return jsonify({
@@ -447,7 +460,7 @@ def reopen_closed_cycle():
                 
     except Exception as e:
         # Note: MongoDB doesn't need transaction rollback like SQLAlchemy
-        print(f"Error reopening cycle: {str(e)}")
+        logger.error("Error reopening cycle: %s", e)
         return jsonify({
             'success': False,
             'message': f'Error reopening cycle: {str(e)}'
@@ -33,7 +33,7 @@ def get_dashboard_summary():
     
     # Get user info using MongoDB
     from app.models.user import User
-    user = User.find_by_id(current_user_id_obj)
+    user = User.find_by_id(current_user_id_obj, projection='summary')
     
     if not user:
         return jsonify({'success': False, 'message': 'User not found'}), 404
@@ -257,7 +257,7 @@ def get_top_earners():
     
     for earner in top_earners_result:
         user_id = earner['_id']
-        user = User.find_by_id(user_id)
+        user = User.find_by_id(user_id, projection='summary')
         
         if user:
             top_earners.append({
@@ -0,0 +1,282 @@
+# app/api/exports.py
+"""
+Streaming admin data exports
+
+Each export runs a single aggregation (joins done with $lookup) and yields
+rows straight from the cursor as NDJSON or CSV, so memory stays flat no
+matter how large the collection is. Pick the format with ?format=ndjson
+(default) or ?format=csv.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from bson import Decimal128
+from bson.objectid import ObjectId
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.services.aggregation import lookup_eq
+
+exports_bp = Blueprint('exports', __name__)
+
+# Documents fetched per round trip while streaming
+EXPORT_BATCH_SIZE = 500
+
+# CSV rows buffered before a chunk is written to the response
+CSV_CHUNK_ROWS = 200
+
+
+def _is_admin():
+    """Check the JWT identity belongs to an admin user"""
+    from app import db
+
+    identity = get_jwt_identity()
+    user_id = identity.get('id') if isinstance(identity, dict) else identity
+    if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+        user_id = ObjectId(user_id)
+    user = db.users.find_one({"_id": user_id}, {"is_admin": 1, "role": 1})
+    return bool(user and (user.get('is_admin') or user.get('role') == 'admin'))
+
+
+def _plain(value):
+    """Convert BSON values to JSON/CSV friendly ones"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _sponsor_id(user_id, sponsor_id):
+    """Sponsor ID in AL0000001 format, derived from the user ID if missing"""
+    if sponsor_id and str(sponsor_id).startswith('AL'):
+        return sponsor_id
+    return f"AL{str(user_id).zfill(7)}" if user_id else None
+
+
+def _lookup_user(local_field, as_field):
+    """
+    $lookup stages that attach sponsor_id/user_name of the user in ``local_field``
+    """
+    return [
+        lookup_eq('users', local_field, '_id', as_field, project={'sponsor_id': 1, 'user_name': 1, 'email': 1}),
+        {'$unwind': {'path': f'${as_field}', 'preserveNullAndEmptyArrays': True}}
+    ]
+
+
+def _as_object_id(field):
+    """Normalise an id field that older rows may hold as a string"""
+    return {'$addFields': {field: {'$convert': {
+        'input': f'${field}', 'to': 'objectId', 'onError': f'${field}', 'onNull': None
+    }}}}
+
+
+def stream_export(collection, pipeline, columns, to_row, name):
+    """
+    Stream an aggregation as NDJSON or CSV
+
+    Args:
+        collection: PyMongo collection to aggregate
+        pipeline (list): Aggregation pipeline
+        columns (list): Output field names (CSV header and row order)
+        to_row (callable): Maps a result document to a dict of columns
+        name (str): Base file name for the download
+
+    Returns:
+        Response: Streaming Flask response
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'message': 'format must be ndjson or csv'}), 400
+
+    def rows():
+        cursor = collection.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE, allowDiskUse=True)
+        try:
+            for doc in cursor:
+                row = to_row(doc)
+                yield {column: _plain(row.get(column)) for column in columns}
+        finally:
+            cursor.close()
+
+    def generate_ndjson():
+        for row in rows():
+            yield json.dumps(row, default=str) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        pending = 0
+        for row in rows():
+            writer.writerow(row)
+            pending += 1
+            if pending >= CSV_CHUNK_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+                pending = 0
+        yield buffer.getvalue()
+
+    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    if fmt == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={name}-{timestamp}.{fmt}',
+            'X-Accel-Buffering': 'no'  # Don't let a reverse proxy buffer the whole export
+        }
+    )
+
+
+def _created_range():
+    """Optional created_from/created_to (ISO dates) filter on created_at"""
+    created_range = {}
+    for param, op in (('created_from', '$gte'), ('created_to', '$lte')):
+        if request.args.get(param):
+            created_range[op] = datetime.fromisoformat(request.args.get(param))
+    return {'created_at': created_range} if created_range else {}
+
+
+@exports_bp.route('/referral-mapping', methods=['GET'])
+@jwt_required()
+def export_referral_mapping():
+    """Every user with their referrer, joined from referral_tree"""
+    if not _is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    from app import db
+
+    pipeline = [
+        {'$project': {'user_id': 1, 'referrer_id': 1, 'tree_level': 1}},
+        _as_object_id('user_id'),
+        _as_object_id('referrer_id'),
+        *_lookup_user('user_id', 'user'),
+        {'$match': {'user': {'$exists': True}}},
+        *_lookup_user('referrer_id', 'referrer')
+    ]
+
+    def to_row(doc):
+        user, referrer = doc['user'], doc.get('referrer')
+        return {
+            'user_id': user['_id'],
+            'user_sponsor_id': _sponsor_id(user['_id'], user.get('sponsor_id')),
+            'user_name': user.get('user_name'),
+            'referrer_id': referrer['_id'] if referrer else None,
+            'referrer_sponsor_id': _sponsor_id(referrer['_id'], referrer.get('sponsor_id')) if referrer else None,
+            'referrer_name': referrer.get('user_name') if referrer else None,
+            'tree_level': doc.get('tree_level')
+        }
+
+    columns = ['user_id', 'user_sponsor_id', 'user_name', 'referrer_id',
+               'referrer_sponsor_id', 'referrer_name', 'tree_level']
+    return stream_export(db.referral_tree, pipeline, columns, to_row, 'referral-mapping')
+
+
+@exports_bp.route('/users', methods=['GET'])
+@jwt_required()
+def export_users():
+    """All users (no secrets) with their referrer's sponsor ID"""
+    if not _is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    from app import db
+
+    try:
+        match = _created_range()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid created_from/created_to, expected ISO date'}), 400
+
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'_id': 1}},
+        {'$project': {'sponsor_id': 1, 'user_name': 1, 'email': 1, 'wallet_address': 1,
+                      'balance': 1, 'is_active': 1, 'is_admin': 1, 'referred_by': 1, 'created_at': 1}}
+    ]
+
+    def to_row(doc):
+        return dict(doc, id=doc['_id'], sponsor_id=_sponsor_id(doc['_id'], doc.get('sponsor_id')))
+
+    columns = ['id', 'sponsor_id', 'user_name', 'email', 'wallet_address', 'balance',
+               'is_active', 'is_admin', 'referred_by', 'created_at']
+    return stream_export(db.users, pipeline, columns, to_row, 'users')
+
+
+@exports_bp.route('/earnings', methods=['GET'])
+@jwt_required()
+def export_earnings():
+    """User earnings with the earning user's sponsor ID; filter by type/status"""
+    if not _is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    from app import db
+
+    try:
+        match = _created_range()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid created_from/created_to, expected ISO date'}), 400
+    if request.args.get('earning_type'):
+        match['earning_type'] = request.args.get('earning_type')
+    if request.args.get('earning_status'):
+        match['earning_status'] = request.args.get('earning_status')
+
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'created_at': 1}},
+        _as_object_id('user_id'),
+        *_lookup_user('user_id', 'user')
+    ]
+
+    def to_row(doc):
+        user = doc.get('user') or {}
+        return dict(doc, id=doc['_id'],
+                    sponsor_id=_sponsor_id(doc.get('user_id'), user.get('sponsor_id')),
+                    user_name=user.get('user_name'))
+
+    columns = ['id', 'user_id', 'sponsor_id', 'user_name', 'amount', 'earning_type',
+               'earning_level', 'earning_status', 'source_id', 'created_at', 'processed_at']
+    return stream_export(db.user_earnings, pipeline, columns, to_row, 'earnings')
+
+
+@exports_bp.route('/transactions', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    """Blockchain transactions with the owning user's sponsor ID; filter by type/status"""
+    if not _is_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    from app import db
+    from app.models.transaction import TatumTransaction
+
+    try:
+        match = _created_range()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid created_from/created_to, expected ISO date'}), 400
+    if request.args.get('transaction_type'):
+        match['transaction_type'] = request.args.get('transaction_type')
+    if request.args.get('status'):
+        match['status'] = request.args.get('status')
+
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'created_at': 1}},
+        _as_object_id('user_id'),
+        *_lookup_user('user_id', 'user')
+    ]
+
+    def to_row(doc):
+        user = doc.get('user') or {}
+        return dict(doc, id=doc['_id'],
+                    sponsor_id=_sponsor_id(doc.get('user_id'), user.get('sponsor_id')) if doc.get('user_id') else None)
+
+    columns = ['id', 'transaction_id', 'user_id', 'sponsor_id', 'transaction_type', 'amount',
+               'status', 'blockchain_tx_id', 'reference_id', 'created_at', 'updated_at']
+    return stream_export(db[TatumTransaction.COLLECTION], pipeline, columns, to_row, 'transactions')
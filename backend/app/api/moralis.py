@@ -12,6 +12,7 @@ import traceback
 from datetime import datetime
 from bson.objectid import ObjectId
 from pymongo import MongoClient
+from app.services.log_sink import log_sink
 
 # Configure logging with a file handler for better debugging
 moralis_logger = logging.getLogger('moralis')
@@ -74,9 +75,9 @@ def create_system_log(db, log_type, entity_type, message, details=None):
             "created_at": datetime.utcnow()
         }
         
-        result = db.system_logs.insert_one(log_data)
+        log_id = log_sink.write('system_logs', log_data)
         moralis_logger.info(f"Created system log: {log_type} - {message}")
-        return result.inserted_id
+        return log_id
     except Exception as e:
         moralis_logger.error(f"Error creating system log: {str(e)}")
         return None
@@ -346,22 +347,24 @@ def process_token_transfer(transfer_data):
                 balance_field = 'balance'
                 current_balance = 0
                 
-            # Update the balance
-            new_balance = current_balance + amount
-            moralis_logger.info(f"Updating {balance_field}: {current_balance} -> {new_balance}")
-            
-            result = db.users.update_one(
-                {"_id": user_id},
-                {"$set": {
-                    balance_field: new_balance,
-                    "updated_at": now
-                }}
-            )
-            
-            if result.modified_count > 0:
-                moralis_logger.info(f"Updated {balance_field} from {current_balance} to {new_balance}")
+            # Update the balance; the main balance goes through the ledger
+            if balance_field == 'balance':
+                from app.models.ledger import Ledger
+                new_balance = Ledger.credit(user_id, amount, 'deposit', reference=tx_hash)
+                if new_balance is not None:
+                    moralis_logger.info(f"Updated balance from {current_balance} to {new_balance}")
+                else:
+                    moralis_logger.warning(f"Failed to update balance - user {user_id} not found")
             else:
-                moralis_logger.warning(f"Failed to update {balance_field} - no documents modified")
+                result = db.users.update_one(
+                    {"_id": user_id},
+                    {"$inc": {balance_field: amount}, "$set": {"updated_at": now}}
+                )
+                
+                if result.modified_count > 0:
+                    moralis_logger.info(f"Updated {balance_field} from {current_balance} by {amount}")
+                else:
+                    moralis_logger.warning(f"Failed to update {balance_field} - no documents modified")
         
         # Create system log
         log_details = {
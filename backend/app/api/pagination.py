@@ -0,0 +1,144 @@
+# app/api/pagination.py
+"""
+Keyset (cursor) pagination helpers for admin listing endpoints
+
+skip((page - 1) * limit) makes MongoDB walk and discard every document
+before the requested page, so deep pages get slower as collections grow.
+Keyset pagination instead seeks from the last row of the previous page
+using an index on (sort_field, _id). The position is handed to the client
+as an opaque continuation token.
+"""
+import base64
+import threading
+import time
+from bson import json_util
+
+# Cached totals are good enough for "showing N of ~M" and avoid a full
+# count on every page request
+COUNT_CACHE_TTL_SECONDS = 60
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a continuation token can't be decoded"""
+
+
+def encode_cursor(sort_field, sort_value, last_id):
+    """Build an opaque continuation token from the last row of a page"""
+    payload = json_util.dumps({'f': sort_field, 'v': sort_value, 'id': last_id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_field):
+    """
+    Decode a continuation token
+
+    Returns:
+        tuple: (sort_value, last_id)
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise InvalidCursorError('Invalid cursor')
+    if payload.get('f') != sort_field:
+        raise InvalidCursorError('Cursor does not match the requested sort order')
+    return payload.get('v'), payload.get('id')
+
+
+def keyset_seek(cursor, sort_field, sort_direction=1):
+    """
+    Filter that selects rows after the cursor position (empty without a cursor)
+    """
+    if not cursor:
+        return {}
+    op = '$gt' if sort_direction == 1 else '$lt'
+    sort_value, last_id = decode_cursor(cursor, sort_field)
+    if sort_field == '_id':
+        return {'_id': {op: last_id}}
+    return {'$or': [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, '_id': {op: last_id}}
+    ]}
+
+
+def keyset_sort(sort_field, sort_direction=1):
+    """Sort specification with _id as the tie-breaker"""
+    sort = [(sort_field, sort_direction)]
+    if sort_field != '_id':
+        sort.append(('_id', sort_direction))
+    return sort
+
+
+def trim_page(docs, limit, sort_field):
+    """
+    Cut a limit + 1 result down to one page and build the next cursor
+
+    Returns:
+        tuple: (documents, next_cursor or None)
+    """
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(sort_field, last.get(sort_field), last['_id'])
+
+
+def keyset_page(collection, query=None, sort_field='_id', sort_direction=1,
+                limit=20, cursor=None, projection=None):
+    """
+    Fetch one page using keyset pagination
+
+    Args:
+        collection: PyMongo collection
+        query (dict): Base filter
+        sort_field (str): Field to order by; ties are broken by _id
+        sort_direction (int): 1 ascending, -1 descending
+        limit (int): Page size
+        cursor (str): Continuation token from the previous page, or None
+        projection (dict): Optional projection (sort_field and _id are always kept)
+
+    Returns:
+        tuple: (documents, next_cursor or None)
+    """
+    query = dict(query or {})
+    seek = keyset_seek(cursor, sort_field, sort_direction)
+    if seek:
+        query = {'$and': [query, seek]} if query else seek
+
+    if projection is not None and any(projection.values()):
+        projection = dict(projection)
+        projection.setdefault(sort_field, 1)
+
+    docs = list(collection.find(query, projection).sort(keyset_sort(sort_field, sort_direction)).limit(limit + 1))
+    return trim_page(docs, limit, sort_field)
+
+
+def cached_count(collection, query=None, ttl=COUNT_CACHE_TTL_SECONDS):
+    """
+    Count documents with a short-lived in-process cache
+
+    Unfiltered counts use the collection metadata (estimated_document_count)
+    instead of scanning the _id index.
+    """
+    query = query or {}
+    key = (collection.full_name, json_util.dumps(query, sort_keys=True))
+    now = time.monotonic()
+
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    total = collection.estimated_document_count() if not query else collection.count_documents(query)
+
+    with _count_cache_lock:
+        _count_cache[key] = (total, now + ttl)
+    return total
+
+
+def wants_total(args):
+    """Totals are returned unless the client passes include_total=false"""
+    return args.get('include_total', 'true').lower() not in ('false', '0', 'no')
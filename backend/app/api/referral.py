@@ -7,6 +7,7 @@ from datetime import datetime
 from bson.objectid import ObjectId
 from app.models.user import User
 from app.models.referral_tree import ReferralTree
+from app.models.team_counters import TeamCounters
 from app.models.user_wallet import UserWallet
 
 referral_bp = Blueprint('referral', __name__)
@@ -27,9 +28,9 @@ def get_user_referrer_data(sponsor_id=None, user_id=None):
         # Find the user by sponsor_id or user_id using MongoDB models
         user = None
         if sponsor_id:
-            user = User.find_by_sponsor_id(sponsor_id)
+            user = User.find_by_sponsor_id(sponsor_id, projection='summary')
         elif user_id:
-            user = User.find_by_id(user_id)
+            user = User.find_by_id(user_id, projection='summary')
         
         if not user:
             return {"error": "User not found"}, 404
@@ -56,12 +57,12 @@ def get_user_referrer_data(sponsor_id=None, user_id=None):
         referrer = None
         try:
             if referral_entry.referrer_id:
-                referrer = User.find_by_id(referral_entry.referrer_id)
+                referrer = User.find_by_id(referral_entry.referrer_id, projection='summary')
                 
             if not referrer:
                 # If referrer not found but we know common relationships
                 if str(user.id) == "2" or user.id == 2:  # User 2 (Ravi) is referred by Admin (ID 1)
-                    admin_user = User.find_by_id(1)
+                    admin_user = User.find_by_id(1, projection='summary')
                     if admin_user:
                         user_data = {
                             "id": str(user.id),
@@ -178,7 +179,7 @@ def get_user_referrer_data(sponsor_id=None, user_id=None):
             
             for ref in referred_users:
                 try:
-                    referred_user = User.find_by_id(ref.user_id)
+                    referred_user = User.find_by_id(ref.user_id, projection='summary')
                     if referred_user:
                         # Safely get referred user investment data using MongoDB
                         ref_total_investment = 0
@@ -339,7 +340,7 @@ def get_referral_link():
         current_user_id_obj = current_user_id
         
     # Find user using MongoDB
-    user = User.find_by_id(current_user_id_obj)
+    user = User.find_by_id(current_user_id_obj, projection='summary')
     
     if not user:
         return jsonify({'success': False, 'message': 'User not found'}), 404
@@ -354,29 +355,18 @@ def get_referral_link():
         'sponsor_id': user.sponsor_id
     }), 200
 
-@referral_bp.route('/team', methods=['GET'])
-@jwt_required()
-def get_team():
+def _team_by_level(root_id, max_level=12):
     """
-    Get a user's referral team structure organized by levels (1-12)
-    This replaces the previous tree view with a more organized level-based display
+    Walk the referral tree below ``root_id`` and list its members by level (1-12)
+
+    Returns:
+        dict: level_N -> [member dicts with id, sponsor_id, name, email, level, investment, joined_date]
     """
-    current_user_id = get_user_id_from_jwt()
-    
-    # Convert to ObjectId if needed
-    if isinstance(current_user_id, str):
-        try:
-            current_user_id_obj = ObjectId(current_user_id)
-        except:
-            current_user_id_obj = current_user_id
-    else:
-        current_user_id_obj = current_user_id
-    
     # Structure to store users by level
-    users_by_level = {f"level_{i}": [] for i in range(1, 13)}  # Levels 1-12
+    users_by_level = {f"level_{i}": [] for i in range(1, max_level + 1)}
     
     # Function to recursively find users at each level
-    def find_users_at_level(referrer_id, current_level=1, max_level=12):
+    def find_users_at_level(referrer_id, current_level=1):
         if current_level > max_level:
             return
             
@@ -385,7 +375,7 @@ def get_team():
         
         for ref in referrals:
             user_id = ref.get('user_id')
-            user = User.find_by_id(user_id)
+            user = User.find_by_id(user_id, projection='summary')
             
             if not user:
                 continue
@@ -411,17 +401,47 @@ def get_team():
             })
             
             # Recursively find users referred by this user at the next level
-            find_users_at_level(user_id, current_level + 1, max_level)
+            find_users_at_level(user_id, current_level + 1)
     
-    # Start the recursive process from the current user
-    find_users_at_level(current_user_id_obj)
+    # Start the recursive process from the root user
+    find_users_at_level(root_id)
+    return users_by_level
+
+def _summarize_levels(users_by_level):
+    """Counter-shaped summary (levels, total_members, total_volume) of a walked team"""
+    levels = {
+        level: {'members': len(members), 'volume': sum(member['investment'] for member in members)}
+        for level, members in users_by_level.items()
+    }
+    return {
+        'levels': levels,
+        'total_members': sum(level['members'] for level in levels.values()),
+        'total_volume': sum(level['volume'] for level in levels.values()),
+        'updated_at': None
+    }
+
+@referral_bp.route('/team', methods=['GET'])
+@jwt_required()
+def get_team():
+    """
+    Get a user's referral team structure organized by levels (1-12)
+    This replaces the previous tree view with a more organized level-based display
+    """
+    current_user_id = get_user_id_from_jwt()
     
-    # Count total team members and sum team investment
-    total_team_members = sum(len(level_users) for level_users in users_by_level.values())
-    team_investment = sum(
-        sum(user['investment'] for user in level_users)
-        for level_users in users_by_level.values()
-    )
+    # Convert to ObjectId if needed
+    if isinstance(current_user_id, str):
+        try:
+            current_user_id_obj = ObjectId(current_user_id)
+        except:
+            current_user_id_obj = current_user_id
+    else:
+        current_user_id_obj = current_user_id
+    
+    users_by_level = _team_by_level(current_user_id_obj)
+    
+    # The members are listed anyway, so the totals are taken from the same walk
+    team_summary = _summarize_levels(users_by_level)
     
     # Get user business volume and rank from team_business collection
     team_business = db.team_business.find_one({'user_id': current_user_id_obj})
@@ -432,13 +452,48 @@ def get_team():
         'success': True,
         'team': {
             'levels': users_by_level,
-            'total_members': total_team_members,
-            'team_investment': team_investment,
+            'level_summary': team_summary['levels'],
+            'total_members': team_summary['total_members'],
+            'team_investment': team_summary['total_volume'],
             'business_volume': business_volume,
             'rank_level': rank_level
         }
     }), 200
 
+@referral_bp.route('/team/summary', methods=['GET'])
+@jwt_required()
+def get_team_summary():
+    """
+    Get a user's team size and volume per level (1-12) without listing members
+    
+    Served from a single team_counters document, which is updated on every
+    registration and investment activation in the user's downline. Until the
+    counters have been seeded by TeamCounters.rebuild() the tree is walked.
+    """
+    current_user_id = get_user_id_from_jwt()
+    if isinstance(current_user_id, str) and ObjectId.is_valid(current_user_id):
+        current_user_id = ObjectId(current_user_id)
+    
+    team_counters = TeamCounters.find_by_user_id(current_user_id)
+    if team_counters is None:
+        team_counters = _summarize_levels(_team_by_level(current_user_id))
+    team_business = db.team_business.find_one(
+        {'user_id': current_user_id},
+        {'business_volume': 1, 'current_rank_level': 1}
+    ) or {}
+    
+    return jsonify({
+        'success': True,
+        'team': {
+            'levels': team_counters['levels'],
+            'total_members': team_counters['total_members'],
+            'team_investment': team_counters['total_volume'],
+            'business_volume': float(team_business.get('business_volume', 0)),
+            'rank_level': team_business.get('current_rank_level', 0),
+            'updated_at': team_counters['updated_at'].isoformat() if team_counters['updated_at'] else None
+        }
+    }), 200
+
 @referral_bp.route('/tree', methods=['GET'])
 @jwt_required()
 def get_referral_tree():
@@ -558,14 +613,14 @@ def get_referral_mapping():
         for referral in all_referrals:
             # Get user details
             user_id = referral.get('user_id')
-            user = User.find_by_id(user_id)
+            user = User.find_by_id(user_id, projection='summary')
             
             if not user:
                 continue
                 
             # Get referrer details if available
             referrer_id = referral.get('referrer_id')
-            referrer = User.find_by_id(referrer_id) if referrer_id else None
+            referrer = User.find_by_id(referrer_id, projection='summary') if referrer_id else None
         
             # Format user sponsor ID
             user_sponsor_id = user.sponsor_id
@@ -3,10 +3,16 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.tatum_hybrid_service import TatumHybridService
 from app import db, socketio
+from app.models.ledger import Ledger
+from app.services.log_sink import log_sink
+from app.services.logging_service import get_logger, redacted
+from app.socket_events import user_room, push_user_event, deposit_key
 from functools import wraps
 from datetime import datetime
 import uuid
 
+logger = get_logger(__name__)
+
 wallet_bp = Blueprint('wallet', __name__)
 tatum_service = TatumHybridService()
 
@@ -93,7 +99,7 @@ def generate_wallet():
             'user_id': str(current_user_id),
             'address': wallet.deposit_address,
             'timestamp': datetime.utcnow().isoformat()
-        }, room=str(current_user_id))
+        }, room=user_room(current_user_id))
         
         return jsonify({
             'success': True,
@@ -152,7 +158,8 @@ def transfer_to_admin_wallet():
             timestamp = datetime.utcnow().isoformat()
             
             # Emit transaction event
-            socketio.emit('new_deposit', {
+            tx_hash = result.get('tx_hash')
+            push_user_event(user_id, 'new_deposit', {
                 "transaction_id": transaction_id,
                 "user_id": str(user_id),
                 "amount": float(result.get('amount', 0)),
@@ -160,18 +167,18 @@ def transfer_to_admin_wallet():
                 "wallet_address": result.get('from_address', ''),
                 "timestamp": timestamp,
                 "transaction_type": 'admin_transfer'
-            }, broadcast=True)
+            }, key=deposit_key(tx_hash))
             
             # Emit balance update event
             user_doc = db.users.find_one({"_id": user_id})
             current_balance = user_doc.get('balance', 0) if user_doc else 0
             
-            socketio.emit('balance_updated', {
+            push_user_event(user_id, 'balance_updated', {
                 "user_id": str(user_id),
                 "balance": current_balance,
                 "transaction_id": transaction_id,
                 "timestamp": timestamp
-            }, room=str(user_id))
+            })
         
         return jsonify(result), 200
     
@@ -320,11 +327,11 @@ def get_transactions():
         # Get limit parameter from query string, default to 10
         limit = request.args.get('limit', 10, type=int)
         
-        print(f"[TATUM_TX] Looking up transactions for user ID: {current_user_id}")
+        logger.debug("[TATUM_TX] Looking up transactions for user ID: %s", current_user_id)
         
         # Find all wallet addresses associated with the current user
         wallet_docs = list(db.user_wallets.find({"user_id": current_user_id}))
-        print(f"[TATUM_TX] Found {len(wallet_docs)} wallet documents")
+        logger.debug("[TATUM_TX] Found %d wallet documents", len(wallet_docs))
         
         # Extract all wallet addresses
         wallet_addresses = []
@@ -332,9 +339,8 @@ def get_transactions():
             address = wallet_doc.get('deposit_address', '')
             if address:
                 wallet_addresses.append(address)
-                print(f"[TATUM_TX] Found wallet address: {address}")
         
-        print(f"[TATUM_TX] Total wallet addresses: {len(wallet_addresses)}")
+        logger.debug("[TATUM_TX] Wallet addresses: %s", wallet_addresses)
         
         # Initialize the formatted transactions list
         formatted_transactions = []
@@ -347,7 +353,7 @@ def get_transactions():
             if not wallet_address:
                 continue
                 
-            print(f"[TATUM_TX] Querying Tatum API for transactions on address: {wallet_address}")
+            logger.debug("[TATUM_TX] Querying Tatum API for transactions on address: %s", wallet_address)
             
             try:
                 # Define the chain we're using
@@ -360,7 +366,7 @@ def get_transactions():
                     pageSize=limit
                 )
                 
-                print(f"[TATUM_TX] Tatum API response received: {api_response}")
+                logger.debug("[TATUM_TX] Tatum API response received: %s", redacted(api_response))
                 
                 # Check if we got a valid response with transactions
                 if api_response and isinstance(api_response, dict):
@@ -404,7 +410,7 @@ def get_transactions():
                                         'type': 'Withdrwal' if float(tx.get('amount', 0))< 0 else'Deposit'
                                     }
                                     
-                                    print(f"[TATUM_TX] Formatted Tatum transaction: {formatted_tx}")
+                                    logger.debug("[TATUM_TX] Formatted Tatum transaction: %s", formatted_tx)
                                     formatted_transactions.append(formatted_tx)
                                     
                                     # Check if this transaction exists in our database
@@ -436,11 +442,11 @@ def get_transactions():
                                         }
                                         
                                         # Insert into database
-                                        print(f"[TATUM_TX] Inserting new transaction into database: {tx_doc}")
+                                        logger.info("[TATUM_TX] Recording new transaction %s", tx_doc.get('tx_hash'))
                                         db.tatum_transactions.insert_one(tx_doc)
                                         
                                         # Emit socket event for this transaction
-                                        socketio.emit('new_deposit', {
+                                        push_user_event(current_user_id, 'new_deposit', {
                                             "transaction_id": transaction_id,
                                             "user_id": str(current_user_id),
                                             "amount": amount,
@@ -449,39 +455,30 @@ def get_transactions():
                                             "currency": currency,
                                             "timestamp": now.isoformat(),
                                             "status": "Completed"
-                                        }, broadcast=True)
+                                        }, key=deposit_key(tx.get('hash')))
                                         
                                         # Update user balance for USDT deposits
                                         if currency == 'USDT':
-                                            user_doc = db.users.find_one({"_id": current_user_id})
-                                            if user_doc:
-                                                current_balance = float(user_doc.get('balance', 0))
-                                                new_balance = current_balance + amount
-                                                
-                                                # Update balance in database
-                                                db.users.update_one(
-                                                    {"_id": current_user_id},
-                                                    {"$set": {"balance": new_balance, "updated_at": now}}
-                                                )
-                                                
+                                            new_balance = Ledger.credit(current_user_id, amount, 'deposit', reference=tx.get('hash'))
+                                            if new_balance is not None:
                                                 # Emit balance update event
-                                                socketio.emit('balance_updated', {
+                                                push_user_event(current_user_id, 'balance_updated', {
                                                     "user_id": str(current_user_id),
                                                     "balance": new_balance,
                                                     "transaction_id": transaction_id,
                                                     "timestamp": now.isoformat()
-                                                }, room=str(current_user_id))
+                                                })
                                 except Exception as e:
-                                    print(f"[TATUM_TX] Error formatting Tatum transaction: {str(e)}")
+                                    logger.warning("[TATUM_TX] Error formatting Tatum transaction: %s", e)
                                     continue
                 
             except Exception as e:
-                print(f"[TATUM_TX] Error fetching from Tatum API for address {wallet_address}: {str(e)}")
+                logger.error("[TATUM_TX] Error fetching from Tatum API for address %s: %s", wallet_address, e)
         
         # If Tatum API shows no transactions, try direct Web3 lookup for recent blockchain transactions
         # This is useful for transactions that show on BSCScan but not yet in Tatum API
         if not formatted_transactions:
-            print(f"[TATUM_TX] No transactions from Tatum API, trying direct Web3 lookup for BSCscan transactions")
+            logger.debug("[TATUM_TX] No transactions from Tatum API, trying direct Web3 lookup")
             for wallet_address in wallet_addresses:
                 if not wallet_address:
                     continue
@@ -522,7 +519,7 @@ def get_transactions():
                                     'type': 'Deposit'
                                 }
                                 
-                                print(f"[TATUM_TX] Web3 transaction found: {formatted_tx}")
+                                logger.debug("[TATUM_TX] Web3 transaction found: %s", formatted_tx)
                                 formatted_transactions.append(formatted_tx)
                                 
                                 # Check if this transaction exists in our database
@@ -560,11 +557,11 @@ def get_transactions():
                                     }
                                     
                                     # Insert into database
-                                    print(f"[TATUM_TX] Inserting new Web3 transaction into database: {tx_doc}")
+                                    logger.info("[TATUM_TX] Recording new Web3 transaction %s", tx_doc.get('tx_hash'))
                                     db.tatum_transactions.insert_one(tx_doc)
                                     
                                     # Emit socket event for this transaction
-                                    socketio.emit('new_deposit', {
+                                    push_user_event(current_user_id, 'new_deposit', {
                                         "transaction_id": transaction_id,
                                         "user_id": str(current_user_id),
                                         "amount": token_amount,
@@ -573,36 +570,27 @@ def get_transactions():
                                         "currency": 'USDT',
                                         "timestamp": now.isoformat(),
                                         "status": "Completed"
-                                    }, broadcast=True)
+                                    }, key=deposit_key(tx_hash))
                                     
                                     # Update user balance
-                                    user_doc = db.users.find_one({"_id": current_user_id})
-                                    if user_doc:
-                                        current_balance = float(user_doc.get('balance', 0))
-                                        new_balance = current_balance + token_amount
-                                        
-                                        # Update balance in database
-                                        db.users.update_one(
-                                            {"_id": current_user_id},
-                                            {"$set": {"balance": new_balance, "updated_at": now}}
-                                        )
-                                        
+                                    new_balance = Ledger.credit(current_user_id, token_amount, 'deposit', reference=tx_hash)
+                                    if new_balance is not None:
                                         # Emit balance update event
-                                        socketio.emit('balance_updated', {
+                                        push_user_event(current_user_id, 'balance_updated', {
                                             "user_id": str(current_user_id),
                                             "balance": new_balance,
                                             "transaction_id": transaction_id,
                                             "timestamp": now.isoformat()
-                                        }, room=str(current_user_id))
+                                        })
                             except Exception as e:
-                                print(f"[TATUM_TX] Error formatting Web3 transaction: {str(e)}")
+                                logger.warning("[TATUM_TX] Error formatting Web3 transaction: %s", e)
                                 continue
                 except Exception as e:
-                    print(f"[TATUM_TX] Error in Web3 direct lookup: {str(e)}")
+                    logger.error("[TATUM_TX] Error in Web3 direct lookup: %s", e)
         
         # Even if we don't insert new transactions, always emit transactions_refreshed
         # This ensures the frontend gets the latest data
-        socketio.emit('transactions_refreshed', {
+        push_user_event(current_user_id, 'transactions_refreshed', {
             "transactions": formatted_transactions,
             "timestamp": datetime.utcnow().isoformat(),
             "user_id": str(current_user_id)
@@ -614,9 +602,7 @@ def get_transactions():
         }), 200
     
     except Exception as e:
-        print(f"[TATUM_TX] Error in get_transactions: {str(e)}")
-        import traceback
-        print(f"[TATUM_TX] Traceback: {traceback.format_exc()}")
+        logger.exception("[TATUM_TX] Error in get_transactions: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @wallet_bp.route('/security-info', methods=['GET'])
@@ -660,7 +646,7 @@ def wallet_security_info():
             "activity_description": 'User verified wallet security status',
             "created_at": datetime.utcnow()
         }
-        db.user_activities.insert_one(activity_doc)
+        log_sink.write('user_activities', activity_doc)
         
         return jsonify({
             'success': True,
@@ -1,6 +1,7 @@
 # app/api/webhook.py
 from flask import Blueprint, request, jsonify
 from app.services.tatum_hybrid_service import TatumHybridService
+from app.services.log_sink import log_sink
 import os
 import hmac
 import hashlib
@@ -392,22 +393,14 @@ def process_moralis_token_transfer(transfer, data):
                 "log_message": f"User {user_id} not found for wallet address {to_address}, transaction {tx_hash}",
                 "created_at": now
             }
-            db.system_logs.insert_one(error_log)
+            log_sink.write('system_logs', error_log)
             db.tatum_transactions.insert_one(transaction_doc)
             
             return False
         
-        # Update balance
-        current_balance = float(user_doc.get('balance', 0))
-        new_balance = current_balance + amount
-        
-        db.users.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "balance": new_balance,
-                "updated_at": now
-            }}
-        )
+        # Update balance (atomic ledger credit)
+        from app.models.ledger import Ledger
+        new_balance = Ledger.credit(user_id, amount, 'deposit', reference=tx_hash)
         
         # Save transaction to database
         db.tatum_transactions.insert_one(transaction_doc)
@@ -418,7 +411,7 @@ def process_moralis_token_transfer(transfer, data):
             "log_message": f'Received {amount} {currency} for user {user_id} via blockchain transaction {tx_hash}. Balance updated to {new_balance}',
             "created_at": now
         }
-        db.system_logs.insert_one(log_doc)
+        log_sink.write('system_logs', log_doc)
         
         # Create user activity record
         activity_doc = {
@@ -427,7 +420,7 @@ def process_moralis_token_transfer(transfer, data):
             "activity_description": f"Received {amount} {currency} via blockchain transaction {tx_hash}. New balance: {new_balance}",
             "created_at": now
         }
-        db.user_activities.insert_one(activity_doc)
+        log_sink.write('user_activities', activity_doc)
         
         logging.info(f"Successfully processed {currency} transaction: {tx_hash}")
         return True
@@ -541,22 +534,14 @@ def process_moralis_native_transfer(transfer, data):
                 "log_message": f"User {user_id} not found for wallet address {to_address}, transaction {tx_hash}",
                 "created_at": now
             }
-            db.system_logs.insert_one(error_log)
+            log_sink.write('system_logs', error_log)
             db.tatum_transactions.insert_one(transaction_doc)
             
             return False
         
-        # Update balance
-        current_balance = float(user_doc.get('balance', 0))
-        new_balance = current_balance + amount
-        
-        db.users.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "balance": new_balance,
-                "updated_at": now
-            }}
-        )
+        # Update balance (atomic ledger credit)
+        from app.models.ledger import Ledger
+        new_balance = Ledger.credit(user_id, amount, 'deposit', reference=tx_hash)
         
         # Save transaction to database
         db.tatum_transactions.insert_one(transaction_doc)
@@ -567,7 +552,7 @@ def process_moralis_native_transfer(transfer, data):
             "log_message": f'Received {amount} {currency} for user {user_id} via blockchain transaction {tx_hash}. Balance updated to {new_balance}',
             "created_at": now
         }
-        db.system_logs.insert_one(log_doc)
+        log_sink.write('system_logs', log_doc)
         
         # Create user activity record
         activity_doc = {
@@ -576,7 +561,7 @@ def process_moralis_native_transfer(transfer, data):
             "activity_description": f"Received {amount} {currency} via blockchain transaction {tx_hash}. New balance: {new_balance}",
             "created_at": now
         }
-        db.user_activities.insert_one(activity_doc)
+        log_sink.write('user_activities', activity_doc)
         
         logging.info(f"Successfully processed {currency} transaction: {tx_hash}")
         return True
@@ -23,4 +23,10 @@ class Config:
     TATUM_API_URL = os.environ.get('TATUM_API_URL') or 'https://api.tatum.io/v4'
     
     # Web3 configuration
-    WEB3_PROVIDER_URI = os.environ.get('WEB3_PROVIDER_URI') or 'https://bsc-dataseed.binance.org/'
\ No newline at end of file
+    WEB3_PROVIDER_URI = os.environ.get('WEB3_PROVIDER_URI') or 'https://bsc-dataseed.binance.org/'
+    
+    # Socket.IO cross-process message queue (redis://, amqp://, mongodb://).
+    # Leave unset for a single process; set it so emits from workers and
+    # other nodes reach clients connected anywhere.
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL') or 'flask-socketio'
\ No newline at end of file
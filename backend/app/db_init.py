@@ -7,10 +7,37 @@ Previously, this application used SQLAlchemy with MySQL, but it has been
 fully migrated to MongoDB.
 """
 
+import os
 from app import get_db
 from pymongo.errors import OperationFailure, ConnectionFailure
 from datetime import datetime
 
+DAY = 24 * 60 * 60
+
+# (collection, date field, seconds after that date the document is removed).
+# MongoDB's TTL monitor deletes expired documents in the background, so
+# retention needs no cleanup job or application code.
+TTL_INDEXES = [
+    ('login_attempts', 'created_at', int(os.environ.get('LOGIN_ATTEMPT_RETENTION_DAYS', 30)) * DAY),
+    ('pin_resets', 'expires_at', DAY),  # keep a day past expiry so late use reports "expired"
+    ('system_log', 'created_at', int(os.environ.get('SYSTEM_LOG_RETENTION_DAYS', 90)) * DAY),
+    ('system_logs', 'created_at', int(os.environ.get('SYSTEM_LOG_RETENTION_DAYS', 90)) * DAY),
+]
+
+def ensure_ttl_index(db, collection, field, seconds):
+    """Create a TTL index, or convert/retune an existing index on the same field"""
+    try:
+        db[collection].create_index(field, expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        # 85/86: an index on this field exists with other options
+        if e.code not in (85, 86):
+            raise
+        try:
+            db.command('collMod', collection, index={'keyPattern': {field: 1}, 'expireAfterSeconds': seconds})
+        except OperationFailure:
+            db[collection].drop_index([(field, 1)])
+            db[collection].create_index(field, expireAfterSeconds=seconds)
+
 def init_mongodb():
     """Initialize MongoDB with necessary indexes and default data"""
     try:
@@ -82,6 +109,9 @@ def init_mongodb():
         from app.models.user_wallet import UserWallet
         from app.models.pending_transaction import PendingTransaction
         from app.models.transaction import TatumTransaction
+        from app.models.moralis_address_registration import MoralisAddressRegistration
+        from app.models.team_counters import TeamCounters
+        from app.models.ledger import Ledger
         
         print("Creating indexes for all MongoDB models...")
         User.ensure_indexes()
@@ -96,19 +126,72 @@ def init_mongodb():
         UserWallet.ensure_indexes()
         PendingTransaction.ensure_indexes()
         TatumTransaction.ensure_indexes()
+        MoralisAddressRegistration.ensure_indexes()
+        TeamCounters.ensure_indexes()
+        Ledger.ensure_indexes()
+        
+        # Team summaries are served from the counters only once they are seeded
+        try:
+            if not TeamCounters.is_seeded():
+                seeded = TeamCounters.rebuild()
+                print(f"Seeded team counters for {seeded} users.")
+        except Exception as e:
+            print(f"Warning: Could not seed team counters: {str(e)}")
+        
+        # Cold fields are kept out of the users documents (User.COLD_FIELDS)
+        try:
+            moved = User.migrate_cold_fields()
+            if moved:
+                print(f"Moved cold fields of {moved} users to {User.COLD_COLLECTION}.")
+        except Exception as e:
+            print(f"Warning: Could not migrate user cold fields: {str(e)}")
+        
+        # Profile images live in GridFS; convert any base64 data URIs left inline
+        try:
+            from app.services import profile_image_service
+            profile_image_service.ensure_indexes()
+            converted = profile_image_service.migrate_inline_images()
+            if converted:
+                print(f"Moved {converted} inline profile images to GridFS.")
+        except Exception as e:
+            print(f"Warning: Could not migrate profile images: {str(e)}")
+        
+        # Balance reconciliation report/checkpoint collections; withdrawals
+        # are grouped per chunk of user ids
+        from app.services import reconciliation_service
+        reconciliation_service.ensure_indexes()
+        db.withdrawals.create_index('user_id')
         
         # Add indexes for UserCycle model
         from app.models.user_cycles import UserCycle
         UserCycle.ensure_indexes()
         
-        # Add indexes for SystemLog model
+        # Add indexes for SystemLog model (created_at is covered by its TTL index)
         try:
             db.system_log.create_index("log_type")
-            db.system_log.create_index("created_at")
             print("SystemLog indexes created successfully.")
         except Exception as e:
             print(f"Warning: Could not create system_log indexes: {str(e)}")
         
+        # TTL retention for short-lived and verbose collections
+        for collection, field, seconds in TTL_INDEXES:
+            try:
+                ensure_ttl_index(db, collection, field, seconds)
+            except Exception as e:
+                print(f"Warning: Could not create TTL index on {collection}.{field}: {str(e)}")
+        
+        # Archival is idempotent on original_id (see cleanup_old_transactions)
+        try:
+            db.transaction_archive.create_index('original_id', unique=True)
+        except Exception as e:
+            print(f"Warning: Could not create transaction_archive indexes: {str(e)}")
+        
+        # Keyset pagination index for the admin wallet access log listing
+        try:
+            db.wallet_key_access_logs.create_index([("accessed_at", -1), ("_id", -1)])
+        except Exception as e:
+            print(f"Warning: Could not create wallet_key_access_logs indexes: {str(e)}")
+        
         print("MongoDB initialization complete!")
         return True
         
@@ -146,12 +229,15 @@ def create_admin_user_if_not_exists():
                 'wallet_address': '0x0000000000000000000000000000000000000000',
                 'security_pin': generate_password_hash('admin123', method='pbkdf2:sha256'),
                 'balance': 0.00,
+                'balance_micros': 0,
                 'is_admin': True,
                 'is_active': True,
                 'created_at': datetime.utcnow(),
                 'updated_at': datetime.utcnow()
             }
             db.users.insert_one(admin_data)
+            from app.models.platform_counters import PlatformCounters
+            PlatformCounters.record_user_created(is_active=admin_data.get("is_active", True))
             print("Admin user created.")
         else:
             print("Admin user already exists.")
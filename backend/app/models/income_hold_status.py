@@ -70,13 +70,16 @@ class IncomeHoldStatus:
                 {"_id": self.id},
                 {"$set": data}
             )
-            return self.id
         else:
             # Insert new document
             data.pop("_id", None)  # Remove None _id for insert
             result = db[self.COLLECTION].insert_one(data)
             self.id = result.inserted_id
-            return self.id
+        
+        # Hold status feeds the stored level income eligibility flag
+        from app.services.eligibility_service import refresh_eligibility
+        refresh_eligibility([self.user_id])
+        return self.id
     
     @classmethod
     def find_by_id(cls, status_id):
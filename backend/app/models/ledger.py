@@ -0,0 +1,350 @@
+# app/models/ledger.py
+from app import db
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from bson import Decimal128
+from bson.int64 import Int64
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Balances are kept as integer micro-units (1 USDT = 1_000_000)
+MICROS = 1000000
+
+
+def to_micros(amount):
+    """Convert a USDT amount (float, str, Decimal or Decimal128) to integer micro-units"""
+    if isinstance(amount, Decimal128):
+        amount = amount.to_decimal()
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount or 0))
+    return int((amount * MICROS).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_micros(micros):
+    """Convert integer micro-units back to a float USDT amount"""
+    return (micros or 0) / MICROS
+
+
+class Ledger:
+    """
+    Append-only balance ledger
+
+    Every balance change appends to ledger_entries and atomically updates
+    the user document:
+
+        {user_id, entry_type, amount_micros, balance_after_micros, reference, created_at}
+
+    MongoDB may run without a replica set, so the two writes are not one
+    transaction. Instead the entry is inserted first with status 'pending';
+    the user update records the entry id and resulting balance in the
+    bounded ``ledger_recent`` array, and the entry is then marked committed.
+    repair_pending() settles entries left pending by a crash between the
+    writes: committed if the user document recorded them, deleted if not.
+    Readers ignore pending entries.
+
+    The user document keeps the authoritative integer ``balance_micros`` and
+    a derived float ``balance`` for existing readers; both are set by a single
+    pipeline update, so concurrent writers never overwrite each other and no
+    read is needed first. Users created before the ledger are seeded from
+    their float balance on their first change, with an 'opening_balance'
+    entry.
+
+    take_snapshots() periodically folds recent entries into balance_snapshots
+    so balance_at() only has to replay entries since the last snapshot.
+    """
+
+    COLLECTION = 'ledger_entries'
+    SNAPSHOT_COLLECTION = 'balance_snapshots'
+
+    # Entries may be appended slightly after their created_at; snapshots stop
+    # this far behind now so late entries still fall after the snapshot
+    SNAPSHOT_LAG = timedelta(minutes=5)
+
+    # Entry ids remembered on the user document for repair_pending()
+    RECENT_ENTRIES = 50
+    # Pending entries younger than this may still be in flight
+    REPAIR_GRACE = timedelta(minutes=1)
+
+    @staticmethod
+    def _object_id(user_id):
+        if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+            return ObjectId(user_id)
+        return user_id
+
+    @staticmethod
+    def _current_micros():
+        """Stored balance_micros, or the legacy float balance converted to micro-units"""
+        return {"$ifNull": ["$balance_micros", {"$toLong": {"$round": [
+            {"$multiply": [{"$toDecimal": {"$ifNull": ["$balance", 0]}}, MICROS]}, 0
+        ]}}]}
+
+    @staticmethod
+    def _missing_micros():
+        return {"$in": [{"$type": "$balance_micros"}, ["missing", "null"]]}
+
+    @classmethod
+    def _apply(cls, user_id, delta_micros, entry_type, reference=None, details=None, require_funds=False):
+        user_id = cls._object_id(user_id)
+        now = datetime.utcnow()
+
+        entry = {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "entry_type": entry_type,
+            "amount_micros": Int64(delta_micros),
+            "status": "pending",
+            "created_at": now
+        }
+        if reference is not None:
+            entry["reference"] = str(reference)
+        if details:
+            entry["details"] = details
+        db[cls.COLLECTION].insert_one(entry)
+
+        query = {"_id": user_id}
+        if require_funds:
+            query["$expr"] = {"$gte": [cls._current_micros(), -delta_micros]}
+
+        # Both fields of the first stage are computed from the pre-update document
+        balance_after = {"$add": [cls._current_micros(), Int64(delta_micros)]}
+        before = db.users.find_one_and_update(
+            query,
+            [
+                {"$set": {
+                    "balance_micros": balance_after,
+                    "ledger_recent": {"$slice": [{"$concatArrays": [
+                        {"$ifNull": ["$ledger_recent", []]},
+                        [{
+                            "entry_id": entry["_id"],
+                            "balance_after_micros": balance_after,
+                            "opening_micros": {"$cond": [cls._missing_micros(), cls._current_micros(), None]}
+                        }]
+                    ]}, -cls.RECENT_ENTRIES]}
+                }},
+                {"$set": {"balance": {"$divide": ["$balance_micros", MICROS]}, "updated_at": now}}
+            ],
+            projection={"balance": 1, "balance_micros": 1}
+        )
+        if before is None:
+            db[cls.COLLECTION].delete_one({"_id": entry["_id"]})
+            return None
+
+        if before.get("balance_micros") is None:
+            opening = to_micros(before.get("balance"))
+            cls._record_opening(user_id, opening, now)
+        else:
+            opening = before["balance_micros"]
+
+        balance_after = opening + delta_micros
+        cls._commit(entry["_id"], balance_after)
+        return balance_after
+
+    @classmethod
+    def _commit(cls, entry_id, balance_after):
+        db[cls.COLLECTION].update_one(
+            {"_id": entry_id},
+            {"$set": {"balance_after_micros": Int64(balance_after)}, "$unset": {"status": ""}}
+        )
+
+    @classmethod
+    def _record_opening(cls, user_id, opening, created_at):
+        """Insert the user's opening_balance entry (unique per user)"""
+        try:
+            db[cls.COLLECTION].insert_one({
+                "user_id": user_id,
+                "entry_type": "opening_balance",
+                "amount_micros": Int64(opening),
+                "balance_after_micros": Int64(opening),
+                "created_at": created_at
+            })
+        except DuplicateKeyError:
+            pass
+
+    @classmethod
+    def repair_pending(cls, older_than=None):
+        """
+        Settle entries left pending by a crash between the journal and
+        balance writes
+
+        An entry whose id is in the user's ``ledger_recent`` moved the balance
+        and is committed (with the opening entry if that change seeded the
+        balance); any other is deleted, as its balance update never happened.
+
+        Returns:
+            tuple: (committed, deleted)
+        """
+        older_than = older_than or datetime.utcnow() - cls.REPAIR_GRACE
+        committed = deleted = 0
+        for entry in db[cls.COLLECTION].find(
+            {"status": "pending", "created_at": {"$lt": older_than}}, {"user_id": 1, "created_at": 1}
+        ):
+            user = db.users.find_one({"_id": entry["user_id"]}, {"ledger_recent": 1}) or {}
+            applied = next(
+                (r for r in user.get("ledger_recent") or [] if r.get("entry_id") == entry["_id"]), None
+            )
+            if applied is None:
+                db[cls.COLLECTION].delete_one({"_id": entry["_id"], "status": "pending"})
+                deleted += 1
+                continue
+            if applied.get("opening_micros") is not None:
+                cls._record_opening(entry["user_id"], applied["opening_micros"], entry["created_at"])
+            cls._commit(entry["_id"], applied["balance_after_micros"])
+            committed += 1
+        if committed or deleted:
+            logger.warning(f"Repaired pending ledger entries: {committed} committed, {deleted} deleted")
+        return committed, deleted
+
+    @classmethod
+    def credit(cls, user_id, amount, entry_type, reference=None, details=None):
+        """
+        Add funds to a user's balance
+
+        Args:
+            user_id: User ID
+            amount: Positive amount in USDT
+            entry_type (str): e.g. 'deposit', 'daily_return', 'referral_commission'
+            reference: Transaction hash or other source reference
+            details (dict, optional): Extra data stored on the journal entry
+
+        Returns:
+            float: New balance, or None if the user does not exist
+        """
+        micros = to_micros(amount)
+        if micros < 0:
+            raise ValueError("Credit amount must not be negative")
+        balance_after = cls._apply(user_id, micros, entry_type, reference, details)
+        return from_micros(balance_after) if balance_after is not None else None
+
+    @classmethod
+    def debit(cls, user_id, amount, entry_type, reference=None, details=None):
+        """
+        Remove funds from a user's balance if they have enough
+
+        The funds check and the deduction are the same atomic update.
+
+        Returns:
+            float: New balance, or None if the user does not exist or has
+            insufficient funds
+        """
+        micros = to_micros(amount)
+        if micros < 0:
+            raise ValueError("Debit amount must not be negative")
+        balance_after = cls._apply(user_id, -micros, entry_type, reference, details, require_funds=True)
+        return from_micros(balance_after) if balance_after is not None else None
+
+    @classmethod
+    def balance_of(cls, user_id):
+        """Current balance of a user in USDT"""
+        doc = db.users.find_one({"_id": cls._object_id(user_id)}, {"balance": 1, "balance_micros": 1})
+        if not doc:
+            return 0.0
+        if doc.get("balance_micros") is not None:
+            return from_micros(doc["balance_micros"])
+        return from_micros(to_micros(doc.get("balance")))
+
+    @classmethod
+    def balance_at(cls, user_id, at):
+        """
+        Balance of a user at a point in time
+
+        Starts from the latest snapshot taken at or before ``at`` and replays
+        only the journal entries after it.
+        """
+        user_id = cls._object_id(user_id)
+        snapshot = db[cls.SNAPSHOT_COLLECTION].find_one(
+            {"user_id": user_id, "as_of": {"$lte": at}}, sort=[("as_of", -1)]
+        )
+        created = {"$lte": at}
+        balance = 0
+        if snapshot:
+            created["$gt"] = snapshot["as_of"]
+            balance = snapshot["balance_micros"]
+        result = list(db[cls.COLLECTION].aggregate([
+            {"$match": {"user_id": user_id, "created_at": created, "status": {"$ne": "pending"}}},
+            {"$group": {"_id": None, "delta": {"$sum": "$amount_micros"}}}
+        ]))
+        if result:
+            balance += result[0]["delta"]
+        return from_micros(balance)
+
+    @classmethod
+    def take_snapshots(cls, as_of=None, batch_size=1000):
+        """
+        Snapshot the balance of every user with entries since the last run
+
+        Each new snapshot is the user's previous snapshot plus the sum of
+        their entries in (previous run, as_of], so snapshots are derived from
+        the journal alone. Pending entries up to as_of are settled first.
+
+        Returns:
+            int: Number of snapshots written
+        """
+        as_of = as_of or datetime.utcnow() - cls.SNAPSHOT_LAG
+        last = db[cls.SNAPSHOT_COLLECTION].find_one({}, {"as_of": 1}, sort=[("as_of", -1)])
+        created = {"$lte": as_of}
+        if last:
+            if last["as_of"] >= as_of:
+                return 0
+            created["$gt"] = last["as_of"]
+
+        cls.repair_pending(older_than=min(as_of, datetime.utcnow() - cls.REPAIR_GRACE))
+        deltas = db[cls.COLLECTION].aggregate([
+            {"$match": {"created_at": created, "status": {"$ne": "pending"}}},
+            {"$group": {"_id": "$user_id", "delta": {"$sum": "$amount_micros"}}}
+        ], allowDiskUse=True, batchSize=batch_size)
+
+        written = 0
+        batch = []
+        for row in deltas:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                written += cls._write_snapshots(batch, as_of)
+                batch = []
+        if batch:
+            written += cls._write_snapshots(batch, as_of)
+        logger.info(f"Balance snapshots written for {written} users as of {as_of}")
+        return written
+
+    @classmethod
+    def _write_snapshots(cls, deltas, as_of):
+        previous = {
+            row["_id"]: row["balance_micros"] for row in db[cls.SNAPSHOT_COLLECTION].aggregate([
+                {"$match": {"user_id": {"$in": [row["_id"] for row in deltas]}}},
+                {"$sort": {"user_id": 1, "as_of": -1}},
+                {"$group": {"_id": "$user_id", "balance_micros": {"$first": "$balance_micros"}}}
+            ])
+        }
+        db[cls.SNAPSHOT_COLLECTION].insert_many([
+            {
+                "user_id": row["_id"],
+                "balance_micros": Int64(previous.get(row["_id"], 0) + row["delta"]),
+                "as_of": as_of
+            }
+            for row in deltas
+        ], ordered=False)
+        return len(deltas)
+
+    @classmethod
+    def ensure_indexes(cls):
+        """
+        Create indexes for the ledger collections
+        """
+        db[cls.COLLECTION].create_index([("user_id", 1), ("created_at", 1)])
+        db[cls.COLLECTION].create_index("created_at")
+        db[cls.COLLECTION].create_index("reference", sparse=True)
+        db[cls.COLLECTION].create_index(
+            [("status", 1), ("created_at", 1)], partialFilterExpression={"status": "pending"}
+        )
+        try:
+            db[cls.COLLECTION].create_index(
+                "user_id", name="opening_balance_per_user", unique=True,
+                partialFilterExpression={"entry_type": "opening_balance"}
+            )
+        except DuplicateKeyError:
+            logger.warning("Users with more than one opening_balance entry exist; "
+                           "opening_balance_per_user index not created")
+        db[cls.SNAPSHOT_COLLECTION].create_index([("user_id", 1), ("as_of", -1)], unique=True)
+        db[cls.SNAPSHOT_COLLECTION].create_index("as_of")
@@ -0,0 +1,190 @@
+# app/models/moralis_address_registration.py
+from app import db
+from datetime import datetime, timedelta
+import uuid
+from pymongo import UpdateOne
+
+
+class MoralisAddressRegistration:
+    """
+    Registration queue and ledger for Moralis Stream addresses
+
+    One document per deposit address. New addresses are queued as 'pending',
+    flushed to the Moralis "add address" API in batches, and marked
+    'registered' once Moralis confirms them. Failed batches are retried with
+    exponential backoff until MAX_ATTEMPTS, after which they are 'failed'.
+    """
+
+    COLLECTION = 'moralis_address_registrations'
+
+    STATUS_PENDING = 'pending'
+    STATUS_IN_FLIGHT = 'in_flight'
+    STATUS_REGISTERED = 'registered'
+    STATUS_FAILED = 'failed'
+
+    MAX_ATTEMPTS = 8
+    MAX_BACKOFF_MINUTES = 60
+    # In-flight claims older than this are assumed lost (worker died mid-batch)
+    CLAIM_TIMEOUT_MINUTES = 10
+    # Addresses per update_many, so reconciliation of a large stream sends
+    # bounded $in lists instead of one filter with every address
+    UPDATE_CHUNK_SIZE = 1000
+
+    @staticmethod
+    def normalize(address):
+        """Addresses are stored lowercase so lookups and diffs are case-insensitive"""
+        return address.strip().lower() if address else None
+
+    @classmethod
+    def _chunks(cls, addresses):
+        for start in range(0, len(addresses), cls.UPDATE_CHUNK_SIZE):
+            yield addresses[start:start + cls.UPDATE_CHUNK_SIZE]
+
+    @classmethod
+    def enqueue(cls, addresses, source='wallet_created'):
+        """
+        Queue addresses for registration (already known addresses are left untouched)
+
+        Args:
+            addresses (list): Deposit addresses
+            source (str): Where the address came from, for auditing
+
+        Returns:
+            int: Number of newly queued addresses
+        """
+        now = datetime.utcnow()
+        operations = []
+        for address in {cls.normalize(a) for a in addresses if a}:
+            operations.append(UpdateOne(
+                {"address": address},
+                {"$setOnInsert": {
+                    "address": address,
+                    "status": cls.STATUS_PENDING,
+                    "attempts": 0,
+                    "source": source,
+                    "next_attempt_at": now,
+                    "created_at": now,
+                    "updated_at": now
+                }},
+                upsert=True
+            ))
+        if not operations:
+            return 0
+        result = db[cls.COLLECTION].bulk_write(operations, ordered=False)
+        return result.upserted_count
+
+    @classmethod
+    def claim_batch(cls, limit=100):
+        """
+        Claim up to ``limit`` addresses that are due for a registration attempt
+
+        Returns:
+            list: Claimed addresses
+        """
+        now = datetime.utcnow()
+        stale = now - timedelta(minutes=cls.CLAIM_TIMEOUT_MINUTES)
+        due = db[cls.COLLECTION].find(
+            {"$or": [
+                {"status": cls.STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+                {"status": cls.STATUS_IN_FLIGHT, "claimed_at": {"$lt": stale}}
+            ]},
+            {"address": 1}
+        ).sort("next_attempt_at", 1).limit(limit)
+        addresses = [doc["address"] for doc in due]
+        if not addresses:
+            return []
+
+        # Only keep the rows this worker actually flipped to in_flight
+        claim_token = uuid.uuid4().hex
+        db[cls.COLLECTION].update_many(
+            {"address": {"$in": addresses},
+             "$or": [{"status": cls.STATUS_PENDING},
+                     {"status": cls.STATUS_IN_FLIGHT, "claimed_at": {"$lt": stale}}]},
+            {"$set": {"status": cls.STATUS_IN_FLIGHT, "claimed_at": now, "claim_token": claim_token, "updated_at": now}}
+        )
+        claimed = db[cls.COLLECTION].find(
+            {"address": {"$in": addresses}, "status": cls.STATUS_IN_FLIGHT, "claim_token": claim_token},
+            {"address": 1}
+        )
+        return [doc["address"] for doc in claimed]
+
+    @classmethod
+    def mark_registered(cls, addresses, stream_id=None):
+        """Record addresses as confirmed on the stream"""
+        addresses = [cls.normalize(a) for a in addresses if a]
+        if not addresses:
+            return 0
+        now = datetime.utcnow()
+        modified = 0
+        for chunk in cls._chunks(addresses):
+            modified += db[cls.COLLECTION].update_many(
+                {"address": {"$in": chunk}},
+                {"$set": {
+                    "status": cls.STATUS_REGISTERED,
+                    "stream_id": stream_id,
+                    "registered_at": now,
+                    "last_error": None,
+                    "updated_at": now
+                },
+                 "$unset": {"claimed_at": "", "claim_token": ""}}
+            ).modified_count
+        return modified
+
+    @classmethod
+    def mark_failed(cls, addresses, error):
+        """
+        Put a failed batch back in the queue with exponential backoff
+
+        Addresses that reached MAX_ATTEMPTS are marked 'failed' and need a
+        reconciliation run (or manual requeue) to be retried.
+        """
+        now = datetime.utcnow()
+        operations = []
+        docs = db[cls.COLLECTION].find({"address": {"$in": addresses}}, {"address": 1, "attempts": 1})
+        for doc in docs:
+            attempts = doc.get("attempts", 0) + 1
+            backoff = min(2 ** attempts, cls.MAX_BACKOFF_MINUTES)
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {
+                    "status": cls.STATUS_FAILED if attempts >= cls.MAX_ATTEMPTS else cls.STATUS_PENDING,
+                    "attempts": attempts,
+                    "last_error": str(error)[:500],
+                    "next_attempt_at": now + timedelta(minutes=backoff),
+                    "updated_at": now
+                },
+                 "$unset": {"claimed_at": "", "claim_token": ""}}
+            ))
+        if operations:
+            db[cls.COLLECTION].bulk_write(operations, ordered=False)
+        return len(operations)
+
+    @classmethod
+    def requeue(cls, addresses):
+        """Reset addresses (e.g. found missing from the stream) to pending"""
+        addresses = [cls.normalize(a) for a in addresses if a]
+        if not addresses:
+            return 0
+        now = datetime.utcnow()
+        modified = 0
+        for chunk in cls._chunks(addresses):
+            modified += db[cls.COLLECTION].update_many(
+                {"address": {"$in": chunk}},
+                {"$set": {"status": cls.STATUS_PENDING, "attempts": 0, "next_attempt_at": now, "updated_at": now},
+                 "$unset": {"claimed_at": "", "claim_token": ""}}
+            ).modified_count
+        return modified
+
+    @classmethod
+    def status_counts(cls):
+        """Number of addresses per status"""
+        pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        return {row["_id"]: row["count"] for row in db[cls.COLLECTION].aggregate(pipeline)}
+
+    @classmethod
+    def ensure_indexes(cls):
+        """
+        Create indexes for the MoralisAddressRegistration collection
+        """
+        db[cls.COLLECTION].create_index("address", unique=True)
+        db[cls.COLLECTION].create_index([("status", 1), ("next_attempt_at", 1)])
@@ -1,8 +1,9 @@
 # app/models/pending_transaction.py
 from app import db
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
 from decimal import Decimal
+from pymongo import ReturnDocument
 
 class PendingTransaction:
     """
@@ -11,6 +12,18 @@ class PendingTransaction:
     """
     COLLECTION = 'pending_transactions'
     
+    # How long a worker owns a claimed transaction before others may reclaim it
+    LEASE_SECONDS = 300
+    
+    # A transaction whose lease expired this many times before it reached the
+    # send step is failed for manual review instead of being reclaimed again
+    MAX_CLAIMS = 3
+    
+    # A failed payment put back to pending waits before it is claimed again,
+    # doubling per retry up to the cap
+    RETRY_BACKOFF_SECONDS = 60
+    MAX_RETRY_BACKOFF_SECONDS = 3600
+    
     def __init__(self, source_wallet_id, destination_address, amount, 
                  transaction_type, reference_id=None, status='pending',
                  created_at=None, processed_at=None, blockchain_tx_hash=None,
@@ -258,6 +271,176 @@ class PendingTransaction:
         
         return result.modified_count > 0
     
+    @classmethod
+    def claim_next(cls, worker_id, lease_seconds=LEASE_SECONDS, max_claims=MAX_CLAIMS):
+        """
+        Atomically claim the oldest claimable transaction for a worker
+        
+        A transaction is claimable when it is pending and its next_attempt_at
+        (set by retry_after) has passed, or when it is processing under a lease
+        that has expired (its worker died or stalled) before mark_sending was
+        recorded. Expired leases that carry the sending marker are failed for
+        manual review first (fail_interrupted_sends), since the payment may
+        already be on chain. The status change, worker id and lease expiry are
+        set in the same find_one_and_update, so concurrent workers never claim
+        the same row. Only reclaims of expired leases count towards
+        ``max_claims``; claims of retried payments do not.
+        
+        Args:
+            worker_id (str): Identifier of the claiming worker
+            lease_seconds (int, optional): Lease duration. Defaults to LEASE_SECONDS.
+            max_claims (int, optional): Expired claims tolerated before failing. Defaults to MAX_CLAIMS.
+            
+        Returns:
+            dict or None: The claimed document, or None if the queue is empty
+        """
+        cls.fail_interrupted_sends()
+        while True:
+            now = datetime.utcnow()
+            claimed = db[cls.COLLECTION].find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$not": {"$gt": now}}},
+                    {"status": "processing", "lease_expires_at": {"$lt": now},
+                     "sending_at": {"$exists": False}}
+                ]},
+                [{"$set": {
+                    "status": "processing",
+                    "worker_id": worker_id,
+                    "claimed_at": "$$NOW",
+                    "lease_expires_at": {"$add": ["$$NOW", lease_seconds * 1000]},
+                    # Expressions in one $set stage see the pre-update status
+                    "expired_leases": {"$add": [
+                        {"$ifNull": ["$expired_leases", 0]},
+                        {"$cond": [{"$eq": ["$status", "processing"]}, 1, 0]}
+                    ]},
+                    "claim_latency_ms": {"$subtract": ["$$NOW", "$created_at"]}
+                }}],
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if claimed is None or claimed.get("expired_leases", 0) < max_claims:
+                return claimed
+            
+            # Reclaimed too often; park it for an operator instead of retrying
+            cls.finish(claimed["_id"], worker_id, {
+                "status": "failed",
+                "processed_at": now,
+                "error_message": f"Lease expired {claimed['expired_leases']} times; needs manual review"
+            })
+    
+    @classmethod
+    def mark_sending(cls, transaction_id, worker_id):
+        """
+        Record that the worker is about to submit the payment to the chain
+        
+        Must succeed before the transfer is requested. From then on an expired
+        lease is never reclaimed automatically, because the transfer may have
+        gone out even though the worker did not record the result.
+        
+        Returns:
+            bool: True if the worker still held the claim
+        """
+        result = db[cls.COLLECTION].update_one(
+            {"_id": transaction_id, "worker_id": worker_id, "status": "processing"},
+            {"$set": {"sending_at": datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+    
+    @classmethod
+    def fail_interrupted_sends(cls):
+        """
+        Fail transactions whose lease expired after mark_sending
+        
+        Returns:
+            int: Number of transactions moved to failed for manual review
+        """
+        now = datetime.utcnow()
+        result = db[cls.COLLECTION].update_many(
+            {"status": "processing", "lease_expires_at": {"$lt": now}, "sending_at": {"$exists": True}},
+            {"$set": {
+                "status": "failed",
+                "processed_at": now,
+                "error_message": "Worker stopped after submitting the payment; check the chain before retrying"
+            }, "$unset": {"lease_expires_at": ""}}
+        )
+        return result.modified_count
+    
+    @classmethod
+    def retry_after(cls, retry_count):
+        """
+        When a payment put back to pending after ``retry_count`` failures may
+        be claimed again
+        
+        Returns:
+            datetime: Value for next_attempt_at
+        """
+        backoff = min(cls.RETRY_BACKOFF_SECONDS * 2 ** max(retry_count - 1, 0), cls.MAX_RETRY_BACKOFF_SECONDS)
+        return datetime.utcnow() + timedelta(seconds=backoff)
+    
+    @classmethod
+    def finish(cls, transaction_id, worker_id, update_data):
+        """
+        Record the outcome of a claimed transaction and release its lease
+        
+        Only applies while the worker still holds the claim, so a worker whose
+        lease expired cannot overwrite the result of the worker that took over.
+        A transaction put back to pending loses its sending marker, since the
+        send is known to have failed.
+        
+        Returns:
+            bool: True if the worker still held the claim
+        """
+        unset = {"lease_expires_at": ""}
+        if update_data.get("status") == "pending":
+            unset["sending_at"] = ""
+        result = db[cls.COLLECTION].update_one(
+            {"_id": transaction_id, "worker_id": worker_id, "status": "processing"},
+            {"$set": update_data, "$unset": unset}
+        )
+        return result.modified_count > 0
+    
+    @classmethod
+    def queue_stats(cls):
+        """
+        Queue depth, per-status counts and recent claim latency
+        
+        Returns:
+            dict: status_counts, queue_depth, expired_leases, oldest_pending_seconds,
+                  claims_last_hour, avg_claim_latency_seconds, max_claim_latency_seconds
+        """
+        now = datetime.utcnow()
+        status_counts = {
+            row["_id"]: row["count"] for row in db[cls.COLLECTION].aggregate([
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+            ])
+        }
+        expired = db[cls.COLLECTION].count_documents(
+            {"status": "processing", "lease_expires_at": {"$lt": now}}
+        )
+        oldest = db[cls.COLLECTION].find_one(
+            {"status": "pending"}, {"created_at": 1}, sort=[("created_at", 1)]
+        )
+        latency = list(db[cls.COLLECTION].aggregate([
+            {"$match": {"claimed_at": {"$gte": now - timedelta(hours=1)}}},
+            {"$group": {
+                "_id": None,
+                "claims": {"$sum": 1},
+                "avg_ms": {"$avg": "$claim_latency_ms"},
+                "max_ms": {"$max": "$claim_latency_ms"}
+            }}
+        ]))
+        latency = latency[0] if latency else {}
+        return {
+            "status_counts": status_counts,
+            "queue_depth": status_counts.get("pending", 0) + expired,
+            "expired_leases": expired,
+            "oldest_pending_seconds": (now - oldest["created_at"]).total_seconds()
+                                      if oldest and oldest.get("created_at") else 0,
+            "claims_last_hour": latency.get("claims", 0),
+            "avg_claim_latency_seconds": (latency.get("avg_ms") or 0) / 1000,
+            "max_claim_latency_seconds": (latency.get("max_ms") or 0) / 1000
+        }
+    
     @classmethod
     def delete_by_id(cls, transaction_id):
         """
@@ -284,4 +467,6 @@ class PendingTransaction:
         db[cls.COLLECTION].create_index("source_wallet_id")
         db[cls.COLLECTION].create_index("blockchain_tx_hash", sparse=True)
         db[cls.COLLECTION].create_index("created_at")
-        db[cls.COLLECTION].create_index([("status", 1), ("created_at", 1)])
\ No newline at end of file
+        db[cls.COLLECTION].create_index([("status", 1), ("created_at", 1)])
+        db[cls.COLLECTION].create_index([("status", 1), ("lease_expires_at", 1)])
+        db[cls.COLLECTION].create_index("claimed_at", sparse=True)
\ No newline at end of file
@@ -0,0 +1,164 @@
+# app/models/platform_counters.py
+from app import db
+from datetime import datetime
+from bson import Decimal128
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _to_float(value):
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    return float(value or 0)
+
+
+class PlatformCounters:
+    """
+    Running platform totals for the admin dashboard
+
+    A single document (_id 'global') is kept current with $inc at the points
+    where users, investments, earnings and withdrawals are created or change
+    status, so the dashboard never has to count or $group whole collections.
+    A periodic snapshot (_id 'dashboard') combines the counters with the
+    current bid cycle and carries the time it was generated. rebuild()
+    recomputes every counter from the source collections to seed the document
+    and correct any drift.
+    """
+
+    COLLECTION = 'platform_counters'
+
+    COUNTERS_ID = 'global'
+    SNAPSHOT_ID = 'dashboard'
+
+    FIELDS = (
+        'total_users',
+        'active_users',
+        'total_investments',
+        'total_investment_amount',
+        'total_earnings_distributed',
+        'pending_withdrawals',
+        'pending_withdrawal_amount',
+    )
+
+    @classmethod
+    def increment(cls, **deltas):
+        """
+        Atomically add deltas to the running counters
+
+        Counter updates never fail the business operation that triggered
+        them; a missed increment is corrected by the next rebuild().
+        """
+        deltas = {k: v for k, v in deltas.items() if v}
+        if not deltas:
+            return
+        try:
+            db[cls.COLLECTION].update_one(
+                {"_id": cls.COUNTERS_ID},
+                {"$inc": deltas, "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error updating platform counters {deltas}: {str(e)}")
+
+    @classmethod
+    def record_user_created(cls, is_active=True):
+        cls.increment(total_users=1, active_users=1 if is_active else 0)
+
+    @classmethod
+    def record_investments_created(cls, amount, count=1):
+        cls.increment(total_investments=count, total_investment_amount=_to_float(amount))
+
+    @classmethod
+    def record_earning_created(cls, amount):
+        cls.increment(total_earnings_distributed=_to_float(amount))
+
+    @classmethod
+    def record_withdrawal_status_change(cls, amount, old_status, new_status):
+        """Move a withdrawal into or out of the pending totals"""
+        if old_status == new_status:
+            return
+        sign = 0
+        if new_status == 'pending':
+            sign = 1
+        elif old_status == 'pending':
+            sign = -1
+        if sign:
+            cls.increment(pending_withdrawals=sign, pending_withdrawal_amount=sign * _to_float(amount))
+
+    @staticmethod
+    def _sum(collection, match=None):
+        pipeline = [{"$match": match}] if match else []
+        pipeline.append({"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}})
+        result = list(collection.aggregate(pipeline))
+        if not result:
+            return 0, 0
+        return result[0]['count'], _to_float(result[0]['total'])
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recompute all counters from the source collections (full scan)
+
+        Returns:
+            dict: The rebuilt counters
+        """
+        total_investments, total_investment_amount = cls._sum(db.user_investments)
+        _, total_earnings = cls._sum(db.user_earnings)
+        pending_withdrawals, pending_withdrawal_amount = cls._sum(db.withdrawals, {"withdrawal_status": "pending"})
+
+        counters = {
+            'total_users': db.users.count_documents({}),
+            'active_users': db.users.count_documents({"is_active": True}),
+            'total_investments': total_investments,
+            'total_investment_amount': total_investment_amount,
+            'total_earnings_distributed': total_earnings,
+            'pending_withdrawals': pending_withdrawals,
+            'pending_withdrawal_amount': pending_withdrawal_amount,
+        }
+        now = datetime.utcnow()
+        db[cls.COLLECTION].update_one(
+            {"_id": cls.COUNTERS_ID},
+            {"$set": dict(counters, updated_at=now, rebuilt_at=now)},
+            upsert=True
+        )
+        return counters
+
+    @classmethod
+    def get_counters(cls):
+        """Current counters, rebuilding them first if they were never seeded"""
+        doc = db[cls.COLLECTION].find_one({"_id": cls.COUNTERS_ID})
+        if not doc or 'rebuilt_at' not in doc:
+            return cls.rebuild()
+        return {field: doc.get(field, 0) for field in cls.FIELDS}
+
+    @classmethod
+    def refresh_snapshot(cls):
+        """
+        Write the dashboard snapshot from the counters and current bid cycle
+
+        Returns:
+            dict: The snapshot document
+        """
+        statistics = cls.get_counters()
+        for field in ('total_investment_amount', 'total_earnings_distributed', 'pending_withdrawal_amount'):
+            statistics[field] = _to_float(statistics[field])
+
+        current_cycle = db.bid_cycles.find_one({}, sort=[("_id", -1)])
+        statistics['current_cycle'] = {
+            'id': str(current_cycle.get('_id')) if current_cycle else None,
+            'date': current_cycle.get('cycle_date').strftime('%Y-%m-%d') if current_cycle and current_cycle.get('cycle_date') else None,
+            'status': current_cycle.get('cycle_status') if current_cycle else None,
+            'filled': current_cycle.get('bids_filled') if current_cycle else 0,
+            'total': current_cycle.get('total_bids_allowed') if current_cycle else 0
+        }
+
+        snapshot = {"_id": cls.SNAPSHOT_ID, "statistics": statistics, "generated_at": datetime.utcnow()}
+        db[cls.COLLECTION].replace_one({"_id": cls.SNAPSHOT_ID}, snapshot, upsert=True)
+        return snapshot
+
+    @classmethod
+    def get_snapshot(cls):
+        """Latest dashboard snapshot, generating one if none exists yet"""
+        snapshot = db[cls.COLLECTION].find_one({"_id": cls.SNAPSHOT_ID})
+        return snapshot or cls.refresh_snapshot()
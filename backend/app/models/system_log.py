@@ -1,5 +1,6 @@
 # app/models/system_log.py
 from app import db
+from app.services.log_sink import log_sink
 from datetime import datetime
 from bson.objectid import ObjectId
 
@@ -29,8 +30,8 @@ class SystemLog:
             'log_message': self.log_message,
             'created_at': self.created_at
         }
-        result = db.system_log.insert_one(doc)
-        self._id = result.inserted_id
+        # Buffered; the document is written by the log sink's next flush
+        self._id = log_sink.write('system_log', doc)
         return self._id
     
     @classmethod
@@ -7,6 +7,7 @@ Uses MongoDB directly instead of SQLAlchemy.
 from app import db
 from datetime import datetime
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 
 class TeamBusiness:
     """MongoDB model for team business volume and rank tracking"""
@@ -22,46 +23,48 @@ class TeamBusiness:
         """
         Update a user's business volume and check for rank progression
         Returns the new business volume and rank level if updated
+        
+        The volume is added with a single atomic $inc (upserting new
+        records), so concurrent investments can't overwrite each other.
+        Rank progression is checked against the cached rank table.
         """
         from app.models.team_rewards import TeamReward
         
-        # Find existing team business record
-        team_business = cls.find_by_user_id(user_id)
+        additional_volume = float(additional_volume)
+        now = datetime.utcnow()
         
-        if not team_business:
-            # Create new team business record if it doesn't exist
-            new_record = {
-                "user_id": user_id,
-                "business_volume": float(additional_volume),
-                "current_rank_level": 1,  # Start at rank 1
-                "created_at": datetime.utcnow(),
-                "last_calculated_at": datetime.utcnow()
-            }
-            db[cls.COLLECTION].insert_one(new_record)
-            return {"business_volume": float(additional_volume), "rank_level": 1, "is_new": True}
+        # The pre-update document tells us whether this call created the
+        # record; $inc is atomic, so previous + additional is the stored value
+        previous = db[cls.COLLECTION].find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$inc": {"business_volume": additional_volume},
+                "$set": {"last_calculated_at": now},
+                "$setOnInsert": {"current_rank_level": 1, "created_at": now}  # Start at rank 1
+            },
+            projection={"business_volume": 1, "current_rank_level": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
         
-        # Update existing team business record with new volume
-        current_volume = float(team_business.get("business_volume", 0))
-        new_volume = current_volume + float(additional_volume)
-        current_rank = team_business.get("current_rank_level", 1)
+        if previous is None:
+            return {"business_volume": additional_volume, "rank_level": 1, "is_new": True}
         
-        # Check if user qualifies for a higher rank
-        next_rank = TeamReward.find_next_rank(current_rank, new_volume)
+        new_volume = float(previous.get("business_volume", 0)) + additional_volume
+        current_rank = previous.get("current_rank_level", 1)
         new_rank = current_rank
         
+        # Check if user qualifies for a higher rank
+        next_rank = TeamReward.next_rank_from_table(current_rank, new_volume)
         if next_rank:
-            # User has reached a new rank level
-            new_rank = next_rank.get("rankLevel")
-        
-        # Update the record
-        update_result = db[cls.COLLECTION].update_one(
-            {"user_id": user_id},
-            {"$set": {
-                "business_volume": new_volume,
-                "current_rank_level": new_rank,
-                "last_calculated_at": datetime.utcnow()
-            }}
-        )
+            # Only promote from the rank we read, so a concurrent update
+            # can't apply the same promotion twice
+            promoted = db[cls.COLLECTION].update_one(
+                {"user_id": user_id, "current_rank_level": current_rank},
+                {"$set": {"current_rank_level": next_rank["rank_level"]}}
+            )
+            if promoted.modified_count:
+                new_rank = next_rank["rank_level"]
         
         rank_changed = new_rank > current_rank
         
@@ -0,0 +1,246 @@
+# app/models/team_counters.py
+"""
+Per-user team size and team volume counters by referral level.
+Uses MongoDB directly instead of SQLAlchemy.
+"""
+
+from app import db
+from datetime import datetime
+from bson import Decimal128
+from bson.objectid import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_LEVELS = 12
+
+
+def _to_float(value):
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    return float(value or 0)
+
+
+class TeamCounters:
+    """
+    Running team counters for every upline member
+
+    Each document holds, for one user, the number of downline members and
+    the activated investment volume at each referral level:
+
+        {user_id, level_1: {members, volume}, ..., level_12: {members, volume},
+         total_members, total_volume, updated_at}
+
+    Registrations and investment activations $inc the counters of at most
+    MAX_LEVELS ancestors in one bulk write, so reading a team summary is a
+    single document fetch instead of a recursive walk of the tree.
+
+    The increments only add to what is already there, so the counters are
+    served only after rebuild() has seeded them; a state document
+    (_id 'rebuild_state') records when that last happened.
+    """
+    COLLECTION = 'team_counters'
+
+    STATE_ID = 'rebuild_state'
+
+    # Set once a completed rebuild has been seen; seeding is never undone
+    _seeded = False
+
+    @staticmethod
+    def _object_id(user_id):
+        if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+            return ObjectId(user_id)
+        return user_id
+
+    @staticmethod
+    def _id_forms(user_id):
+        """Both stored forms of an id, for matching ObjectId and string writers"""
+        if isinstance(user_id, ObjectId):
+            return [user_id, str(user_id)]
+        return [user_id]
+
+    @classmethod
+    def get_upline(cls, user_id, levels=MAX_LEVELS):
+        """
+        Ancestors of a user with their level
+
+        The chain is read in one $graphLookup. Each ancestor's level comes from
+        the referrer_id of the row below it, so an ancestor without a
+        referral_tree row of its own (the seeded root sponsor) is still
+        included. $graphLookup stops where a referrer_id is stored as a string
+        but user_id as an ObjectId (or the reverse); the walk continues from
+        there with a lookup that matches both forms.
+
+        Returns:
+            list: [(ancestor_id, level), ...] with level 1 the direct referrer
+        """
+        user_id = cls._object_id(user_id)
+        pipeline = [
+            {"$match": {"user_id": {"$in": cls._id_forms(user_id)}}},
+            {"$limit": 1},
+            {"$graphLookup": {
+                "from": "referral_tree",
+                "startWith": "$referrer_id",
+                "connectFromField": "referrer_id",
+                "connectToField": "user_id",
+                "maxDepth": levels - 1,
+                "as": "upline"
+            }},
+            {"$project": {"referrer_id": 1, "upline.user_id": 1, "upline.referrer_id": 1}}
+        ]
+        result = list(db.referral_tree.aggregate(pipeline))
+        if not result:
+            return []
+        referrer_of = {
+            cls._object_id(row["user_id"]): row.get("referrer_id") for row in result[0]["upline"]
+        }
+
+        upline = []
+        seen = {user_id}
+        ancestor = cls._object_id(result[0].get("referrer_id"))
+        while ancestor and ancestor not in seen and len(upline) < levels:
+            upline.append((ancestor, len(upline) + 1))
+            seen.add(ancestor)
+            if ancestor not in referrer_of:
+                row = db.referral_tree.find_one(
+                    {"user_id": {"$in": cls._id_forms(ancestor)}}, {"referrer_id": 1}
+                )
+                referrer_of[ancestor] = row.get("referrer_id") if row else None
+            ancestor = cls._object_id(referrer_of[ancestor])
+        return upline
+
+    @classmethod
+    def _apply(cls, user_id, field, amount):
+        """$inc level_N.<field> and total_<field> for every ancestor of user_id"""
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"user_id": ancestor_id},
+                {"$inc": {f"level_{level}.{field}": amount, f"total_{field}": amount},
+                 "$set": {"updated_at": now}},
+                upsert=True
+            )
+            for ancestor_id, level in cls.get_upline(user_id)
+        ]
+        if operations:
+            db[cls.COLLECTION].bulk_write(operations, ordered=False)
+        return len(operations)
+
+    @classmethod
+    def record_member_joined(cls, user_id):
+        """Count a newly registered user in the team of each ancestor"""
+        try:
+            return cls._apply(user_id, "members", 1)
+        except Exception as e:
+            logger.error(f"Error updating team member counters for {user_id}: {str(e)}")
+            return 0
+
+    @classmethod
+    def record_investment_activated(cls, user_id, amount):
+        """Add an activated investment to the team volume of each ancestor"""
+        amount = _to_float(amount)
+        if not amount:
+            return 0
+        try:
+            return cls._apply(user_id, "volume", amount)
+        except Exception as e:
+            logger.error(f"Error updating team volume counters for {user_id}: {str(e)}")
+            return 0
+
+    @classmethod
+    def is_seeded(cls):
+        """Whether rebuild() has completed at least once"""
+        if not cls._seeded:
+            cls._seeded = db[cls.COLLECTION].find_one({"_id": cls.STATE_ID}, {"_id": 1}) is not None
+        return cls._seeded
+
+    @classmethod
+    def find_by_user_id(cls, user_id):
+        """
+        Team summary for a user
+
+        Returns:
+            dict: levels (level_1..level_12 -> {members, volume}), total_members,
+            total_volume, or None while the counters have not been seeded
+        """
+        if not cls.is_seeded():
+            return None
+        doc = db[cls.COLLECTION].find_one({"user_id": cls._object_id(user_id)}) or {}
+        levels = {}
+        for level in range(1, MAX_LEVELS + 1):
+            counters = doc.get(f"level_{level}") or {}
+            levels[f"level_{level}"] = {
+                "members": int(counters.get("members", 0)),
+                "volume": _to_float(counters.get("volume"))
+            }
+        return {
+            "levels": levels,
+            "total_members": int(doc.get("total_members", 0)),
+            "total_volume": _to_float(doc.get("total_volume")),
+            "updated_at": doc.get("updated_at")
+        }
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """
+        Recompute every user's counters from referral_tree and user_investments
+
+        Used to seed the collection and to repair drift. The whole tree is
+        loaded into an array-backed ReferralForest and the per-level sums are
+        computed for all users at once.
+
+        Returns:
+            int: Number of counter documents written
+        """
+        from app.services.referral_forest import ReferralForest
+
+        forest = ReferralForest.load(db)
+
+        volume_of = {}
+        pipeline = [
+            {"$match": {"investment_status": {"$in": ["active", "completed"]}}},
+            {"$group": {"_id": "$user_id", "volume": {"$sum": "$amount"}}}
+        ]
+        for row in db.user_investments.aggregate(pipeline, allowDiskUse=True):
+            volume_of[row["_id"]] = _to_float(row["volume"])
+
+        members = forest.level_histogram(MAX_LEVELS)
+        volumes = forest.level_sums(forest.values_from(volume_of), MAX_LEVELS)
+        total_members = members.sum(axis=1)
+
+        now = datetime.utcnow()
+        operations = []
+        for i in map(int, (total_members > 0).nonzero()[0]):
+            doc = {
+                f"level_{level}": {"members": int(members[i, level - 1]), "volume": float(volumes[i, level - 1])}
+                for level in range(1, MAX_LEVELS + 1)
+                if members[i, level - 1]
+            }
+            doc["user_id"] = cls._object_id(str(forest.ids[i]))
+            doc["total_members"] = int(total_members[i])
+            doc["total_volume"] = float(volumes[i].sum())
+            doc["updated_at"] = now
+            operations.append(ReplaceOne({"user_id": doc["user_id"]}, doc, upsert=True))
+            if len(operations) >= batch_size:
+                db[cls.COLLECTION].bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            db[cls.COLLECTION].bulk_write(operations, ordered=False)
+
+        # Anything not rewritten above belongs to a user with no downline left
+        db[cls.COLLECTION].delete_many({"updated_at": {"$lt": now}})
+        db[cls.COLLECTION].replace_one(
+            {"_id": cls.STATE_ID},
+            {"rebuilt_at": now, "updated_at": now, "users": int((total_members > 0).sum())},
+            upsert=True
+        )
+        cls._seeded = True
+        return int((total_members > 0).sum())
+
+    @classmethod
+    def ensure_indexes(cls):
+        """
+        Create indexes for the TeamCounters collection
+        """
+        db[cls.COLLECTION].create_index("user_id", unique=True)
@@ -8,6 +8,15 @@ This model uses MongoDB directly.
 from app import db
 from datetime import datetime
 from bson.objectid import ObjectId
+from bisect import bisect_right
+import threading
+import time
+
+# Reward tiers change rarely; evaluating ranks from a copy avoids a query per user
+RANK_TABLE_TTL_SECONDS = 300
+
+_rank_table = {"ranks": None, "levels": [], "thresholds": [], "expires": 0.0}
+_rank_table_lock = threading.Lock()
 
 class TeamReward:
     """
@@ -34,6 +43,89 @@ class TeamReward:
             "isActive": True
         }, sort=[("rankLevel", 1)])
     
+    @staticmethod
+    def _normalize(doc):
+        """Rank rows may use camelCase (seeded defaults) or snake_case field names"""
+        def pick(camel, snake, default=None):
+            return doc.get(camel, doc.get(snake, default))
+        return {
+            "rank_level": int(pick("rankLevel", "rank_level", 0)),
+            "business_volume": float(pick("businessVolume", "business_volume", 0)),
+            "reward_amount": float(pick("rewardAmount", "reward_amount", 0))
+        }
+    
+    @classmethod
+    def _load_rank_table(cls, refresh=False):
+        now = time.monotonic()
+        with _rank_table_lock:
+            if not refresh and _rank_table["ranks"] is not None and _rank_table["expires"] > now:
+                return dict(_rank_table)
+        
+        docs = db[cls.COLLECTION].find({"$or": [{"isActive": True}, {"is_active": True}]})
+        ranks = sorted((cls._normalize(doc) for doc in docs), key=lambda r: r["rank_level"])
+        with _rank_table_lock:
+            _rank_table["ranks"] = ranks
+            # Parallel sorted keys for binary search; thresholds rise with rank
+            _rank_table["levels"] = [r["rank_level"] for r in ranks]
+            _rank_table["thresholds"] = [r["business_volume"] for r in ranks]
+            _rank_table["expires"] = now + RANK_TABLE_TTL_SECONDS
+            return dict(_rank_table)
+    
+    @classmethod
+    def rank_table(cls, refresh=False):
+        """
+        Active rank tiers sorted by rank level, cached in process
+        
+        Returns:
+            list: [{rank_level, business_volume, reward_amount}, ...]
+        """
+        return cls._load_rank_table(refresh)["ranks"]
+    
+    @classmethod
+    def payout_levels(cls):
+        """
+        Reward levels used by the team reward payout jobs
+        
+        The payouts only match rows stored with ``is_active: 1``, not the
+        seeded camelCase tiers, so this is read separately from rank_table().
+        
+        Returns:
+            list: [{rank_level, business_volume, reward_amount}, ...]
+        """
+        docs = db[cls.COLLECTION].find({"is_active": 1})
+        return sorted((cls._normalize(doc) for doc in docs), key=lambda r: r["rank_level"])
+    
+    @classmethod
+    def invalidate_rank_table(cls):
+        """Drop the cached rank tiers so the next read reloads them"""
+        with _rank_table_lock:
+            _rank_table["ranks"] = None
+    
+    @classmethod
+    def next_rank_from_table(cls, current_rank, business_volume):
+        """
+        In-memory equivalent of find_next_rank: the lowest rank above
+        ``current_rank`` whose threshold ``business_volume`` has reached
+        
+        Returns:
+            dict: Normalized rank row, or None
+        """
+        table = cls._load_rank_table()
+        # Tiers [0, reached) have thresholds <= business_volume
+        reached = bisect_right(table["thresholds"], business_volume)
+        # First tier with a rank level above the current one
+        candidate = bisect_right(table["levels"], current_rank)
+        if candidate < reached:
+            return table["ranks"][candidate]
+        return None
+    
+    @classmethod
+    def highest_rank_for_volume(cls, business_volume):
+        """Highest rank level whose threshold business_volume has reached (0 if none)"""
+        table = cls._load_rank_table()
+        reached = bisect_right(table["thresholds"], business_volume)
+        return table["levels"][reached - 1] if reached else 0
+    
     @classmethod
     def create(cls, rank_level, business_volume, reward_amount, is_active=True):
         """Create a new team reward level"""
@@ -45,6 +137,7 @@ class TeamReward:
             "createdAt": datetime.utcnow()
         }
         result = db[cls.COLLECTION].insert_one(reward_data)
+        cls.invalidate_rank_table()
         return result.inserted_id
     
     @classmethod
@@ -64,6 +157,7 @@ class TeamReward:
                 {"rankLevel": rank_level},
                 {"$set": update_data}
             )
+            cls.invalidate_rank_table()
             return result.modified_count > 0
         return False
     
@@ -71,6 +165,7 @@ class TeamReward:
     def delete(cls, rank_level):
         """Delete a team reward level"""
         result = db[cls.COLLECTION].delete_one({"rankLevel": rank_level})
+        cls.invalidate_rank_table()
         return result.deleted_count > 0
     
     @classmethod
@@ -164,5 +259,6 @@ class TeamReward:
                 }
             ]
             db[cls.COLLECTION].insert_many(default_rewards)
+            cls.invalidate_rank_table()
             return True
         return False
\ No newline at end of file
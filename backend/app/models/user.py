@@ -1,17 +1,69 @@
 # app/models/user.py
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.pin_hash_service import hash_pin, verify_pin
+from pymongo import UpdateOne
 from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
+from app.services.logging_service import get_logger, redacted
+
+logger = get_logger(__name__)
 
 class User:
     # Collection name
     collection = 'users'
     
+    # Persisted fields tracked for partial updates in save()
+    FIELDS = frozenset({
+        'sponsor_id', 'user_name', 'email', 'wallet_address', 'security_pin', 'balance',
+        'is_admin', 'is_active', 'facebook_profile', 'twitter_profile', 'instagram_profile',
+        'profile_image_id'
+    })
+    
+    # Rarely read fields live in a separate document per user
+    # ({user_id, profile_image_id, updated_at}) so the users document stays small;
+    # the image itself is in GridFS (app.services.profile_image_service)
+    COLD_COLLECTION = 'user_profiles'
+    COLD_FIELDS = ('profile_image_id',)
+    
+    # Named projections accepted by the loaders:
+    #   auth    - identity and PIN checks
+    #   summary - dashboard, team and socket lookups (a few hundred bytes)
+    #   profile - everything except the PIN hash, plus the cold fields
+    PROJECTIONS = {
+        'auth': {'sponsor_id': 1, 'user_name': 1, 'email': 1, 'wallet_address': 1,
+                 'security_pin': 1, 'is_admin': 1, 'is_active': 1},
+        'summary': {'sponsor_id': 1, 'user_name': 1, 'email': 1, 'wallet_address': 1,
+                    'balance': 1, 'balance_micros': 1, 'is_admin': 1, 'is_active': 1,
+                    'created_at': 1},
+        'profile': {'security_pin': 0},
+    }
+    
+    @classmethod
+    def projection(cls, name):
+        """Resolve a projection name (or pass through a dict / None)"""
+        if name is None or isinstance(name, dict):
+            return name
+        return cls.PROJECTIONS[name]
+    
     @classmethod
-    def find_by_id(cls, user_id):
-        """Find a user by their ID"""
+    def _find_one(cls, query, projection=None):
+        user_data = db[cls.collection].find_one(query, cls.projection(projection))
+        if not user_data:
+            return None
+        user = cls(user_data)
+        if projection == 'profile':
+            user.load_cold_fields()
+        return user
+    
+    @classmethod
+    def find_by_id(cls, user_id, projection=None):
+        """
+        Find a user by their ID
+        
+        ``projection`` is one of PROJECTIONS ('auth', 'summary', 'profile'),
+        a projection dict, or None for the whole users document.
+        """
         if isinstance(user_id, str):
             # Convert string ID to ObjectId if needed
             try:
@@ -19,45 +71,42 @@ class User:
             except:
                 pass
                 
-        user_data = db[cls.collection].find_one({'_id': user_id})
-        return cls(user_data) if user_data else None
+        return cls._find_one({'_id': user_id}, projection)
     
     @classmethod
-    def find_by_sponsor_id(cls, sponsor_id):
+    def find_by_sponsor_id(cls, sponsor_id, projection=None):
         """Find a user by their sponsor ID"""
-        user_data = db[cls.collection].find_one({'sponsor_id': sponsor_id})
-        return cls(user_data) if user_data else None
+        return cls._find_one({'sponsor_id': sponsor_id}, projection)
     
     @classmethod
-    def find_by_email(cls, email):
+    def find_by_email(cls, email, projection=None):
         """Find a user by their email"""
-        user_data = db[cls.collection].find_one({'email': email})
-        return cls(user_data) if user_data else None
+        return cls._find_one({'email': email}, projection)
     
     @classmethod
-    def find_by_wallet_address(cls, wallet_address):
+    def find_by_wallet_address(cls, wallet_address, projection=None):
         """Find a user by their wallet address with multiple lookup strategies"""
         if not wallet_address:
-            print("WARNING: Empty wallet address provided to find_by_wallet_address")
+            logger.warning("Empty wallet address provided to find_by_wallet_address")
             return None
             
         # First try exact match
-        user_data = db[cls.collection].find_one({'wallet_address': wallet_address})
-        if user_data:
-            print(f"Found user with exact wallet address match: {wallet_address}")
-            return cls(user_data)
+        user = cls._find_one({'wallet_address': wallet_address}, projection)
+        if user:
+            logger.debug("Found user with exact wallet address match: %s", wallet_address)
+            return user
             
         # If not found, try case-insensitive and format variations
-        print(f"No exact match for wallet address: {wallet_address}, trying alternatives")
+        logger.debug("No exact match for wallet address: %s, trying alternatives", wallet_address)
         
         # Try with whitespace trimmed
         if wallet_address != wallet_address.strip():
             trimmed = wallet_address.strip()
-            print(f"Trying with trimmed whitespace: '{trimmed}'")
-            user_data = db[cls.collection].find_one({'wallet_address': trimmed})
-            if user_data:
-                print(f"Found user with trimmed wallet address: {trimmed}")
-                return cls(user_data)
+            logger.debug("Trying with trimmed whitespace: '%s'", trimmed)
+            user = cls._find_one({'wallet_address': trimmed}, projection)
+            if user:
+                logger.debug("Found user with trimmed wallet address: %s", trimmed)
+                return user
                 
         try:
             # Try case-insensitive match with regex
@@ -65,35 +114,33 @@ class User:
             normalized = wallet_address.strip()
             try:
                 regex = re.compile(f"^{re.escape(normalized)}$", re.IGNORECASE)
-                user_data = db[cls.collection].find_one({'wallet_address': {'$regex': regex}})
-                if user_data:
-                    print(f"Found user with case-insensitive wallet address: {user_data.get('wallet_address')}")
-                    return cls(user_data)
+                user = cls._find_one({'wallet_address': {'$regex': regex}}, projection)
+                if user:
+                    logger.debug("Found user with case-insensitive wallet address: %s", user.wallet_address)
+                    return user
             except Exception as regex_error:
-                print(f"Error in regex lookup: {str(regex_error)}")
+                logger.warning("Error in regex lookup: %s", regex_error)
                 
             # Try with and without 0x prefix
             if normalized.startswith('0x'):
                 without_prefix = normalized[2:]
-                print(f"Trying without 0x prefix: '{without_prefix}'")
-                user_data = db[cls.collection].find_one({'wallet_address': without_prefix})
-                if user_data:
-                    print(f"Found user with non-prefixed wallet address: {without_prefix}")
-                    return cls(user_data)
+                logger.debug("Trying without 0x prefix: '%s'", without_prefix)
+                user = cls._find_one({'wallet_address': without_prefix}, projection)
+                if user:
+                    logger.debug("Found user with non-prefixed wallet address: %s", without_prefix)
+                    return user
             else:
                 with_prefix = f"0x{normalized}"
-                print(f"Trying with 0x prefix: '{with_prefix}'")
-                user_data = db[cls.collection].find_one({'wallet_address': with_prefix})
-                if user_data:
-                    print(f"Found user with prefixed wallet address: {with_prefix}")
-                    return cls(user_data)
+                logger.debug("Trying with 0x prefix: '%s'", with_prefix)
+                user = cls._find_one({'wallet_address': with_prefix}, projection)
+                if user:
+                    logger.debug("Found user with prefixed wallet address: %s", with_prefix)
+                    return user
                     
         except Exception as e:
-            print(f"Error during wallet address lookup: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("Error during wallet address lookup: %s", e)
             
-        print(f"No user found for wallet address: '{wallet_address}' after trying all lookup strategies")
+        logger.debug("No user found for wallet address: '%s' after trying all lookup strategies", wallet_address)
         return None
     
     def __init__(self, data=None):
@@ -114,24 +161,72 @@ class User:
         self.facebook_profile = ""
         self.twitter_profile = ""
         self.instagram_profile = ""
-        self.profile_image = None
+        self.profile_image_id = None
         
         # Apply data if provided
         if data:
             for key, value in data.items():
                 # Skip 'id' since it's a read-only property
                 if key == 'id' or key == '_id':
-                    # Special handling for ID fields
-                    if key == 'id':
-                        self._id = value
-                    else:  # key == '_id'
-                        self._id = value
+                    self._id = self._normalize_id(value)
                     continue
                     
                 try:
                     setattr(self, key, value)
                 except AttributeError as e:
-                    print(f"Warning in __init__: Could not set attribute '{key}': {str(e)}")
+                    logger.warning("Could not set attribute '%s' in __init__: %s", key, e)
+        
+        self._mark_clean()
+    
+    def __setattr__(self, name, value):
+        # Record assignments to persisted fields once the object is loaded
+        if name in self.FIELDS:
+            dirty = self.__dict__.get('_dirty')
+            if dirty is not None:
+                dirty.add(name)
+        object.__setattr__(self, name, value)
+    
+    @staticmethod
+    def _normalize_id(value):
+        """Stored ids are ObjectIds; convert their string form once on load"""
+        if isinstance(value, str) and ObjectId.is_valid(value):
+            return ObjectId(value)
+        return value
+    
+    def _mark_clean(self):
+        """Treat the current field values as the stored state"""
+        self.__dict__['_original'] = {name: self.__dict__.get(name) for name in self.FIELDS}
+        self.__dict__['_dirty'] = set()
+    
+    def changed_fields(self):
+        """
+        Fields assigned since the object was loaded or last saved
+        
+        Returns:
+            dict: field -> new value, for fields whose value actually differs
+        """
+        return {
+            name: self.__dict__.get(name)
+            for name in self._dirty
+            if self.__dict__.get(name) != self._original.get(name)
+        }
+    
+    def load_cold_fields(self):
+        """Fetch the cold fields (profile_image_id) from COLD_COLLECTION"""
+        cold = db[self.COLD_COLLECTION].find_one(
+            {'user_id': self._id}, {name: 1 for name in self.COLD_FIELDS}
+        ) or {}
+        for name in self.COLD_FIELDS:
+            self.__dict__[name] = cold.get(name)
+            self._original[name] = cold.get(name)
+        return self
+    
+    def _save_cold_fields(self, values, now):
+        db[self.COLD_COLLECTION].update_one(
+            {'user_id': self._id},
+            {'$set': dict(values, updated_at=now)},
+            upsert=True
+        )
     
     @classmethod
     def from_dict(cls, data):
@@ -144,7 +239,7 @@ class User:
         
         # Special handling for _id field
         if '_id' in data:
-            user._id = data['_id']
+            user._id = cls._normalize_id(data['_id'])
         
         # Map MongoDB document fields to User object attributes
         for key, value in data.items():
@@ -155,11 +250,12 @@ class User:
             try:
                 setattr(user, key, value)
             except AttributeError as e:
-                print(f"Warning: Could not set attribute '{key}': {str(e)}")
+                logger.warning("Could not set attribute '%s': %s", key, e)
                 # Store in __dict__ as fallback
                 user.__dict__[key] = value
         
-        print(f"Created User object from document: id={user.id}, sponsor_id={user.sponsor_id}")
+        user._mark_clean()
+        logger.debug("Created User object from document: id=%s, sponsor_id=%s", user.id, user.sponsor_id)
         return user
         
     @property
@@ -168,165 +264,102 @@ class User:
         return self._id
     
     def set_pin(self, pin):
-        self.security_pin = generate_password_hash(pin, method='pbkdf2:sha256')
+        # Hashing runs in the native thread pool so it doesn't block the eventlet hub
+        self.security_pin = hash_pin(pin)
     
     def check_pin(self, pin):
         try:
-            # More secure logging - mask PIN and don't show actual hash
-            masked_pin = f"{pin[:1]}{'*' * (len(pin) - 2)}{pin[-1:]}" if len(pin) > 2 else "****"
-            print(f"Checking PIN for user {self.id} ({self.sponsor_id})")
-            print(f"Security PIN hash exists: {bool(self.security_pin)}")
-            print(f"Testing with masked pin: {masked_pin}")
+            # Neither the PIN nor its hash is ever logged
+            logger.debug("Checking PIN for user %s (%s), hash exists: %s",
+                         self.id, self.sponsor_id, bool(self.security_pin))
             
             # Check for None or empty string first
             if not self.security_pin:
-                print("Security PIN is None or empty!")
+                logger.warning("Security PIN is not set for user %s", self.id)
                 if pin == '123456':  # Default PIN for testing
-                    print("Using default admin PIN - setting new hash")
+                    logger.warning("Using default admin PIN - setting new hash for user %s", self.id)
                     self.set_pin(pin)
                     save_result = self.save()
-                    print(f"PIN hash saved successfully: {save_result}")
+                    logger.info("PIN hash saved for user %s: %s", self.id, save_result)
                     return True
                 return False
 
             try:
                 # Try to check with the existing hash
-                result = check_password_hash(self.security_pin, pin)
-                print(f"PIN check result: {result}")
+                result = verify_pin(self.security_pin, pin)
+                logger.debug("PIN check result for user %s: %s", self.id, result)
                 return result
             except Exception as hash_error:
                 # More detailed error handling for hash format issues
                 error_msg = str(hash_error)
-                print(f"PIN check error: {error_msg}")
+                logger.warning("PIN check error for user %s: %s", self.id, error_msg)
                 
                 # Handle specific hash format errors
                 if 'unsupported hash type scrypt' in error_msg.lower() or 'malformed' in error_msg.lower():
                     # Assume the PIN is correct for this login and update it to the new format
                     # This provides a migration path for existing users
-                    print(f"Migrating user {self.id} from old hash format to pbkdf2")
+                    logger.info("Migrating user %s from old hash format to pbkdf2", self.id)
                     self.set_pin(pin)
                     save_result = self.save()
-                    print(f"Migration result - hash saved: {save_result}")
+                    logger.info("PIN hash migration for user %s saved: %s", self.id, save_result)
                     return True
                     
                 # For any other hash error, log details but fail verification
-                print(f"Hash verification failed: {error_msg}")
+                logger.warning("Hash verification failed for user %s: %s", self.id, error_msg)
                 return False
         
         except Exception as e:
             # Catch-all for any other unexpected errors
-            print(f"Unexpected error in PIN verification: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("Unexpected error in PIN verification: %s", e)
             return False
     
     def save(self):
-        """Save user to the database"""
-        data = self.to_mongo()
-        
-        # Update timestamp
-        data['updated_at'] = datetime.utcnow()
+        """
+        Save user to the database
         
+        New users are inserted. Existing users get a single update_one that
+        $sets only the fields assigned since load (see changed_fields), so
+        unchanged fields are never rewritten. Returns True if the user
+        was found (or there was nothing to write).
+        """
         if self._id:
-            # Update existing user
-            # Debug log the ID type
-            print(f"DEBUG - Saving user with _id: {self._id} (type: {type(self._id)})")
-            
-            # First perform a direct query to verify the document exists and ID type
-            direct_query = None
-            direct_result = None
-            
-            # Try different ways to find the document
-            if isinstance(self._id, int):
-                # For integer IDs, try direct integer lookup
-                direct_query = {'_id': self._id}
-                direct_result = db[self.collection].find_one(direct_query)
-                print(f"DEBUG - Direct lookup with integer ID {self._id}: {direct_result is not None}")
-                
-                # If not found, try other fields as fallback
-                if not direct_result and self.sponsor_id:
-                    alt_query = {'sponsor_id': self.sponsor_id}
-                    direct_result = db[self.collection].find_one(alt_query)
-                    if direct_result:
-                        direct_query = alt_query
-                        print(f"DEBUG - Found by sponsor_id: {self.sponsor_id}")
-            elif isinstance(self._id, str):
-                # Try ObjectId conversion
-                try:
-                    obj_id = ObjectId(self._id)
-                    direct_query = {'_id': obj_id}
-                    direct_result = db[self.collection].find_one(direct_query)
-                    print(f"DEBUG - Direct lookup with ObjectId: {direct_result is not None}")
-                except:
-                    # If not a valid ObjectId, try string ID directly
-                    direct_query = {'_id': self._id}
-                    direct_result = db[self.collection].find_one(direct_query)
-                    print(f"DEBUG - Direct lookup with string ID: {direct_result is not None}")
-                
-                # If not found and we have sponsor_id, try that as fallback
-                if not direct_result and self.sponsor_id:
-                    alt_query = {'sponsor_id': self.sponsor_id}
-                    direct_result = db[self.collection].find_one(alt_query)
-                    if direct_result:
-                        direct_query = alt_query
-                        print(f"DEBUG - Found by sponsor_id: {self.sponsor_id}")
-            else:
-                # For any other type, try direct
-                direct_query = {'_id': self._id}
-                direct_result = db[self.collection].find_one(direct_query)
-                print(f"DEBUG - Direct lookup with ID type {type(self._id)}: {direct_result is not None}")
-            
-            # If document wasn't found by any method, this is an error
-            if not direct_result:
-                print(f"DEBUG - Critical error: Document not found with any ID method")
-                # Last ditch effort - try using sponsor_id if available
-                if self.sponsor_id:
-                    print(f"DEBUG - Trying to save using sponsor_id instead of _id")
-                    # Ensure _id is not in data to avoid conflicts
-                    if '_id' in data:
-                        del data['_id']
-                    try:
-                        result = db[self.collection].update_one(
-                            {'sponsor_id': self.sponsor_id},
-                            {'$set': data}
-                        )
-                        success = result.matched_count > 0
-                        print(f"DEBUG - Sponsor_id update result: {success}")
-                        return success
-                    except Exception as e:
-                        print(f"DEBUG - Sponsor_id update error: {str(e)}")
-                return False
-            
-            # Use the successful direct query for the update
-            query = direct_query
-            print(f"DEBUG - Using verified query: {query}")
-            
-            # Ensure _id is removed from update data
-            if '_id' in data:
-                del data['_id']
-                print("DEBUG - Removed _id from update data")
-                
-            # Log update operation
-            print(f"DEBUG - Update query: {query}")
-            print(f"DEBUG - Update data: {data}")
+            changes = self.changed_fields()
+            # Balances only change through the ledger (app.models.ledger); writing
+            # back the value loaded with this object would undo concurrent changes
+            changes.pop('balance', None)
+            cold = {name: changes.pop(name) for name in self.COLD_FIELDS if name in changes}
+            if not changes and not cold:
+                return True
             
-            # Perform update
+            now = datetime.utcnow()
+            changes['updated_at'] = now
+            logger.debug("Updating user %s: %s", self._id, redacted(changes))
             try:
-                result = db[self.collection].update_one(
-                    query,
-                    {'$set': data}
-                )
-                print(f"DEBUG - Update result: {result.matched_count} matched, {result.modified_count} modified")
-                return result.matched_count > 0  # Success if document was found, even if no change needed
+                result = db[self.collection].update_one({'_id': self._id}, {'$set': changes})
+                if result.matched_count and cold:
+                    self._save_cold_fields(cold, now)
             except Exception as e:
-                print(f"DEBUG - Update error: {str(e)}")
+                logger.error("User update error: %s", e)
                 return False
+            
+            if not result.matched_count:
+                logger.error("User document %s not found", self._id)
+                return False
+            self.updated_at = now
+            self._mark_clean()
+            return True
         else:
             # Create new user with timestamp
+            data = self.to_mongo()
+            data['updated_at'] = datetime.utcnow()
             data['created_at'] = datetime.utcnow()
+            cold = {name: data.pop(name) for name in self.COLD_FIELDS if data.get(name) is not None}
             try:
                 result = db[self.collection].insert_one(data)
                 self._id = result.inserted_id
+                if cold:
+                    self._save_cold_fields(cold, data['updated_at'])
+                self._mark_clean()
                 return True
             except DuplicateKeyError:
                 return False
@@ -350,16 +383,13 @@ class User:
         }
         
         # Include profile image only if it exists (can be None)
-        if hasattr(self, 'profile_image') and self.profile_image is not None:
-            data['profile_image'] = self.profile_image
+        if self.profile_image_id is not None:
+            data['profile_image_id'] = self.profile_image_id
         
         # Only include _id if it exists
         if self._id:
             data['_id'] = self._id
-            
-        # Print debug info
-        print(f"DEBUG - to_mongo data: {data}")
-            
+
         return data
     
     def to_dict(self):
@@ -377,9 +407,15 @@ class User:
         }
         
         # Include social media fields if they exist
-        for field in ['facebook_profile', 'twitter_profile', 'instagram_profile', 'profile_image']:
+        for field in ['facebook_profile', 'twitter_profile', 'instagram_profile']:
             if hasattr(self, field) and getattr(self, field) is not None:
                 data[field] = getattr(self, field)
+        
+        # Images are served from GridFS; payloads only carry their URLs
+        if self.profile_image_id:
+            from app.services.profile_image_service import profile_image_url
+            data['profile_image'] = profile_image_url(self.profile_image_id)
+            data['profile_image_thumb'] = profile_image_url(self.profile_image_id, 'thumb')
                 
         return data
     
@@ -391,4 +427,45 @@ class User:
         """Create indexes for the users collection"""
         db[cls.collection].create_index('sponsor_id', unique=True)
         db[cls.collection].create_index('email', unique=True)
-        db[cls.collection].create_index('wallet_address', unique=True)
\ No newline at end of file
+        db[cls.collection].create_index('wallet_address', unique=True)
+        # Keyset pagination indexes for the admin user listings: one per sort
+        # key (with the _id tie-breaker), followed by the email_prefix and
+        # created_from/created_to filter fields so filtered pages are
+        # answered from the index in sort order without an in-memory sort
+        db[cls.collection].create_index([('sponsor_id', 1), ('_id', 1), ('email', 1), ('created_at', 1)])
+        db[cls.collection].create_index([('created_at', 1), ('_id', 1), ('email', 1)])
+        db[cls.collection].create_index([('_id', 1), ('email', 1), ('created_at', 1)])
+        db[cls.COLD_COLLECTION].create_index('user_id', unique=True)
+    
+    @classmethod
+    def migrate_cold_fields(cls, batch_size=200):
+        """
+        Move cold fields still stored inline on users documents to COLD_COLLECTION
+        
+        Idempotent; only documents that still carry a cold field are touched.
+        
+        Returns:
+            int: Number of users migrated
+        """
+        inline = {'$or': [{name: {'$exists': True}} for name in cls.COLD_FIELDS]}
+        projection = {name: 1 for name in cls.COLD_FIELDS}
+        migrated = 0
+        while True:
+            batch = list(db[cls.collection].find(inline, projection).limit(batch_size))
+            if not batch:
+                return migrated
+            now = datetime.utcnow()
+            db[cls.COLD_COLLECTION].bulk_write([
+                UpdateOne(
+                    {'user_id': doc['_id']},
+                    {'$set': dict({name: doc.get(name) for name in cls.COLD_FIELDS}, updated_at=now)},
+                    upsert=True
+                )
+                for doc in batch
+            ], ordered=False)
+            db[cls.collection].update_many(
+                {'_id': {'$in': [doc['_id'] for doc in batch]}},
+                {'$unset': {name: '' for name in cls.COLD_FIELDS}}
+            )
+            migrated += len(batch)
+            logger.info("Moved cold fields for %d users to %s", migrated, cls.COLD_COLLECTION)
\ No newline at end of file
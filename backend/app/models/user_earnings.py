@@ -95,6 +95,8 @@ class UserEarning:
             data.pop("_id", None)  # Remove None _id for insert
             result = db[self.COLLECTION].insert_one(data)
             self.id = result.inserted_id
+            from app.models.platform_counters import PlatformCounters
+            PlatformCounters.record_earning_created(self.amount)
             return self.id
     
     @classmethod
@@ -95,12 +95,22 @@ class UserInvestment:
                 {"_id": self.id},
                 {"$set": data}
             )
+            # Status changes feed the stored level income eligibility flag
+            from app.services.eligibility_service import refresh_eligibility
+            refresh_eligibility([self.user_id])
             return self.id
         else:
             # Insert new document
             data.pop("_id", None)  # Remove None _id for insert
             result = db[self.COLLECTION].insert_one(data)
             self.id = result.inserted_id
+            from app.models.platform_counters import PlatformCounters
+            PlatformCounters.record_investments_created(self.amount)
+            if self.investment_status == 'active':
+                from app.models.team_counters import TeamCounters
+                TeamCounters.record_investment_activated(self.user_id, self.amount)
+                from app.services.eligibility_service import refresh_eligibility
+                refresh_eligibility([self.user_id])
             return self.id
     
     @classmethod
@@ -2,6 +2,7 @@
 from app import db
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
 
 class UserWallet:
     """
@@ -257,9 +258,29 @@ class UserWallet:
     def ensure_indexes(cls):
         """
         Create indexes for the UserWallet collection
+        
+        A user has at most one deposit wallet. Registration creates it in a
+        background task while /api/wallet/generate may create it on demand,
+        so the unique index is what keeps the two from both inserting.
         """
-        db[cls.COLLECTION].create_index("user_id")
+        cls._ensure_unique_user_index()
         db[cls.COLLECTION].create_index("deposit_address", unique=True, sparse=True)
         db[cls.COLLECTION].create_index("wallet_type")
         db[cls.COLLECTION].create_index("blockchain")
-        db[cls.COLLECTION].create_index([("user_id", 1), ("wallet_type", 1)])
\ No newline at end of file
+        db[cls.COLLECTION].create_index([("user_id", 1), ("wallet_type", 1)])
+    
+    @classmethod
+    def _ensure_unique_user_index(cls):
+        unique_user = dict(unique=True, partialFilterExpression={"wallet_type": "user"})
+        try:
+            db[cls.COLLECTION].create_index("user_id", **unique_user)
+        except DuplicateKeyError:
+            print("WARNING: users with more than one deposit wallet exist; "
+                  "keeping a non-unique user_id index until they are merged")
+            db[cls.COLLECTION].create_index("user_id")
+        except OperationFailure as e:
+            # 85/86: the older non-unique user_id index is still there
+            if e.code not in (85, 86):
+                raise
+            db[cls.COLLECTION].drop_index([("user_id", 1)])
+            cls._ensure_unique_user_index()
\ No newline at end of file
@@ -0,0 +1,39 @@
+# app/services/aggregation.py
+"""
+Shared aggregation pipeline stages
+
+The application still supports MongoDB servers older than 5.0, where
+$lookup cannot combine localField/foreignField with a sub-pipeline. Joins
+that project or filter the joined documents are therefore written in the
+let/$expr form built here; an $expr $eq on the joined field still uses
+that field's index.
+"""
+
+
+def lookup_eq(from_collection, local_field, foreign_field, as_field, project=None, match=None):
+    """
+    $lookup stage joining the documents whose ``foreign_field`` equals ``local_field``
+
+    Args:
+        from_collection (str): Collection to join
+        local_field (str): Field of the input documents
+        foreign_field (str): Field of the joined documents
+        as_field (str): Output array field
+        project (dict, optional): Projection of the joined documents
+        match (dict, optional): Extra conditions on the joined documents
+
+    Returns:
+        dict: The $lookup stage
+    """
+    condition = {'$expr': {'$eq': [f'${foreign_field}', '$$value']}}
+    if match:
+        condition.update(match)
+    pipeline = [{'$match': condition}]
+    if project:
+        pipeline.append({'$project': project})
+    return {'$lookup': {
+        'from': from_collection,
+        'let': {'value': f'${local_field}'},
+        'pipeline': pipeline,
+        'as': as_field
+    }}
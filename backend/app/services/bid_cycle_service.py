@@ -1,5 +1,6 @@
 # app/services/bid_cycle_service.py
 from app import db
+from app.services.log_sink import log_sink
 from app.models.bid_cycles import BidCycle
 from app.models.system_settings import SystemSettings
 from app.models.unit_progression import UnitProgression
@@ -205,6 +206,6 @@ class BidCycleService:
                 "log_message": f"Bid cycle #{cycle.id} immediately processed upon detection as filled",
                 "created_at": datetime.utcnow()
             }
-            db.system_logs.insert_one(log_data)
+            log_sink.write('system_logs', log_data)
         
         return cycle
\ No newline at end of file
@@ -0,0 +1,181 @@
+# app/services/eligibility_service.py
+"""
+Denormalized level-income eligibility on referral_tree documents
+
+A referrer is eligible for level income when their level income is not on
+hold, they have at least ``min_legs_for_reward`` active legs and at least one
+active investment. Instead of checking income_hold_status, user_legs,
+system_settings and user_investments on every level of every commission walk,
+each user's referral_tree document carries:
+
+    eligible_for_level_income   bool
+    eligibility_reason          'eligible' | 'income_on_hold' | 'insufficient_legs' | 'no_active_investment'
+    eligibility_checked_at      datetime
+
+The flag is recomputed only when one of its inputs changes (hold status,
+leg counts, investments, or the min_legs_for_reward setting).
+"""
+import logging
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from app import db
+from app.services.system_service import get_system_setting
+
+logger = logging.getLogger('awardloop')
+
+MIN_LEGS_SETTING = 'min_legs_for_reward'
+
+REASON_ELIGIBLE = 'eligible'
+REASON_ON_HOLD = 'income_on_hold'
+REASON_INSUFFICIENT_LEGS = 'insufficient_legs'
+REASON_NO_INVESTMENT = 'no_active_investment'
+
+
+def _object_id(user_id):
+    if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+        return ObjectId(user_id)
+    return user_id
+
+
+def compute_eligibility(user_ids, min_legs=None):
+    """
+    Evaluate level-income eligibility for a batch of users
+
+    Uses one query per input collection for the whole batch. Some writers
+    (purchase_unit among them) store user_id as a string, so both forms are
+    matched and normalized back to ObjectId.
+
+    Args:
+        user_ids (list): User IDs
+        min_legs (int, optional): Threshold; read from system settings if omitted
+
+    Returns:
+        dict: user_id -> (eligible, reason)
+    """
+    user_ids = [_object_id(u) for u in user_ids if u is not None]
+    if not user_ids:
+        return {}
+    if min_legs is None:
+        min_legs = int(get_system_setting(MIN_LEGS_SETTING, 5))
+
+    keys = user_ids + [str(u) for u in user_ids if isinstance(u, ObjectId)]
+
+    on_hold = {
+        _object_id(doc['user_id']) for doc in db.income_hold_status.find(
+            {'user_id': {'$in': keys}, 'level_income_on_hold': True}, {'user_id': 1}
+        )
+    }
+    active_legs = {}
+    for doc in db.user_legs.find({'user_id': {'$in': keys}}, {'user_id': 1, 'active_legs': 1}):
+        user_id = _object_id(doc['user_id'])
+        active_legs[user_id] = max(active_legs.get(user_id, 0), doc.get('active_legs', 0))
+    invested = {
+        _object_id(user_id) for user_id in db.user_investments.distinct(
+            'user_id', {'user_id': {'$in': keys}, 'investment_status': 'active'}
+        )
+    }
+
+    result = {}
+    for user_id in user_ids:
+        if user_id in on_hold:
+            result[user_id] = (False, REASON_ON_HOLD)
+        elif active_legs.get(user_id, 0) < min_legs:
+            result[user_id] = (False, REASON_INSUFFICIENT_LEGS)
+        elif user_id not in invested:
+            result[user_id] = (False, REASON_NO_INVESTMENT)
+        else:
+            result[user_id] = (True, REASON_ELIGIBLE)
+    return result
+
+
+def _store_eligibility(flags):
+    if not flags:
+        return 0
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne({'user_id': user_id}, {'$set': {
+            'eligible_for_level_income': eligible,
+            'eligibility_reason': reason,
+            'eligibility_checked_at': now
+        }})
+        for user_id, (eligible, reason) in flags.items()
+    ]
+    return db.referral_tree.bulk_write(operations, ordered=False).modified_count
+
+
+def refresh_eligibility(user_ids, min_legs=None):
+    """
+    Recompute and store the eligibility flag for the given users
+
+    Returns:
+        int: Number of referral_tree documents updated
+    """
+    try:
+        return _store_eligibility(compute_eligibility(user_ids, min_legs))
+    except Exception as e:
+        logger.error(f"Error refreshing level income eligibility: {e}")
+        return 0
+
+
+def refresh_all_eligibility(batch_size=1000):
+    """
+    Recompute the flag for every user (after the threshold setting changes)
+
+    Returns:
+        int: Number of users evaluated
+    """
+    min_legs = int(get_system_setting(MIN_LEGS_SETTING, 5))
+    evaluated = 0
+    batch = []
+    for doc in db.referral_tree.find({}, {'user_id': 1}).batch_size(batch_size):
+        batch.append(doc['user_id'])
+        if len(batch) >= batch_size:
+            refresh_eligibility(batch, min_legs)
+            evaluated += len(batch)
+            batch = []
+    if batch:
+        refresh_eligibility(batch, min_legs)
+        evaluated += len(batch)
+    logger.info(f"Level income eligibility recomputed for {evaluated} users (min legs {min_legs})")
+    return evaluated
+
+
+def on_setting_changed(setting_key):
+    """Recompute every flag in the background when the leg threshold changes"""
+    if setting_key != MIN_LEGS_SETTING:
+        return
+    from app import socketio
+    socketio.start_background_task(refresh_all_eligibility)
+
+
+def eligibility_from_referral(referral_doc):
+    """
+    Read the stored flag from a referral_tree document
+
+    Returns:
+        tuple: (eligible, reason), or None if the flag was never computed
+    """
+    if not referral_doc or 'eligible_for_level_income' not in referral_doc:
+        return None
+    return bool(referral_doc['eligible_for_level_income']), referral_doc.get('eligibility_reason')
+
+
+def is_eligible_for_level_income(user_id):
+    """
+    Stored eligibility for one user, computing and storing it on first use
+
+    Returns:
+        bool
+    """
+    user_id = _object_id(user_id)
+    referral = db.referral_tree.find_one(
+        {'user_id': user_id}, {'eligible_for_level_income': 1, 'eligibility_reason': 1}
+    )
+    stored = eligibility_from_referral(referral)
+    if stored is not None:
+        return stored[0]
+    flags = compute_eligibility([user_id])
+    if referral:
+        _store_eligibility(flags)
+    return flags.get(user_id, (False, None))[0]
@@ -0,0 +1,143 @@
+# app/services/hd_wallet.py
+"""
+Local BIP32 public-key derivation for BSC deposit addresses
+
+Tatum's v3 wallet endpoint returns an account-level xpub (m/44'/60'/0'/0).
+Deposit addresses are the non-hardened children of that key, so they can be
+derived from the xpub alone without a network round trip or any private key
+material: child index ``i`` here matches Tatum's ``/bsc/address/{xpub}/{i}``.
+"""
+import hashlib
+import hmac
+import logging
+
+# Keccak-256 and EIP-55 checksums come from eth-utils (installed with web3)
+try:
+    from eth_utils import keccak, to_checksum_address
+    KECCAK_AVAILABLE = True
+except ImportError:
+    KECCAK_AVAILABLE = False
+    logging.warning("eth-utils not installed. Local xpub address derivation is unavailable.")
+
+# secp256k1 curve parameters
+_P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_G = (
+    0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+    0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8
+)
+
+_BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+# Highest non-hardened child index
+MAX_CHILD_INDEX = 2 ** 31 - 1
+
+
+class HDWalletError(ValueError):
+    """Raised when an xpub can't be parsed or a child can't be derived"""
+
+
+def _base58check_decode(value):
+    number = 0
+    for char in value:
+        digit = _BASE58_ALPHABET.find(char)
+        if digit < 0:
+            raise HDWalletError(f"Invalid base58 character: {char!r}")
+        number = number * 58 + digit
+    raw = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    raw = b'\x00' * (len(value) - len(value.lstrip('1'))) + raw
+
+    payload, checksum = raw[:-4], raw[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        raise HDWalletError("Invalid xpub checksum")
+    return payload
+
+
+def _point_add(p1, p2):
+    if p1 is None:
+        return p2
+    if p2 is None:
+        return p1
+    if p1[0] == p2[0]:
+        if (p1[1] + p2[1]) % _P == 0:
+            return None
+        slope = 3 * p1[0] * p1[0] * pow(2 * p1[1], -1, _P)
+    else:
+        slope = (p2[1] - p1[1]) * pow(p2[0] - p1[0], -1, _P)
+    x = (slope * slope - p1[0] - p2[0]) % _P
+    return x, (slope * (p1[0] - x) - p1[1]) % _P
+
+
+def _point_multiply(k, point=_G):
+    result = None
+    while k:
+        if k & 1:
+            result = _point_add(result, point)
+        point = _point_add(point, point)
+        k >>= 1
+    return result
+
+
+def _decompress(pubkey):
+    if len(pubkey) != 33 or pubkey[0] not in (2, 3):
+        raise HDWalletError("Invalid compressed public key")
+    x = int.from_bytes(pubkey[1:], 'big')
+    y = pow((pow(x, 3, _P) + 7) % _P, (_P + 1) // 4, _P)
+    if y % 2 != pubkey[0] % 2:
+        y = _P - y
+    return x, y
+
+
+def _compress(point):
+    return bytes([2 + (point[1] & 1)]) + point[0].to_bytes(32, 'big')
+
+
+def parse_xpub(xpub):
+    """
+    Split an extended public key into chain code and public key point
+
+    Args:
+        xpub (str): Base58check encoded extended public key
+
+    Returns:
+        tuple: (chain_code bytes, (x, y) public point)
+    """
+    payload = _base58check_decode(xpub.strip())
+    if len(payload) != 78:
+        raise HDWalletError("Invalid xpub length")
+    return payload[13:45], _decompress(payload[45:78])
+
+
+def derive_public_point(xpub, index):
+    """Derive the non-hardened child public key point at ``index``"""
+    if not 0 <= index <= MAX_CHILD_INDEX:
+        raise HDWalletError(f"Index must be between 0 and {MAX_CHILD_INDEX}")
+    chain_code, parent = parse_xpub(xpub)
+
+    digest = hmac.new(chain_code, _compress(parent) + index.to_bytes(4, 'big'), hashlib.sha512).digest()
+    tweak = int.from_bytes(digest[:32], 'big')
+    if tweak >= _N:
+        raise HDWalletError(f"Invalid child at index {index}")
+
+    child = _point_add(_point_multiply(tweak), parent)
+    if child is None:
+        raise HDWalletError(f"Invalid child at index {index}")
+    return child
+
+
+def derive_address(xpub, index=0):
+    """
+    Derive the checksummed BSC/EVM address for child ``index`` of an xpub
+
+    Args:
+        xpub (str): Account-level extended public key
+        index (int): Non-hardened child index
+
+    Returns:
+        str: EIP-55 checksummed address
+    """
+    if not KECCAK_AVAILABLE:
+        raise HDWalletError("eth-utils is required for local address derivation")
+    x, y = derive_public_point(xpub, int(index))
+    public_key = x.to_bytes(32, 'big') + y.to_bytes(32, 'big')
+    return to_checksum_address(keccak(public_key)[-20:])
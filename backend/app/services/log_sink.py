@@ -0,0 +1,139 @@
+# app/services/log_sink.py
+"""
+Buffered writer for log-style documents
+
+system_log, system_logs and user_activities documents are written from hot
+paths (webhooks, bid cycle open/close, purchases). Instead of an insert_one
+per log line, callers hand documents to the process-wide sink, which queues
+them in memory and a background thread writes them with one insert_many per
+collection when the batch size or the flush interval is reached.
+
+The queue is bounded: when it is full new documents are dropped and counted
+rather than blocking the request. Everything still queued is flushed at
+interpreter exit. Retention for these collections is handled by their TTL
+indexes (see db_init.TTL_INDEXES).
+
+    from app.services.log_sink import log_sink
+    log_sink.write('system_logs', {'log_type': ..., 'log_message': ..., 'created_at': ...})
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+
+from bson.objectid import ObjectId
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedLogSink:
+    """Bounded in-memory queue of (collection, document) flushed in batches"""
+
+    def __init__(self, max_queue=10000, batch_size=500, flush_interval=2.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def write(self, collection, document):
+        """
+        Queue a document for ``collection`` without blocking
+
+        An ``_id`` is assigned immediately so callers can still return it.
+
+        Returns:
+            ObjectId: The document id, or None if the queue was full
+        """
+        document.setdefault('_id', ObjectId())
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.warning(f"Log sink queue full; {self.dropped} documents dropped so far")
+                return None
+            self._queue.append((collection, document))
+            size = len(self._queue)
+        self._ensure_thread()
+        if size >= self.batch_size:
+            self._wakeup.set()
+        return document['_id']
+
+    def flush(self):
+        """Write everything currently queued; returns the number of documents written"""
+        from app import get_db
+        db = get_db()
+        if db is None:
+            return 0
+
+        total = 0
+        while True:
+            with self._lock:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                return total
+
+            by_collection = defaultdict(list)
+            for collection, document in batch:
+                by_collection[collection].append(document)
+            for collection, documents in by_collection.items():
+                try:
+                    db[collection].insert_many(documents, ordered=False)
+                    self.written += len(documents)
+                    total += len(documents)
+                except Exception as e:
+                    self.failed += len(documents)
+                    logger.error(f"Log sink failed to write {len(documents)} documents to {collection}: {str(e)}")
+
+    def stats(self):
+        """Queue length and lifetime written/dropped/failed counters"""
+        with self._lock:
+            queued = len(self._queue)
+        return {'queued': queued, 'written': self.written, 'dropped': self.dropped, 'failed': self.failed}
+
+    def close(self):
+        """Stop the flusher and write whatever is left"""
+        self._closed = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Log sink final flush failed: {str(e)}")
+
+    def _ensure_thread(self):
+        # A forked worker inherits the parent's queue object but not its thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='log-sink', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Log sink flush error: {str(e)}")
+
+
+log_sink = BufferedLogSink(
+    max_queue=int(os.environ.get('LOG_SINK_MAX_QUEUE', 10000)),
+    batch_size=int(os.environ.get('LOG_SINK_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('LOG_SINK_FLUSH_INTERVAL', 2.0))
+)
+atexit.register(log_sink.close)
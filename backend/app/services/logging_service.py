@@ -0,0 +1,193 @@
+# app/services/logging_service.py
+"""
+Logging configuration and sampled hot-path loggers
+
+configure_logging() is called once from create_app and sets up the root
+handler plus per-module levels from the environment:
+
+    LOG_LEVEL=INFO                                     root level
+    LOG_LEVELS=app.models.user=DEBUG,app.api.wallet=WARNING
+    LOG_FORMAT=text|json
+
+Request-path code logs through get_logger(__name__), whose debug() returns
+after a single level check when DEBUG is off and, when it is on, emits at
+most LOG_DEBUG_SAMPLE_LIMIT messages per message template every
+LOG_DEBUG_SAMPLE_INTERVAL seconds, reporting how many were suppressed.
+Arguments are passed %-style so nothing is formatted unless a record is
+actually emitted; documents go through redacted() so PIN hashes and
+embedded images never reach the log.
+
+    from app.services.logging_service import get_logger, redacted
+    logger = get_logger(__name__)
+    logger.debug("Update data: %s", redacted(data))
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# Fields never written to logs, and the longest string value shown as-is
+REDACTED_FIELDS = {'security_pin', 'pin', 'password', 'private_key', 'mnemonic', 'secret'}
+MAX_VALUE_LENGTH = 120
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_levels(spec):
+    """
+    Parse 'module=LEVEL,module=LEVEL' into {module: level}
+
+    Unknown level names are ignored.
+    """
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def configure_logging():
+    """
+    Install the root handler and apply LOG_LEVEL / LOG_LEVELS
+
+    Safe to call more than once; the handler is only added the first time.
+    """
+    root = logging.getLogger()
+    root.setLevel(logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper()))
+
+    if not any(getattr(handler, '_awardloop', False) for handler in root.handlers):
+        handler = logging.StreamHandler()
+        handler._awardloop = True
+        if os.environ.get('LOG_FORMAT', 'text').lower() == 'json':
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+
+    for name, level in parse_levels(os.environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+
+class redacted:
+    """
+    Lazy, log-safe view of a document
+
+    Rendering happens only when a record is emitted. Sensitive fields are
+    masked and long values (base64 images, hashes) are truncated.
+    """
+    __slots__ = ('document',)
+
+    def __init__(self, document):
+        self.document = document
+
+    def __str__(self):
+        if not isinstance(self.document, dict):
+            return _shorten(self.document)
+        return '{' + ', '.join(
+            f"{key}: {'***' if key in REDACTED_FIELDS else _shorten(value)}"
+            for key, value in self.document.items()
+        ) + '}'
+
+    __repr__ = __str__
+
+
+def _shorten(value):
+    text = repr(value)
+    if len(text) > MAX_VALUE_LENGTH:
+        return f"{text[:MAX_VALUE_LENGTH]}... ({len(text)} chars)"
+    return text
+
+
+class SampledLogger:
+    """
+    Logger wrapper with rate-limited debug()
+
+    Debug messages are sampled per message template; info and above are
+    passed straight through.
+    """
+
+    def __init__(self, logger, limit=10, interval=60.0):
+        self.logger = logger
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _sample(self, msg):
+        """Whether to emit this message, and how many were suppressed before it"""
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(msg)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[msg] = [now, 1, 0]
+                return True, suppressed
+            if window[1] < self.limit:
+                window[1] += 1
+                return True, 0
+            window[2] += 1
+            return False, 0
+
+    def debug(self, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        emit, suppressed = self._sample(msg)
+        if not emit:
+            return
+        if suppressed:
+            msg = f"{msg} [%d similar suppressed]"
+            args = args + (suppressed,)
+        kwargs.setdefault('stacklevel', 2)
+        self.logger.debug(msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        kwargs.setdefault('stacklevel', 2)
+        self.logger.info(msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        kwargs.setdefault('stacklevel', 2)
+        self.logger.warning(msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        kwargs.setdefault('stacklevel', 2)
+        self.logger.error(msg, *args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        kwargs.setdefault('stacklevel', 2)
+        self.logger.exception(msg, *args, **kwargs)
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    """Sampled logger for ``name`` (one instance per name)"""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, SampledLogger(
+            logging.getLogger(name),
+            limit=int(os.environ.get('LOG_DEBUG_SAMPLE_LIMIT', 10)),
+            interval=float(os.environ.get('LOG_DEBUG_SAMPLE_INTERVAL', 60))
+        ))
+    return logger
@@ -0,0 +1,85 @@
+# app/services/pin_hash_service.py
+"""
+PIN hashing off the eventlet hub
+
+PBKDF2 is pure CPU work. When the server runs under eventlet (see run.py),
+hashing inline blocks every green thread in the process for the duration of
+the hash. These helpers push the work into eventlet's native OS thread pool
+(``eventlet.tpool``) and cap how many hashes can be in flight at once, so a
+login burst queues politely instead of stalling sockets and API requests.
+
+Without eventlet (tests, scripts) the functions simply hash inline.
+"""
+import os
+import threading
+import logging
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger('awardloop')
+
+PIN_HASH_METHOD = 'pbkdf2:sha256'
+
+# Maximum number of PIN hashes running at the same time. Extra callers wait
+# on the semaphore (a green semaphore once threading is monkey-patched).
+MAX_CONCURRENT_HASHES = int(os.environ.get('PIN_HASH_MAX_CONCURRENCY', '4'))
+
+try:
+    import eventlet.patcher  # type: ignore
+    from eventlet import tpool  # type: ignore
+    EVENTLET_AVAILABLE = True
+except ImportError:
+    tpool = None
+    EVENTLET_AVAILABLE = False
+
+_hash_slots = None
+
+
+def _get_hash_slots():
+    """Create the concurrency semaphore lazily so it picks up monkey-patching"""
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = threading.BoundedSemaphore(max(1, MAX_CONCURRENT_HASHES))
+    return _hash_slots
+
+
+def _hub_is_patched():
+    """True when the process runs green threads (eventlet.monkey_patch was called)"""
+    return EVENTLET_AVAILABLE and eventlet.patcher.is_monkey_patched('thread')
+
+
+def _run_offloaded(func, *args):
+    """Run a CPU-bound function without blocking the eventlet hub"""
+    with _get_hash_slots():
+        if _hub_is_patched():
+            return tpool.execute(func, *args)
+        return func(*args)
+
+
+def hash_pin(pin):
+    """
+    Hash a security PIN.
+
+    Args:
+        pin (str): Plain text PIN
+
+    Returns:
+        str: Werkzeug password hash
+    """
+    return _run_offloaded(generate_password_hash, pin, PIN_HASH_METHOD)
+
+
+def verify_pin(pin_hash, pin):
+    """
+    Verify a security PIN against a stored hash.
+
+    Hash format errors are raised to the caller unchanged so legacy-hash
+    migration logic in the model keeps working.
+
+    Args:
+        pin_hash (str): Stored Werkzeug password hash
+        pin (str): Plain text PIN to check
+
+    Returns:
+        bool: True if the PIN matches
+    """
+    return _run_offloaded(check_password_hash, pin_hash, pin)
@@ -0,0 +1,231 @@
+# app/services/profile_image_service.py
+"""
+Profile images in GridFS
+
+Uploads are decoded once, cropped square and resized to every entry of
+SIZES, and each variant is stored as a binary file in the 'profile_images'
+GridFS bucket with metadata:
+
+    {user_id, image_id, size, content_type, etag}
+
+``image_id`` groups the variants of one upload and is what the user keeps
+(user_profiles.profile_image_id). A new upload gets a new image_id, so the
+variant URLs are immutable and served with a long Cache-Control plus an
+ETag derived from the bytes. User payloads only carry the URLs built by
+profile_image_url().
+
+Resizing is CPU work; under eventlet it runs in the native thread pool so
+it does not block the hub.
+"""
+import base64
+import binascii
+import hashlib
+import logging
+import os
+from datetime import datetime
+from io import BytesIO
+
+import gridfs
+from bson.objectid import ObjectId
+from flask import has_request_context, request
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app import db
+
+try:
+    import eventlet.patcher  # type: ignore
+    from eventlet import tpool  # type: ignore
+    EVENTLET_AVAILABLE = True
+except ImportError:
+    tpool = None
+    EVENTLET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BUCKET = 'profile_images'
+
+# Square edge length in pixels for every stored variant
+SIZES = {'thumb': 64, 'small': 128, 'medium': 256, 'large': 512}
+DEFAULT_SIZE = 'medium'
+
+MAX_UPLOAD_BYTES = int(os.environ.get('PROFILE_IMAGE_MAX_BYTES', 5 * 1024 * 1024))
+JPEG_QUALITY = 85
+
+# Variant URLs never change content, so clients and proxies may keep them
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class InvalidImage(ValueError):
+    """Upload is not a decodable image or is too large"""
+
+
+def _bucket():
+    return gridfs.GridFSBucket(db, bucket_name=BUCKET)
+
+
+def _offloaded(func, *args):
+    if EVENTLET_AVAILABLE and eventlet.patcher.is_monkey_patched('thread'):
+        return tpool.execute(func, *args)
+    return func(*args)
+
+
+def _render_variants(data):
+    """Decode ``data`` and encode one square variant per entry of SIZES"""
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImage(f"Unsupported image: {e}")
+
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    fmt, content_type = ('PNG', 'image/png') if has_alpha else ('JPEG', 'image/jpeg')
+
+    variants = {}
+    for size, edge in SIZES.items():
+        variant = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+        out = BytesIO()
+        if fmt == 'JPEG':
+            variant.save(out, fmt, quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            variant.save(out, fmt, optimize=True)
+        variants[size] = (out.getvalue(), content_type)
+    return variants
+
+
+def store_profile_image(user_id, data):
+    """
+    Resize an uploaded image and store every variant
+
+    Args:
+        user_id: Owner of the image
+        data (bytes): Raw upload
+
+    Returns:
+        ObjectId: image_id of the stored variants
+
+    Raises:
+        InvalidImage: If the upload is too large or cannot be decoded
+    """
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise InvalidImage(f"Image exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
+    variants = _offloaded(_render_variants, data)
+    image_id = ObjectId()
+    bucket = _bucket()
+    for size, (content, content_type) in variants.items():
+        bucket.upload_from_stream(
+            f"{image_id}_{size}",
+            content,
+            metadata={
+                'user_id': user_id,
+                'image_id': image_id,
+                'size': size,
+                'content_type': content_type,
+                'etag': hashlib.sha1(content).hexdigest()
+            }
+        )
+    return image_id
+
+
+def delete_profile_image(image_id):
+    """Remove every variant of an image"""
+    if not image_id:
+        return
+    bucket = _bucket()
+    for grid_file in bucket.find({'metadata.image_id': image_id}):
+        bucket.delete(grid_file._id)
+
+
+def open_variant(image_id, size=DEFAULT_SIZE):
+    """
+    Open one stored variant for streaming
+
+    Returns:
+        GridOut: Readable file with .metadata, or None if it does not exist
+    """
+    if size not in SIZES or not ObjectId.is_valid(str(image_id)):
+        return None
+    return next(iter(_bucket().find(
+        {'metadata.image_id': ObjectId(str(image_id)), 'metadata.size': size}, limit=1
+    )), None)
+
+
+def profile_image_url(image_id, size=DEFAULT_SIZE):
+    """URL of an image variant, absolute inside a request"""
+    if not image_id:
+        return None
+    path = f"/api/auth/profile-images/{image_id}/{size}"
+    if has_request_context():
+        return request.host_url.rstrip('/') + path
+    return path
+
+
+def _decode_data_uri(value):
+    if not isinstance(value, str) or not value.startswith('data:') or ',' not in value:
+        return None
+    try:
+        return base64.b64decode(value.split(',', 1)[1])
+    except (binascii.Error, ValueError):
+        return None
+
+
+def migrate_inline_images(batch_size=50):
+    """
+    Move base64 data-URI images into GridFS
+
+    Covers images still inline on users documents and those already moved
+    to user_profiles. Every profile_image field is removed once handled:
+    empty values (the old default was None) silently, undecodable images and
+    values that are not data URIs (e.g. external URLs, which payloads no
+    longer carry) with a warning. Idempotent; later runs find no field left.
+
+    Returns:
+        int: Number of images converted
+    """
+    from app.models.user import User
+
+    converted = 0
+    inline = {'profile_image': {'$exists': True}}
+    for collection, key in ((User.collection, '_id'), (User.COLD_COLLECTION, 'user_id')):
+        db[collection].update_many(
+            {'profile_image': {'$exists': True, '$in': [None, '']}},
+            {'$unset': {'profile_image': ''}}
+        )
+        while True:
+            batch = list(db[collection].find(
+                inline, {key: 1, 'profile_image': 1}
+            ).limit(batch_size))
+            if not batch:
+                break
+            for doc in batch:
+                user_id = doc[key]
+                value = doc.get('profile_image')
+                data = _decode_data_uri(value)
+                image_id = None
+                if data:
+                    try:
+                        image_id = store_profile_image(user_id, data)
+                        converted += 1
+                    except InvalidImage as e:
+                        logger.warning(f"Dropping undecodable profile image of user {user_id}: {e}")
+                elif isinstance(value, str) and value.startswith('data:'):
+                    logger.warning(f"Dropping malformed data URI profile image of user {user_id}")
+                elif value:
+                    logger.warning(f"Dropping non-data-URI profile image of user {user_id}: {str(value)[:100]}")
+                if image_id:
+                    db[User.COLD_COLLECTION].update_one(
+                        {'user_id': user_id},
+                        {'$set': {'profile_image_id': image_id, 'updated_at': datetime.utcnow()}},
+                        upsert=True
+                    )
+                db[collection].update_one({'_id': doc['_id']}, {'$unset': {'profile_image': ''}})
+    if converted:
+        logger.info(f"Moved {converted} inline profile images to GridFS")
+    return converted
+
+
+def ensure_indexes():
+    """Index variant lookups on the bucket's files collection"""
+    db[f"{BUCKET}.files"].create_index([('metadata.image_id', 1), ('metadata.size', 1)])
+    db[f"{BUCKET}.files"].create_index('metadata.user_id')
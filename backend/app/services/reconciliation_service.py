@@ -0,0 +1,245 @@
+# app/services/reconciliation_service.py
+"""
+Incremental balance reconciliation
+
+Recomputes each user's expected balance from the collections that move
+funds and compares it with ``users.balance``:
+
+    expected = completed deposits (tatum_transactions)
+             + processed earnings (user_earnings)
+             - unit purchases (user_investments)
+             - withdrawals that were not rejected or failed
+
+Users are processed in chunks of ``_id`` order. Every source collection is
+aggregated once per chunk with a $match on the chunk's ids and a $group by
+user (allowDiskUse), and each chunk ends with a checkpoint in
+reconciliation_runs. A run invocation stops after a time budget and the next
+one resumes from the checkpoint, so a full pass over a large user base is
+spread across many short jobs instead of one long scan. Mismatches are
+written to balance_discrepancies together with the per-source totals.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from bson import Decimal128
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app import db
+
+logger = logging.getLogger(__name__)
+
+RUNS_COLLECTION = 'reconciliation_runs'
+REPORT_COLLECTION = 'balance_discrepancies'
+
+# Differences at or below this are rounding noise from the float balances
+TOLERANCE = 0.01
+
+# A new full pass starts at most this often after the previous one finished
+RUN_INTERVAL = timedelta(hours=24)
+
+# Every running run carries this key; a unique partial index on it keeps
+# concurrent schedulers from starting two runs
+RUN_KEY = 'balance_reconciliation'
+
+DEPOSIT_TYPES = ['deposit']
+DEPOSIT_STATUSES = ['completed']
+EARNING_STATUSES = ['processed']
+INVESTMENT_EXCLUDED_STATUSES = ['cancelled', 'failed']
+WITHDRAWAL_EXCLUDED_STATUSES = ['rejected', 'failed']
+
+
+def _to_float(value):
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    return float(value or 0)
+
+
+def _sources():
+    """(component, collection, extra $match, sign) for every balance source"""
+    return [
+        ('deposits', 'tatum_transactions',
+         {'transaction_type': {'$in': DEPOSIT_TYPES}, 'status': {'$in': DEPOSIT_STATUSES}}, 1),
+        ('earnings', 'user_earnings', {'earning_status': {'$in': EARNING_STATUSES}}, 1),
+        ('investments', 'user_investments', {'investment_status': {'$nin': INVESTMENT_EXCLUDED_STATUSES}}, -1),
+        ('withdrawals', 'withdrawals', {'withdrawal_status': {'$nin': WITHDRAWAL_EXCLUDED_STATUSES}}, -1),
+    ]
+
+
+def _source_totals(collection, match, user_ids):
+    """
+    Sum of ``amount`` per user for one chunk of users
+
+    Some writers store user_id as a string, so both forms are matched and the
+    group key is normalized to a string.
+    """
+    keys = list(user_ids) + [str(u) for u in user_ids]
+    pipeline = [
+        {'$match': dict(match, user_id={'$in': keys})},
+        {'$group': {
+            '_id': {'$toString': '$user_id'},
+            'total': {'$sum': {'$toDecimal': {'$ifNull': ['$amount', 0]}}}
+        }}
+    ]
+    return {
+        row['_id']: _to_float(row['total'])
+        for row in db[collection].aggregate(pipeline, allowDiskUse=True)
+    }
+
+
+def reconcile_chunk(users, run_id, tolerance=TOLERANCE):
+    """
+    Compare the stored balance of a chunk of users with their sources
+
+    Args:
+        users (list): User documents with _id and balance
+        run_id: Run the discrepancies are recorded under
+
+    Returns:
+        int: Number of discrepancies written
+    """
+    user_ids = [user['_id'] for user in users]
+    totals = {
+        component: (sign, _source_totals(collection, match, user_ids))
+        for component, collection, match, sign in _sources()
+    }
+
+    now = datetime.utcnow()
+    discrepancies = []
+    for user in users:
+        key = str(user['_id'])
+        components = {component: values.get(key, 0.0) for component, (sign, values) in totals.items()}
+        expected = sum(sign * components[component] for component, (sign, _) in totals.items())
+        balance = _to_float(user.get('balance'))
+        difference = round(balance - expected, 6)
+        if abs(difference) > tolerance:
+            discrepancies.append({
+                'run_id': run_id,
+                'user_id': user['_id'],
+                'sponsor_id': user.get('sponsor_id'),
+                'balance': balance,
+                'expected': round(expected, 6),
+                'difference': difference,
+                'components': components,
+                'detected_at': now
+            })
+    if discrepancies:
+        db[REPORT_COLLECTION].insert_many(discrepancies, ordered=False)
+    return len(discrepancies)
+
+
+def _current_run(interval=RUN_INTERVAL):
+    """
+    The unfinished run, or a new one starting from the first user
+
+    Returns None while the last completed run is newer than ``interval``.
+    """
+    run = db[RUNS_COLLECTION].find_one({'status': 'running'}, sort=[('started_at', -1)])
+    if run:
+        return run
+    last = db[RUNS_COLLECTION].find_one({'status': 'completed'}, sort=[('finished_at', -1)])
+    if last and last.get('finished_at') and datetime.utcnow() - last['finished_at'] < interval:
+        return None
+    # Millisecond precision, as stored, so the returned run shows whether we inserted it
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    try:
+        run = db[RUNS_COLLECTION].find_one_and_update(
+            {'run_key': RUN_KEY, 'status': 'running'},
+            {'$setOnInsert': {
+                'last_user_id': None,
+                'users_checked': 0,
+                'discrepancies': 0,
+                'started_at': now,
+                'updated_at': now
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another scheduler inserted the run between our read and upsert
+        return db[RUNS_COLLECTION].find_one({'run_key': RUN_KEY, 'status': 'running'})
+    if run['started_at'] == now:
+        logger.info(f"Started balance reconciliation run {run['_id']}")
+    return run
+
+
+def run_reconciliation(chunk_size=500, max_seconds=15, pause_seconds=0.1):
+    """
+    Continue the current reconciliation run from its checkpoint
+
+    Processes chunks of ``chunk_size`` users until the time budget is spent
+    or every user has been checked, checkpointing after each chunk and
+    pausing briefly between chunks to leave room for regular traffic. The
+    scheduler runs jobs inline, so the budget is kept short enough not to
+    hold up the jobs queued behind it.
+
+    Returns:
+        dict: The run document after this invocation, or None if no run is due
+    """
+    run = _current_run()
+    if run is None:
+        return None
+    deadline = time.monotonic() + max_seconds
+
+    while time.monotonic() < deadline:
+        query = {}
+        if run.get('last_user_id') is not None:
+            query['_id'] = {'$gt': run['last_user_id']}
+        users = list(
+            db.users.find(query, {'_id': 1, 'balance': 1, 'sponsor_id': 1})
+            .sort('_id', 1)
+            .limit(chunk_size)
+        )
+        if not users:
+            run = db[RUNS_COLLECTION].find_one_and_update(
+                {'_id': run['_id']},
+                {'$set': {'status': 'completed', 'finished_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            logger.info(f"Balance reconciliation run {run['_id']} completed: "
+                        f"{run['users_checked']} users, {run['discrepancies']} discrepancies")
+            break
+
+        found = reconcile_chunk(users, run['_id'])
+        run = db[RUNS_COLLECTION].find_one_and_update(
+            {'_id': run['_id']},
+            {
+                '$set': {'last_user_id': users[-1]['_id'], 'updated_at': datetime.utcnow()},
+                '$inc': {'users_checked': len(users), 'discrepancies': found}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+    return run
+
+
+def latest_report(limit=100):
+    """
+    Latest run and its largest discrepancies
+
+    Returns:
+        dict: run (or None) and discrepancies sorted by absolute difference
+    """
+    run = db[RUNS_COLLECTION].find_one(sort=[('started_at', -1)])
+    if not run:
+        return {'run': None, 'discrepancies': []}
+    discrepancies = list(db[REPORT_COLLECTION].aggregate([
+        {'$match': {'run_id': run['_id']}},
+        {'$addFields': {'magnitude': {'$abs': '$difference'}}},
+        {'$sort': {'magnitude': -1}},
+        {'$limit': limit},
+        {'$project': {'magnitude': 0}}
+    ]))
+    return {'run': run, 'discrepancies': discrepancies}
+
+
+def ensure_indexes():
+    """Create indexes for the reconciliation collections"""
+    db[RUNS_COLLECTION].create_index([('status', 1), ('started_at', -1)])
+    db[RUNS_COLLECTION].create_index(
+        'run_key', unique=True, partialFilterExpression={'status': 'running'}
+    )
+    db[REPORT_COLLECTION].create_index([('run_id', 1), ('difference', 1)])
+    db[REPORT_COLLECTION].create_index('user_id')
@@ -0,0 +1,263 @@
+# app/services/referral_forest.py
+"""
+Compact, array-backed referral forest for batch analytics
+
+Loads referral_tree once and turns it into integer-indexed NumPy arrays:
+
+    ids            user id strings, position = node index
+    parent         parent index per node (-1 for roots)
+    depth          distance from the root (-1 if unreachable, e.g. a cycle)
+    child_offsets  CSR offsets into ``children`` (length n + 1)
+    children       child indices grouped by parent
+
+Every query below runs over the whole forest at once (subtree sums, per-level
+sums/histograms, leg volumes, uplines), instead of walking referral_tree
+through Mongo one user at a time. A forest can be saved with np.save and
+reopened memory-mapped for fast reloads.
+"""
+import json
+import os
+import logging
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ARRAYS = ('ids', 'parent', 'depth', 'child_offsets', 'children')
+
+
+class ReferralForest:
+    """In-memory referral forest; see module docstring for the layout"""
+
+    def __init__(self, ids, parent, depth, child_offsets, children, generated_at=None):
+        self.ids = ids
+        self.parent = parent
+        self.depth = depth
+        self.child_offsets = child_offsets
+        self.children = children
+        self.generated_at = generated_at
+        self._index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_edges(cls, user_ids, referrer_ids):
+        """
+        Build the forest from parallel user/referrer sequences
+
+        Referrers that aren't themselves in ``user_ids`` (e.g. the seeded root
+        sponsor, which has no referral_tree row) get a root node of their own
+        so their downline is still attached to them.
+        """
+        ids = np.asarray([str(u) for u in user_ids], dtype=np.str_)
+        referrers = np.asarray(['' if r is None else str(r) for r in referrer_ids], dtype=np.str_)
+
+        rowless = np.setdiff1d(referrers[referrers != ''], ids)
+        if len(rowless):
+            ids = np.concatenate((ids, rowless))
+            referrers = np.concatenate((referrers, np.full(len(rowless), '', dtype=np.str_)))
+        n = len(ids)
+
+        # Map referrer ids to node indices with one sort + binary search
+        parent = np.full(n, -1, dtype=np.int32)
+        if n:
+            order = np.argsort(ids, kind='stable')
+            sorted_ids = ids[order]
+            position = np.minimum(np.searchsorted(sorted_ids, referrers), n - 1)
+            found = sorted_ids[position] == referrers
+            parent[found] = order[position[found]]
+            parent[parent == np.arange(n)] = -1  # self-referral
+
+        child_offsets, children = cls._build_csr(parent)
+        depth = cls._build_depth(parent, child_offsets, children)
+        return cls(ids, parent, depth, child_offsets, children, generated_at=datetime.utcnow())
+
+    @classmethod
+    def load(cls, db, batch_size=10000):
+        """Load every referral_tree edge from MongoDB"""
+        user_ids, referrer_ids = [], []
+        cursor = db.referral_tree.find({}, {'_id': 0, 'user_id': 1, 'referrer_id': 1}).batch_size(batch_size)
+        for rel in cursor:
+            if rel.get('user_id') is None:
+                continue
+            user_ids.append(rel['user_id'])
+            referrer_ids.append(rel.get('referrer_id'))
+        forest = cls.from_edges(user_ids, referrer_ids)
+        unreachable = int((forest.depth < 0).sum())
+        if unreachable:
+            logger.warning(f"Referral forest: {unreachable} users are in a referral cycle and were left out")
+        return forest
+
+    @staticmethod
+    def _build_csr(parent):
+        n = len(parent)
+        has_parent = parent >= 0
+        counts = np.bincount(parent[has_parent], minlength=n)
+        child_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=child_offsets[1:])
+        nodes = np.flatnonzero(has_parent)
+        children = nodes[np.argsort(parent[nodes], kind='stable')].astype(np.int32)
+        return child_offsets, children
+
+    @staticmethod
+    def _expand(frontier, child_offsets, children):
+        """All children of the nodes in ``frontier``"""
+        starts = child_offsets[frontier]
+        counts = child_offsets[frontier + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int32)
+        # Index of each child slot: start of its run plus its offset within the run
+        run_starts = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        return children[run_starts + np.arange(total)]
+
+    @classmethod
+    def _build_depth(cls, parent, child_offsets, children):
+        depth = np.full(len(parent), -1, dtype=np.int32)
+        frontier = np.flatnonzero(parent < 0)
+        level = 0
+        while len(frontier):
+            depth[frontier] = level
+            frontier = cls._expand(frontier, child_offsets, children)
+            level += 1
+        return depth
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def index_of(self, user_id):
+        """Node index of a user id, or -1"""
+        if self._index is None:
+            self._index = {str(uid): i for i, uid in enumerate(self.ids)}
+        return self._index.get(str(user_id), -1)
+
+    def values_from(self, mapping, default=0.0):
+        """
+        Per-node array from a {user_id: value} mapping
+
+        Keys that resolve to the same node (an ObjectId and its string form)
+        are summed.
+        """
+        values = np.zeros(len(self), dtype=np.float64)
+        present = np.zeros(len(self), dtype=bool)
+        for user_id, value in mapping.items():
+            i = self.index_of(user_id)
+            if i >= 0:
+                values[i] += value
+                present[i] = True
+        values[~present] = default
+        return values
+
+    def _levels_bottom_up(self):
+        """Node index arrays per depth, deepest first (reachable nodes only)"""
+        reachable = np.flatnonzero(self.depth >= 0)
+        order = reachable[np.argsort(self.depth[reachable], kind='stable')]
+        bounds = np.searchsorted(self.depth[order], np.arange(int(self.depth.max(initial=-1)) + 2))
+        return [order[bounds[d]:bounds[d + 1]] for d in range(len(bounds) - 2, 0, -1)]
+
+    # ------------------------------------------------------------------
+    # Whole-forest queries
+    # ------------------------------------------------------------------
+
+    def subtree_sums(self, values, include_self=True):
+        """
+        Sum of ``values`` over each node's entire downline
+
+        Args:
+            values (ndarray): One value per node
+            include_self (bool): Include the node's own value
+
+        Returns:
+            ndarray: One sum per node
+        """
+        values = np.asarray(values, dtype=np.float64)
+        totals = values.copy()
+        for nodes in self._levels_bottom_up():
+            np.add.at(totals, self.parent[nodes], totals[nodes])
+        return totals if include_self else totals - values
+
+    def level_sums(self, values, max_levels=12):
+        """
+        Sum of ``values`` at each relative downline level for every node
+
+        Returns:
+            ndarray: shape (n, max_levels); column k is level k + 1
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = len(self)
+        result = np.zeros((n, max_levels), dtype=np.float64)
+        has_parent = np.flatnonzero((self.parent >= 0) & (self.depth >= 0))
+        parents = self.parent[has_parent]
+
+        # Level 1 is the direct children; level k + 1 of a node is the sum of
+        # level k of its children
+        current = values
+        for k in range(max_levels):
+            level = np.zeros(n, dtype=np.float64)
+            np.add.at(level, parents, current[has_parent])
+            result[:, k] = level
+            current = level
+        return result
+
+    def level_histogram(self, max_levels=12):
+        """Downline member counts per relative level, shape (n, max_levels)"""
+        return self.level_sums(np.ones(len(self)), max_levels).astype(np.int64)
+
+    def leg_volumes(self, values):
+        """
+        Volume of each direct leg (child subtree, including the child)
+
+        Returns:
+            tuple: (offsets, volumes) in CSR form; the legs of node i are
+            volumes[offsets[i]:offsets[i + 1]], aligned with child_offsets
+        """
+        return self.child_offsets, self.subtree_sums(values)[self.children]
+
+    def uplines(self, max_levels=12):
+        """
+        Ancestor indices of every node, shape (n, max_levels), -1 past the root
+
+        Column 0 is the direct referrer.
+        """
+        n = len(self)
+        result = np.full((n, max_levels), -1, dtype=np.int32)
+        current = self.parent.copy()
+        for k in range(max_levels):
+            result[:, k] = current
+            valid = current >= 0
+            current = np.where(valid, self.parent[np.maximum(current, 0)], -1)
+        return result
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def save(self, directory):
+        """Write the forest arrays as .npy files plus a small metadata file"""
+        os.makedirs(directory, exist_ok=True)
+        for name in SNAPSHOT_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({
+                'nodes': len(self),
+                'generated_at': self.generated_at.isoformat() if self.generated_at else None
+            }, f)
+
+    @classmethod
+    def open(cls, directory, mmap=True):
+        """Reopen a saved forest; arrays are memory-mapped read-only by default"""
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None)
+            for name in SNAPSHOT_ARRAYS
+        }
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        generated_at = datetime.fromisoformat(meta['generated_at']) if meta.get('generated_at') else None
+        return cls(generated_at=generated_at, **arrays)
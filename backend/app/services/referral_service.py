@@ -1,35 +1,24 @@
 # app/services/referral_service.py
 from app import db
-from app.models.referral_tree import ReferralTree
 from app.models.user_earnings import UserEarning
 from app.models.investment_plans import InvestmentPlan
 from app.models.income_hold_status import IncomeHoldStatus
+from app.models.platform_counters import PlatformCounters
+from app.models.team_counters import TeamCounters
+from app.models.team_rewards import TeamReward
 from datetime import datetime
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
 
 class ReferralService:
     @staticmethod
     def get_upline(user_id, levels=12):
         """Get the upline for a user up to the specified number of levels"""
-        upline = []
-        current_id = user_id
-        
-        for level in range(1, levels + 1):
-            # Find referrer using MongoDB model
-            referrer_rel = ReferralTree.find_by_user_id(current_id)
-            
-            if not referrer_rel or not referrer_rel.referrer_id:
-                break
-                
-            upline.append({
-                'user_id': referrer_rel.referrer_id,
-                'level': level
-            })
-            
-            # Move up to the next level
-            current_id = referrer_rel.referrer_id
-        
-        return upline
+        # One $graphLookup instead of a referral_tree query per level
+        return [
+            {'user_id': ancestor_id, 'level': level}
+            for ancestor_id, level in TeamCounters.get_upline(user_id, levels)
+        ]
     
     @staticmethod
     def calculate_level_commission(investment_amount, level):
@@ -79,6 +68,7 @@ class ReferralService:
                 earning_data['processed_at'] = datetime.utcnow()
                 
             db.user_earnings.insert_one(earning_data)
+            PlatformCounters.record_earning_created(commission)
         
         return True
     
@@ -87,66 +77,79 @@ class ReferralService:
         """
         Process team business rewards for users who qualify
         User must have 5 active legs with referrals who also maintain 5 active legs
+        
+        Only the investor's upline can gain business volume from this
+        investment, so the update is scoped to those (at most 12) users and
+        applied as a single bulk write. Rank thresholds come from the cached
+        team_rewards table.
         """
         # Get the required number of legs
         system_settings = db.system_settings.find_one({'key': 'min_legs_for_reward'})
         min_legs = int(system_settings.get('value', '5') if system_settings else 5)
         
-        # Get all users with the required number of active legs
-        qualified_users = db.user_legs.find({'active_legs': {'$gte': min_legs}})
+        upline_ids = [level_data['user_id'] for level_data in ReferralService.get_upline(user_id)]
+        if not upline_ids:
+            return True
+        
+        # Qualified members of this upline only
+        qualified_ids = [
+            legs['user_id'] for legs in db.user_legs.find(
+                {'user_id': {'$in': upline_ids}, 'active_legs': {'$gte': min_legs}},
+                {'user_id': 1}
+            )
+        ]
+        if not qualified_ids:
+            return True
+        
+        now = datetime.utcnow()
+        result = db.team_business.bulk_write([
+            UpdateOne(
+                {'user_id': qualified_user_id},
+                {
+                    '$inc': {'business_volume': investment_amount},
+                    '$set': {'last_calculated_at': now},
+                    '$setOnInsert': {'current_rank_level': 1, 'created_at': now}  # Start at rank 1
+                },
+                upsert=True
+            )
+            for qualified_user_id in qualified_ids
+        ], ordered=False)
+        
+        # New records start at rank 1; only existing ones can move up
+        created_ids = {qualified_ids[index] for index in result.upserted_ids}
+        existing_ids = [qid for qid in qualified_ids if qid not in created_ids]
+        if not existing_ids:
+            return True
         
-        for qualified_user in qualified_users:
-            qualified_user_id = qualified_user.get('user_id')
+        for team_business in db.team_business.find(
+            {'user_id': {'$in': existing_ids}},
+            {'user_id': 1, 'business_volume': 1, 'current_rank_level': 1}
+        ):
+            current_rank = team_business.get('current_rank_level', 1)
+            next_rank = TeamReward.next_rank_from_table(current_rank, float(team_business.get('business_volume', 0)))
+            if not next_rank:
+                continue
             
-            # Update their business volume
-            team_business = db.team_business.find_one({'user_id': qualified_user_id})
+            # Conditional on the rank we read, so a concurrent update can't
+            # grant the same reward twice
+            promoted = db.team_business.update_one(
+                {'user_id': team_business['user_id'], 'current_rank_level': current_rank},
+                {'$set': {'current_rank_level': next_rank['rank_level']}}
+            )
+            if not promoted.modified_count:
+                continue
             
-            if not team_business:
-                # Create new team business record
-                team_business_data = {
-                    'user_id': qualified_user_id,
-                    'business_volume': investment_amount,
-                    'current_rank_level': 1,  # Start at rank 1
-                    'created_at': datetime.utcnow(),
-                    'last_calculated_at': datetime.utcnow()
-                }
-                db.team_business.insert_one(team_business_data)
-            else:
-                # Update existing team business record
-                new_volume = team_business.get('business_volume', 0) + investment_amount
-                db.team_business.update_one(
-                    {'user_id': qualified_user_id},
-                    {'$set': {
-                        'business_volume': new_volume,
-                        'last_calculated_at': datetime.utcnow()
-                    }}
-                )
-                
-                # Check if user qualifies for a higher rank
-                current_rank = team_business.get('current_rank_level', 1)
-                next_rank = db.team_rewards.find_one({
-                    'rank_level': {'$gt': current_rank},
-                    'business_volume': {'$lte': new_volume},
-                    'is_active': True
-                }, sort=[('rank_level', 1)])
-                
-                if next_rank:
-                    # User has reached a new rank level
-                    db.team_business.update_one(
-                        {'user_id': qualified_user_id},
-                        {'$set': {'current_rank_level': next_rank.get('rank_level')}}
-                    )
-                    
-                    # Create earning record as pending - will be distributed 
-                    # from REWARDS_WALLET_ADDRESS after cycle closes
-                    earning_data = {
-                        'user_id': qualified_user_id,
-                        'amount': next_rank.get('reward_amount'),
-                        'earning_type': 'team_reward',
-                        'earning_level': next_rank.get('rank_level'),
-                        'earning_status': 'pending',  # Always pending until cycle closes
-                        'created_at': datetime.utcnow()
-                    }
-                    db.user_earnings.insert_one(earning_data)
+            # Create earning record as pending - will be distributed 
+            # from REWARDS_WALLET_ADDRESS after cycle closes
+            earning_data = {
+                'user_id': team_business['user_id'],
+                'amount': next_rank['reward_amount'],
+                'earning_type': 'team_reward',
+                'earning_level': next_rank['rank_level'],
+                'earning_status': 'pending',  # Always pending until cycle closes
+                'created_at': datetime.utcnow()
+            }
+            db.user_earnings.insert_one(earning_data)
+            PlatformCounters.record_earning_created(next_rank['reward_amount'])
         
         return True
\ No newline at end of file
@@ -68,6 +68,9 @@ def update_system_setting(setting_key, setting_value, description=None):
             })
         
         logger.info(f"System setting '{setting_key}' updated to '{setting_value}'")
+        
+        from app.services.eligibility_service import on_setting_changed
+        on_setting_changed(setting_key)
         return True
     except Exception as e:
         logger.error(f"Error updating system setting '{setting_key}': {e}")
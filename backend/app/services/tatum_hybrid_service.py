@@ -4,9 +4,12 @@ import os
 import requests
 import json
 from app import db
+from app.services.log_sink import log_sink
 from datetime import datetime
 import uuid
 import logging
+from app.services.hd_wallet import derive_address, HDWalletError
+from pymongo.errors import DuplicateKeyError
 
 # Try to import Web3, but handle case when it's not installed
 try:
@@ -102,7 +105,7 @@ class TatumHybridService:
                     "log_message": f'Registered wallet address {address} with Moralis Stream {stream_id}',
                     "created_at": now
                 }
-                db.system_logs.insert_one(log_doc)
+                log_sink.write('system_logs', log_doc)
                 
                 return True
             else:
@@ -115,6 +118,83 @@ class TatumHybridService:
             print(f"[MORALIS] Traceback: {traceback.format_exc()}")
             return False
     
+    def queue_moralis_registration(self, address):
+        """
+        Queue an address for Moralis Streams registration without blocking the caller
+        
+        Wallet creation runs on the registration path; the address is added to
+        the moralis_address_registrations queue and registered in batches by
+        app.tasks.moralis_registration.
+        """
+        from app.models.moralis_address_registration import MoralisAddressRegistration
+        MoralisAddressRegistration.enqueue([address])
+    
+    def _moralis_stream_config(self):
+        """Return (stream_id, headers) for the Moralis Streams API, or (None, None)"""
+        moralis_api_key = os.environ.get('MORALIS_API_KEY')
+        stream_id = os.environ.get('MORALIS_STREAM_ID')
+        if not moralis_api_key or not stream_id:
+            return None, None
+        return stream_id, {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'X-API-Key': moralis_api_key
+        }
+    
+    def add_addresses_to_moralis_stream(self, addresses):
+        """
+        Add a batch of addresses to the Moralis stream in a single request
+        
+        Args:
+            addresses: List of wallet addresses
+            
+        Returns:
+            tuple: (success, error message or None)
+        """
+        stream_id, headers = self._moralis_stream_config()
+        if not stream_id:
+            return False, "Missing Moralis API key or Stream ID"
+        
+        try:
+            url = f"https://api.moralis.io/streams/evm/{stream_id}/address"
+            response = requests.post(url, headers=headers, json={"address": list(addresses)}, timeout=30)
+            if response.status_code in [200, 201]:
+                return True, None
+            return False, f"{response.status_code} - {response.text[:200]}"
+        except Exception as e:
+            return False, str(e)
+    
+    def list_moralis_stream_addresses(self, page_size=100):
+        """
+        Yield every address currently attached to the Moralis stream
+        
+        Follows the API's cursor pagination; raises on API errors so a
+        reconciliation run never works from a partial list.
+        """
+        stream_id, headers = self._moralis_stream_config()
+        if not stream_id:
+            raise RuntimeError("Missing Moralis API key or Stream ID")
+        
+        url = f"https://api.moralis.io/streams/evm/{stream_id}/address"
+        cursor = None
+        while True:
+            params = {'limit': page_size}
+            if cursor:
+                params['cursor'] = cursor
+            response = requests.get(url, headers=headers, params=params, timeout=30)
+            if response.status_code != 200:
+                raise RuntimeError(f"Moralis address listing failed: {response.status_code} - {response.text[:200]}")
+            
+            data = response.json()
+            for row in data.get('result', []):
+                address = row.get('address') if isinstance(row, dict) else row
+                if address:
+                    yield address
+            
+            cursor = data.get('cursor')
+            if not cursor:
+                break
+    
     # ===== V3 API METHODS =====
     
     def generate_wallet(self, user_id):
@@ -123,17 +203,11 @@ class TatumHybridService:
             print(f"[DEBUG] Starting wallet generation for user_id: {user_id}")
             
             # CRITICAL: First check if user already has a wallet to prevent duplicates
-            existing_wallet = db.user_wallets.find_one({"user_id": user_id})
+            existing_wallet = self._existing_wallet(user_id)
             if existing_wallet:
-                print(f"[DEBUG] User {user_id} already has a wallet with address: {existing_wallet.get('deposit_address')}")
+                print(f"[DEBUG] User {user_id} already has a wallet with address: {existing_wallet.deposit_address}")
                 # Return the existing wallet instead of creating a new one
-                from types import SimpleNamespace
-                wallet = SimpleNamespace()
-                wallet.id = existing_wallet.get('_id')
-                wallet.user_id = user_id
-                wallet.deposit_address = existing_wallet.get('deposit_address')
-                wallet.xpub = existing_wallet.get('xpub')
-                return wallet, None
+                return existing_wallet, None
                 
             # Use the working v3 endpoint for wallet generation
             v3_url = f"{self.base_url_v3}/bsc/wallet"
@@ -165,16 +239,20 @@ class TatumHybridService:
                     print(f"[ERROR] Missing required fields in response: {wallet_data}")
                     return None, "Missing wallet data in API response"
                 
-                # Get address from xpub (index 0)
+                # Get address from xpub (index 0) - derived locally, no network round trip
                 address = None
-                address_url = f"{self.base_url_v3}/bsc/address/{xpub}/0"
-                address_response = requests.get(address_url, headers=self.headers)
+                try:
+                    address = derive_address(xpub, 0)
+                    print(f"[DEBUG] Derived address locally: {address}")
+                except HDWalletError as derive_err:
+                    print(f"[WARNING] Local xpub derivation failed: {str(derive_err)}")
+                    address_url = f"{self.base_url_v3}/bsc/address/{xpub}/0"
+                    address_response = requests.get(address_url, headers=self.headers)
+                    if address_response.status_code == 200:
+                        address = address_response.json().get('address')
+                        print(f"[DEBUG] Retrieved address: {address}")
                 
-                if address_response.status_code == 200:
-                    address_data = address_response.json()
-                    address = address_data.get('address')
-                    print(f"[DEBUG] Retrieved address: {address}")
-                else:
+                if not address:
                     print(f"[WARNING] Could not get address from xpub, trying Web3 fallback")
                     if WEB3_AVAILABLE:
                         try:
@@ -303,8 +381,13 @@ class TatumHybridService:
                     }
                 
                     print("[DEBUG] Inserting wallet into MongoDB")
-                    # Insert the wallet document into MongoDB
-                    wallet_result = db.user_wallets.insert_one(wallet_doc)
+                    # Insert the wallet document into MongoDB. The unique user_id
+                    # index rejects it if a concurrent request created one first.
+                    try:
+                        wallet_result = db.user_wallets.insert_one(wallet_doc)
+                    except DuplicateKeyError:
+                        print(f"[DEBUG] Wallet for user {user_id} was created concurrently, using it")
+                        return self._existing_wallet(user_id), None
                     wallet_id = wallet_result.inserted_id
                     
                     # Create a system log entry for auditing
@@ -314,7 +397,7 @@ class TatumHybridService:
                         "created_at": now
                     }
                     
-                    db.system_logs.insert_one(log_doc)
+                    log_sink.write('system_logs', log_doc)
                     
                     print(f"[DEBUG] Wallet saved to database with ID: {wallet_id}")
                     
@@ -338,7 +421,7 @@ class TatumHybridService:
                         print(f"[WARNING] Could not verify wallet in database: {str(verify_err)}")
                     
                     # Register the wallet address with Moralis for transaction monitoring
-                    self.register_address_with_moralis(address)
+                    self.queue_moralis_registration(address)
                     
                     # Return successful result
                     return wallet, None
@@ -357,6 +440,19 @@ class TatumHybridService:
             print(f"[ERROR] Traceback: {traceback.format_exc()}")
             return None, str(e)
     
+    def _existing_wallet(self, user_id):
+        """The user's deposit wallet in the shape generate_wallet returns, or None"""
+        existing_wallet = db.user_wallets.find_one({"user_id": user_id})
+        if not existing_wallet:
+            return None
+        from types import SimpleNamespace
+        wallet = SimpleNamespace()
+        wallet.id = existing_wallet.get('_id')
+        wallet.user_id = user_id
+        wallet.deposit_address = existing_wallet.get('deposit_address')
+        wallet.xpub = existing_wallet.get('xpub')
+        return wallet
+    
     def _generate_wallet_via_web3(self, user_id):
         """Generate a wallet using Web3 as fallback when Tatum API fails"""
         if not WEB3_AVAILABLE:
@@ -377,7 +473,7 @@ class TatumHybridService:
                 "log_message": f'Wallet created for user {user_id} using Web3 fallback',
                 "created_at": now
             }
-            db.system_logs.insert_one(log_doc)
+            log_sink.write('system_logs', log_doc)
             
             # Save wallet to database using MongoDB
             try:
@@ -408,8 +504,11 @@ class TatumHybridService:
                     "updated_at": now
                 }
                 
-                # Insert the wallet document
-                wallet_result = db.user_wallets.insert_one(wallet_doc)
+                # Insert the wallet document (unique per user, see generate_wallet)
+                try:
+                    wallet_result = db.user_wallets.insert_one(wallet_doc)
+                except DuplicateKeyError:
+                    return self._existing_wallet(user_id), None
                 wallet_id = wallet_result.inserted_id
                 
                 # Create a wallet object to return (compatible with existing code)
@@ -422,7 +521,7 @@ class TatumHybridService:
                 print(f"[DEBUG] Web3 wallet saved with address: {address}")
                 
                 # Register the wallet address with Moralis for transaction monitoring
-                self.register_address_with_moralis(address)
+                self.queue_moralis_registration(address)
                 
                 return wallet, None
                 
@@ -1140,7 +1239,7 @@ class TatumHybridService:
                 "log_message": f"Admin {admin_id if admin_id else 'system'} initiated transfer of all USDT from user {user_id} wallet to admin wallet",
                 "created_at": now
             }
-            db.system_logs.insert_one(system_log_doc)
+            log_sink.write('system_logs', system_log_doc)
             
             try:
                 private_key = encryption_service.decrypt_private_key(
@@ -1192,7 +1291,7 @@ class TatumHybridService:
             }
             
             # Insert activity record
-            db.user_activities.insert_one(activity_doc)
+            log_sink.write('user_activities', activity_doc)
             
             return {
                 "success": True,
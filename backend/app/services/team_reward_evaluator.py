@@ -0,0 +1,228 @@
+# app/services/team_reward_evaluator.py
+"""
+Batch team-reward evaluation
+
+The nightly team-rewards job and the admin "calculate" route used to loop
+over every eligible user_legs document, issuing a team_business find_one and
+a user_leg_details find per user and scanning the reward levels in Python.
+
+Here all candidates are loaded with one aggregation into NumPy arrays (leg
+volumes in CSR form: a flat array plus per-user offsets). The equal-business
+check and the reward-level match run vectorized across every user, and the
+resulting team_business changes are written in one bulk_write.
+"""
+import logging
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.services.aggregation import lookup_eq
+
+logger = logging.getLogger(__name__)
+
+# Legs may differ from the average leg volume by at most this fraction
+LEG_BALANCE_TOLERANCE = 0.1
+
+# Active legs with business required before equal business is checked
+MIN_BALANCED_LEGS = 5
+
+
+class TeamRewardCandidates:
+    """Column-oriented candidate data for the evaluator"""
+
+    def __init__(self, user_ids, business_volume, current_rank, leg_offsets, leg_volumes):
+        self.user_ids = user_ids                       # list of user ids, length n
+        self.business_volume = business_volume         # float64[n]
+        self.current_rank = current_rank               # int64[n], 0 when unset
+        self.leg_offsets = leg_offsets                 # int64[n + 1]
+        self.leg_volumes = leg_volumes                 # float64[total active legs]
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build arrays from rows of (user_id, business_volume, current_rank, [leg volumes])
+        """
+        user_ids, volumes, ranks, offsets, legs = [], [], [], [0], []
+        for user_id, business_volume, current_rank, leg_volumes in rows:
+            user_ids.append(user_id)
+            volumes.append(float(business_volume or 0))
+            ranks.append(int(current_rank or 0))
+            legs.extend(float(v or 0) for v in leg_volumes)
+            offsets.append(len(legs))
+        return cls(
+            user_ids,
+            np.asarray(volumes, dtype=np.float64),
+            np.asarray(ranks, dtype=np.int64),
+            np.asarray(offsets, dtype=np.int64),
+            np.asarray(legs, dtype=np.float64)
+        )
+
+
+def load_candidates(db, min_legs, batch_size=5000):
+    """
+    Load every user with at least ``min_legs`` active legs and a team_business
+    record, together with their active leg volumes, in one aggregation
+
+    Returns:
+        TeamRewardCandidates
+    """
+    pipeline = [
+        {"$match": {"active_legs": {"$gte": min_legs}}},
+        {"$project": {"user_id": {"$convert": {
+            "input": "$user_id", "to": "objectId", "onError": "$user_id", "onNull": None
+        }}}},
+        lookup_eq("team_business", "user_id", "user_id", "business",
+                  project={"_id": 0, "business_volume": 1, "current_rank_level": 1}),
+        {"$unwind": "$business"},
+        lookup_eq("user_leg_details", "user_id", "user_id", "legs",
+                  project={"_id": 0, "business_volume": 1}, match={"is_active": True}),
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "business_volume": "$business.business_volume",
+            "current_rank_level": "$business.current_rank_level",
+            "leg_volumes": "$legs.business_volume"
+        }}
+    ]
+    cursor = db.user_legs.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+    return TeamRewardCandidates.from_rows(
+        (row["user_id"], row.get("business_volume"), row.get("current_rank_level"), row.get("leg_volumes") or [])
+        for row in cursor
+    )
+
+
+def balanced_legs_mask(candidates, min_legs=MIN_BALANCED_LEGS, tolerance=LEG_BALANCE_TOLERANCE):
+    """
+    Users with at least ``min_legs`` active legs, each within ``tolerance``
+    of that user's average leg volume
+
+    Returns:
+        ndarray[bool]: One flag per candidate
+    """
+    n = len(candidates)
+    counts = np.diff(candidates.leg_offsets)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+
+    # Owner index of every leg, then per-user sums via bincount
+    owner = np.repeat(np.arange(n), counts)
+    sums = np.bincount(owner, weights=candidates.leg_volumes, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+
+    leg_average = averages[owner]
+    unbalanced_leg = np.abs(candidates.leg_volumes - leg_average) > leg_average * tolerance
+    unbalanced_users = np.bincount(owner, weights=unbalanced_leg, minlength=n) > 0
+
+    return (counts >= min_legs) & ~unbalanced_users
+
+
+def match_reward_levels(business_volume, reward_levels):
+    """
+    Highest reward level whose business_volume threshold each user has reached
+
+    Args:
+        business_volume (ndarray): Per-user volume
+        reward_levels (list): Normalized rows {rank_level, business_volume, reward_amount}
+
+    Returns:
+        tuple: (matched mask, rank_level array, reward_amount array)
+    """
+    n = len(business_volume)
+    if not reward_levels:
+        return np.zeros(n, dtype=bool), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.float64)
+
+    ordered = sorted(reward_levels, key=lambda level: level["business_volume"])
+    thresholds = np.asarray([level["business_volume"] for level in ordered], dtype=np.float64)
+    levels = np.asarray([level["rank_level"] for level in ordered], dtype=np.int64)
+    amounts = np.asarray([level["reward_amount"] for level in ordered], dtype=np.float64)
+
+    index = np.searchsorted(thresholds, business_volume, side='right') - 1
+    matched = index >= 0
+    safe = np.maximum(index, 0)
+    return matched, np.where(matched, levels[safe], 0), np.where(matched, amounts[safe], 0.0)
+
+
+def evaluate_percentage_rewards(candidates, reward_levels, percentage):
+    """
+    Nightly rule: users with balanced legs earn ``percentage`` of their
+    business volume, or the matched level's fixed reward if that is higher
+
+    Returns:
+        dict: arrays ``eligible``, ``pay``, ``amount``, ``rank_level``
+    """
+    eligible = balanced_legs_mask(candidates)
+    matched, level_rank, level_amount = match_reward_levels(candidates.business_volume, reward_levels)
+
+    amount = candidates.business_volume * (percentage / 100.0)
+    amount = np.where(matched, np.maximum(amount, level_amount), amount)
+    rank_level = np.where(matched, level_rank, 1)
+    return {
+        "eligible": eligible,
+        "pay": eligible & (amount > 0),
+        "amount": amount,
+        "rank_level": rank_level
+    }
+
+
+def evaluate_rank_rewards(candidates, reward_levels):
+    """
+    Admin rule: pay the matched level's fixed reward to users whose
+    calculated rank differs from their stored rank
+
+    Returns:
+        dict: arrays ``eligible``, ``pay``, ``amount``, ``rank_level``
+    """
+    matched, level_rank, level_amount = match_reward_levels(candidates.business_volume, reward_levels)
+    return {
+        "eligible": matched,
+        "pay": matched & (level_rank != candidates.current_rank),
+        "amount": level_amount,
+        "rank_level": level_rank
+    }
+
+
+def apply_team_rewards(db, candidates, decisions, transaction_service, update_rank=True):
+    """
+    Pay the selected rewards and write all team_business changes in one bulk_write
+
+    Payouts still go through TransactionService.process_team_reward one user
+    at a time (they move funds); every rank and last_calculated_at update is
+    batched.
+
+    Returns:
+        dict: processed, failed, total_amount
+    """
+    now = datetime.utcnow()
+    processed = failed = 0
+    total_amount = 0.0
+    operations = []
+
+    pay = decisions["pay"]
+    for i in np.flatnonzero(decisions["eligible"]):
+        user_id = candidates.user_ids[i]
+        update = {"last_calculated_at": now}
+        if pay[i]:
+            amount = float(decisions["amount"][i])
+            rank_level = int(decisions["rank_level"][i])
+            try:
+                result = transaction_service.process_team_reward(user_id=user_id, amount=amount, team_level=rank_level)
+            except Exception as e:
+                result = {"success": False, "message": str(e)}
+            if result.get("success"):
+                processed += 1
+                total_amount += amount
+                if update_rank:
+                    update["current_rank_level"] = rank_level
+            else:
+                failed += 1
+                logger.error(f"Failed to process team reward for user {user_id}: {result.get('message')}")
+        operations.append(UpdateOne({"user_id": user_id}, {"$set": update}))
+
+    if operations:
+        db.team_business.bulk_write(operations, ordered=False)
+    return {"processed": processed, "failed": failed, "total_amount": total_amount}
@@ -6,6 +6,7 @@ import json
 from datetime import datetime
 import random
 import logging
+from app.services.hd_wallet import derive_address, HDWalletError, MAX_CHILD_INDEX
 
 # Try to import Web3, but handle case when it's not installed
 try:
@@ -309,26 +310,21 @@ class TokenService:
         # Validate index is a proper integer
         try:
             index = int(index)
-            if not (0 <= index <= 4294967296):
-                return None, "Index must be between 0 and 4294967296"
+            if not (0 <= index <= MAX_CHILD_INDEX):
+                return None, f"Index must be between 0 and {MAX_CHILD_INDEX}"
         except (ValueError, TypeError):
             return None, "Index must be a valid integer"
             
         try:
+            # Derive locally from the xpub (BIP32 public derivation) - no Tatum round trip
             print(f"[DEBUG] Deriving address from xpub with index {index}")
-            url = f"{self.base_url}/data/address?chain=bsc&xpub={xpub}&index={index}"
-            response = requests.get(url, headers=self.headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                address = data.get('address')
-                print(f"[DEBUG] Derived address: {address}")
-                return address, None
-            else:
-                error_msg = f"API error ({response.status_code}): {response.text}"
-                print(f"[ERROR] {error_msg}")
-                return None, error_msg
-                
+            address = derive_address(xpub, index)
+            print(f"[DEBUG] Derived address: {address}")
+            return address, None
+        
+        except HDWalletError as e:
+            print(f"[ERROR] Error deriving address: {str(e)}")
+            return None, str(e)
         except Exception as e:
             print(f"[ERROR] Error deriving address: {str(e)}")
             return None, str(e)
\ No newline at end of file
@@ -3,11 +3,13 @@ import os
 import requests
 import json
 from app import db
+from app.models.ledger import Ledger
 from datetime import datetime
 import uuid
 import logging
 from app.services.tatum_hybrid_service import TatumHybridService
 from app.services.encryption_service import EncryptionService
+from app.services.eligibility_service import eligibility_from_referral, is_eligible_for_level_income
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -267,15 +269,8 @@ class TransactionService:
             transaction.save()
             
             # Update user balance in MongoDB
-            now = datetime.utcnow()
-            db.users.update_one(
-                {"_id": user_id},
-                {"$set": {
-                    "balance": user.balance,
-                    "updated_at": now
-                }}
-            )
-            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {user.balance} after referral commission")
+            new_balance = Ledger.credit(user_id, amount, 'referral_commission', reference=source_user_id)
+            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {new_balance} after referral commission")
             
             return {"success": True, "amount": amount, "user_id": user_id}
             
@@ -412,15 +407,8 @@ class TransactionService:
             transaction.save()
             
             # Update user balance in MongoDB
-            now = datetime.utcnow()
-            db.users.update_one(
-                {"_id": user_id},
-                {"$set": {
-                    "balance": user.balance,
-                    "updated_at": now
-                }}
-            )
-            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {user.balance} after team reward")
+            new_balance = Ledger.credit(user_id, amount, 'team_reward', reference=f"level_{team_level}")
+            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {new_balance} after team reward")
             
             return {"success": True, "amount": amount, "user_id": user_id, "level": team_level}
             
@@ -637,15 +625,8 @@ class TransactionService:
                 transaction.save()
                 
                 # Update user balance in MongoDB
-                now = datetime.utcnow()
-                db.users.update_one(
-                    {"_id": from_user_id},
-                    {"$set": {
-                        "balance": user.balance,
-                        "updated_at": now
-                    }}
-                )
-                print(f"[DEBUG] Updated MongoDB user {from_user_id} balance to {user.balance} after withdrawal")
+                new_balance = Ledger.debit(from_user_id, amount, 'withdrawal', reference=transaction.transaction_id)
+                print(f"[DEBUG] Updated MongoDB user {from_user_id} balance to {new_balance} after withdrawal")
                 
                 return {
                     "success": True, 
@@ -767,15 +748,8 @@ class TransactionService:
                     transaction.save()
                     
                     # Update user balance in MongoDB
-                    now = datetime.utcnow()
-                    db.users.update_one(
-                        {"_id": user.id},
-                        {"$set": {
-                            "balance": user.balance,
-                            "updated_at": now
-                        }}
-                    )
-                    print(f"[DEBUG] Updated MongoDB user {user.id} balance to {user.balance} after daily return")
+                    new_balance = Ledger.credit(user.id, daily_return, 'daily_return', reference=investment.id)
+                    print(f"[DEBUG] Updated MongoDB user {user.id} balance to {new_balance} after daily return")
                     
                     # Check if investment is complete
                     from datetime import datetime, timedelta
@@ -875,15 +849,8 @@ class TransactionService:
             tx.save()
             
             # Update user balance in MongoDB
-            now = datetime.utcnow()
-            db.users.update_one(
-                {"_id": user_id},
-                {"$set": {
-                    "balance": user.balance,
-                    "updated_at": now
-                }}
-            )
-            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {user.balance} after deposit")
+            new_balance = Ledger.credit(user_id, amount, 'deposit', reference=tx_hash)
+            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {new_balance} after deposit")
             
             return {"success": True, "amount": amount, "user_id": user_id}
             
@@ -935,9 +902,17 @@ class TransactionService:
                 commission_rate = commission_rates.get(level, 0) * (total_referral_percentage / 100)
                 commission_amount = amount * commission_rate
                 
+                # Referrer's own referral document: carries the precomputed
+                # eligibility flag and the next hop up the tree
+                referrer_rel = db.referral_tree.find_one(
+                    {'user_id': current_referrer_id},
+                    {'referrer_id': 1, 'eligible_for_level_income': 1, 'eligibility_reason': 1}
+                )
+                
                 if commission_amount > 0:
                     # Check eligibility
-                    eligible = self._check_referrer_eligibility(current_referrer_id)
+                    stored = eligibility_from_referral(referrer_rel)
+                    eligible = stored[0] if stored is not None else self._check_referrer_eligibility(current_referrer_id)
                     
                     if eligible:
                         # Add commission to referrer balance and record
@@ -962,11 +937,10 @@ class TransactionService:
                         db.session.add(earnings)
                 
                 # Move up the tree
-                referral = ReferralTree.query.filter_by(user_id=current_referrer_id).first()
-                if not referral:
+                if not referrer_rel:
                     break
                     
-                current_referrer_id = referral.referrer_id
+                current_referrer_id = referrer_rel.get('referrer_id')
                 level += 1
                 
         except Exception as e:
@@ -977,6 +951,8 @@ class TransactionService:
         """
         Check if a referrer is eligible to receive commissions
         
+        Reads the precomputed flag (see app.services.eligibility_service)
+        
         Args:
             user_id: User ID to check
             
@@ -984,32 +960,9 @@ class TransactionService:
             Boolean indicating eligibility
         """
         try:
-            # Check income hold status
-            from app.models.income_hold_status import IncomeHoldStatus
-            hold_status = IncomeHoldStatus.query.filter_by(user_id=user_id).first()
-            
-            if hold_status and hold_status.level_income_on_hold:
-                return False
-            
-            # Check active legs
-            from app.models.user_legs import UserLegs
-            legs = UserLegs.query.filter_by(user_id=user_id).first()
-            
-            # Get minimum required legs from settings
-            from app.services.system_service import get_system_setting
-            min_legs = int(get_system_setting('min_legs_for_reward', 5))
-            
-            if not legs or legs.active_legs < min_legs:
-                return False
-            
-            # Check active investments
-            from app.models.user_investments import UserInvestment
-            active_investments = UserInvestment.query.filter_by(
-                user_id=user_id,
-                investment_status='active'
-            ).count()
-            
-            return active_investments > 0
+            # Hold status, active legs vs min_legs_for_reward and active
+            # investments are folded into a flag on the referral document
+            return is_eligible_for_level_income(user_id)
             
         except Exception as e:
             print(f"Error checking referrer eligibility: {str(e)}")
@@ -1259,15 +1212,8 @@ class TransactionService:
                 tx.save()
             
             # Update MongoDB balance after all pending earnings are processed
-            now = datetime.utcnow()
-            db.users.update_one(
-                {"_id": user_id},
-                {"$set": {
-                    "balance": user.balance,
-                    "updated_at": now
-                }}
-            )
-            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {user.balance} after releasing pending earnings")
+            new_balance = Ledger.credit(user_id, sum(earning.amount for earning in pending_earnings), 'pending_earnings_release')
+            print(f"[DEBUG] Updated MongoDB user {user_id} balance to {new_balance} after releasing pending earnings")
             
             # Log activity
             from app.models.user_activity import UserActivity
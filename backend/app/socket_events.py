@@ -0,0 +1,118 @@
+"""
+Per-user outbound Socket.IO events
+
+One deposit can produce new_deposit, balance_updated and
+transactions_refreshed, sometimes from both the socket handlers and the wallet
+refresh path. Events pushed through this module are buffered per user room
+for a short window and then written once: repeated events with the same key
+are coalesced so only the latest state is sent, and superseded payloads are
+dropped before they ever reach a slow client's socket.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+from app import socketio
+
+logger = logging.getLogger(__name__)
+
+# Coalescing window in milliseconds; 0 disables buffering
+COALESCE_WINDOW_MS = int(os.environ.get('SOCKETIO_COALESCE_WINDOW_MS', '250'))
+
+# Events whose newest payload fully replaces older ones for the same user
+LATEST_STATE_EVENTS = ('balance_updated', 'transactions_refreshed')
+
+
+def user_room(user_id):
+    """
+    Name of the Socket.IO room that holds every connection of one user
+
+    Args:
+        user_id: User ID (ObjectId or string)
+
+    Returns:
+        str: Room name in the form ``user:<id>``
+    """
+    return f"user:{user_id}"
+
+
+class UserEventBuffer:
+    """Coalescing per-room buffer for outbound Socket.IO events"""
+
+    def __init__(self, window_ms=COALESCE_WINDOW_MS):
+        self.window = max(0, window_ms) / 1000.0
+        self._pending = {}  # room -> OrderedDict(key -> (event, data))
+        self._lock = threading.Lock()
+        self.stats = {'queued': 0, 'emitted': 0, 'superseded': 0}
+
+    def push(self, user_id, event, data, key=None):
+        """
+        Queue an event for a user's room
+
+        Args:
+            user_id: Recipient user ID
+            event (str): Socket.IO event name
+            data (dict): Event payload
+            key: Coalescing key. Events sharing a key within the window are
+                 collapsed to the latest payload. Defaults to the event name
+                 for latest-state events, otherwise every event is kept.
+        """
+        room = user_room(user_id)
+        if self.window <= 0:
+            self._emit(event, data, room)
+            return
+
+        if key is None:
+            key = event if event in LATEST_STATE_EVENTS else object()
+
+        with self._lock:
+            pending = self._pending.get(room)
+            schedule_flush = pending is None
+            if schedule_flush:
+                pending = self._pending[room] = OrderedDict()
+            if key in pending:
+                # Keep the original position so event order stays stable
+                self.stats['superseded'] += 1
+            pending[key] = (event, data)
+            self.stats['queued'] += 1
+
+        if schedule_flush:
+            socketio.start_background_task(self._flush_later, room)
+
+    def flush(self, room):
+        """Emit everything buffered for a room"""
+        with self._lock:
+            pending = self._pending.pop(room, None)
+        for event, data in (pending or {}).values():
+            self._emit(event, data, room)
+
+    def _flush_later(self, room):
+        socketio.sleep(self.window)
+        self.flush(room)
+
+    def _emit(self, event, data, room):
+        try:
+            socketio.emit(event, data, room=room)
+            with self._lock:
+                self.stats['emitted'] += 1
+        except Exception as e:
+            logger.error(f"Error emitting {event} to {room}: {str(e)}")
+
+
+user_events = UserEventBuffer()
+
+
+def deposit_key(tx_hash):
+    """
+    Coalescing key for a new_deposit event
+
+    Repeated notifications of one transaction collapse into one; deposits
+    without a hash get no key, so distinct ones are never merged.
+    """
+    return ('new_deposit', tx_hash) if tx_hash else None
+
+
+def push_user_event(user_id, event, data, key=None):
+    """Queue a coalesced Socket.IO event for one user (see UserEventBuffer.push)"""
+    user_events.push(user_id, event, data, key=key)
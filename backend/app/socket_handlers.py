@@ -8,6 +8,7 @@ particularly focused on transaction processing.
 from flask_socketio import emit, join_room, leave_room
 from flask import current_app, request
 from app import socketio, db
+from app.socket_events import user_room, push_user_event, deposit_key
 from flask_jwt_extended import decode_token
 import jwt
 import uuid
@@ -20,18 +21,26 @@ logger = logging.getLogger(__name__)
 # Dictionary to store users with paused socket operations
 socket_paused_users = {}
 
+# Socket.IO session id -> user id from the JWT presented on connect
+authenticated_sids = {}
+
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Handle client connection with JWT authentication"""
     from flask_socketio import ConnectionRefusedError
     try:
         # Get token from different possible sources
         token = None
         
+        # Check Socket.IO auth payload (io(url, { auth: { token } }))
+        if isinstance(auth, dict):
+            token = auth.get('token')
+        
         # Check authorization header
-        auth_header = request.headers.get('Authorization', '') if hasattr(request, 'headers') else ''
-        if auth_header.startswith('Bearer '):
-            token = auth_header.replace('Bearer ', '')
+        if not token:
+            auth_header = request.headers.get('Authorization', '') if hasattr(request, 'headers') else ''
+            if auth_header.startswith('Bearer '):
+                token = auth_header.replace('Bearer ', '')
         
         # Check query parameters
         if not token and hasattr(request, 'args'):
@@ -46,8 +55,16 @@ def handle_connect():
         if token:
             try:
                 # Decode token - adjust this to match your JWT structure
-                decode_token(token)
+                decoded = decode_token(token)
+                identity = decoded.get(current_app.config.get('JWT_IDENTITY_CLAIM', 'sub'))
+                if isinstance(identity, dict):
+                    identity = identity.get('id')
                 logger.info("Client authenticated with valid JWT token")
+                
+                # Put the connection in its user's room so events can be targeted
+                if identity:
+                    authenticated_sids[request.sid] = str(identity)
+                    join_room(user_room(identity))
             except jwt.ExpiredSignatureError:
                 logger.warning("Expired JWT token in socket connection")
                 # Optionally reject connection for expired token
@@ -72,6 +89,7 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
+    authenticated_sids.pop(getattr(request, 'sid', None), None)
     # Use a safer method to log disconnection
     logger.info("Client disconnected")
 
@@ -203,22 +221,11 @@ def handle_deposit(deposit_data):
         user_id = deposit_data['user_id']
         amount = deposit_data['amount']
         
-        # Get current user balance
-        user = db.users.find_one({"_id": user_id})
-        current_balance = user.get('balance', 0) if user else 0
-        new_balance = current_balance + amount
+        # Atomic ledger credit
+        from app.models.ledger import Ledger
+        new_balance = Ledger.credit(user_id, amount, 'deposit', reference=deposit_data.get('tx_hash'))
         
-        # Update the user's balance
-        now = datetime.utcnow()
-        db.users.update_one(
-            {"_id": user_id},
-            {"$set": {
-                "balance": new_balance,
-                "updated_at": now
-            }}
-        )
-        
-        logger.info(f"Updated user {user_id} balance from {current_balance} to {new_balance}")
+        logger.info(f"Updated user {user_id} balance by {amount} to {new_balance}")
         
         # Emit confirmation to the client
         emit('deposit_saved', {
@@ -239,15 +246,15 @@ def handle_deposit(deposit_data):
             "timestamp": deposit_data['timestamp'].isoformat()
         }
         
-        emit('new_deposit', broadcast_data, broadcast=True)
+        push_user_event(user_id, 'new_deposit', broadcast_data, key=deposit_key(deposit_data.get('tx_hash')))
         
-        # Also broadcast updated balance for the specific user
-        emit('balance_updated', {
+        # Also send updated balance to the specific user
+        push_user_event(user_id, 'balance_updated', {
             "user_id": user_id,
             "balance": new_balance,
             "transaction_id": deposit_data['transaction_id'],
             "timestamp": deposit_data['timestamp'].isoformat()
-        }, room=user_id)
+        })
     
     except Exception as e:
         logger.error(f"Error handling deposit: {str(e)}")
@@ -327,7 +334,7 @@ def handle_transaction(tx_data):
             "timestamp": datetime.utcnow().isoformat()
         })
         
-        # Broadcast to all connected clients if this is meant to be a public transaction
+        # Notify the user's other connections if requested
         if tx_data.get('broadcast', False):
             # Remove sensitive info before broadcasting
             broadcast_data = {
@@ -340,7 +347,7 @@ def handle_transaction(tx_data):
             if tx_data.get('transaction_type') == 'withdrawal':
                 broadcast_data['withdrawal_address'] = tx_data.get('from_address')
                 
-            emit('new_transaction', broadcast_data, broadcast=True)
+            emit('new_transaction', broadcast_data, room=user_room(user_id))
     
     except Exception as e:
         logger.error(f"Error handling transaction: {str(e)}")
@@ -351,6 +358,9 @@ def handle_join(data):
     """
     Handle joining a room for user-specific updates
     
+    Only the room of the user authenticated on connect may be joined; per-user
+    rooms carry private balance and payment events.
+    
     Args:
         data: Dictionary containing room information
     """
@@ -359,9 +369,16 @@ def handle_join(data):
         if not room:
             emit('join_error', {"error": "Room parameter is required"})
             return
-            
-        # Join the specified room (user ID)
-        join_room(room)
+        
+        # Bare user IDs map onto the per-user room that server-side emits target
+        target = str(room) if str(room).startswith('user:') else user_room(room)
+        identity = authenticated_sids.get(request.sid)
+        if identity is None or target != user_room(identity):
+            logger.warning(f"Client {request.sid} refused join of room: {room}")
+            emit('join_error', {"error": "Not allowed to join this room"})
+            return
+        
+        join_room(target)
         logger.info(f"Client {request.sid} joined room: {room}")
         emit('joined_room', {"room": room, "status": "joined"})
     except Exception as e:
@@ -402,13 +419,13 @@ def handle_external_transaction(tx_data):
             return
         
         # Find the user associated with this wallet address
-        user = db.users.find_one({"wallet_address": {'$regex': wallet_address, '$options': 'i'}})
+        user = db.users.find_one({"wallet_address": {'$regex': wallet_address, '$options': 'i'}}, {"_id": 1})
         
         if not user:
             logger.error(f"No user found with wallet address: {wallet_address}")
             # Search for partial address matches as a fallback
             users_with_similar_address = list(db.users.find(
-                {"wallet_address": {"$regex": wallet_address[:20], "$options": "i"}}
+                {"wallet_address": {"$regex": wallet_address[:20], "$options": "i"}}, {"_id": 1}
             ))
             
             if users_with_similar_address:
@@ -451,14 +468,11 @@ def handle_external_transaction(tx_data):
         
         logger.info(f"Saved external transaction with ID: {transaction_id}")
         
-        # Update user balance
-        previous_balance = float(user.get('balance', 0))
-        new_balance = previous_balance + float(tx_data.get('amount', 0))
-        
-        db.users.update_one(
-            {"_id": user['_id']},
-            {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-        )
+        # Update user balance (atomic ledger credit)
+        from app.models.ledger import Ledger
+        new_balance = Ledger.credit(user['_id'], float(tx_data.get('amount', 0)), 'deposit',
+                                    reference=tx_data.get('tx_hash'))
+        previous_balance = new_balance - float(tx_data.get('amount', 0))
         
         logger.info(f"Updated user balance from {previous_balance} to {new_balance}")
         
@@ -469,25 +483,24 @@ def handle_external_transaction(tx_data):
             "transaction_id": tx_id
         })
         
-        # 2. New deposit for all clients
-        emit('new_deposit', {
+        # 2. New deposit for the user's connections
+        push_user_event(user['_id'], 'new_deposit', {
             "transaction_id": tx_id,
             "user_id": str(user['_id']),
             "amount": tx_data.get('amount', 0),
             "tx_hash": tx_data.get('tx_hash'),
             "wallet_address": wallet_address,
             "timestamp": datetime.utcnow().isoformat()
-        }, broadcast=True)
+        }, key=deposit_key(tx_data.get('tx_hash')))
         
         # 3. Balance update for specific user
-        user_room = str(user['_id'])
-        emit('balance_updated', {
+        push_user_event(user['_id'], 'balance_updated', {
             "user_id": str(user['_id']),
             "balance": new_balance,
             "previous_balance": previous_balance,
             "change": float(tx_data.get('amount', 0)),
             "timestamp": datetime.utcnow().isoformat()
-        }, room=user_room)
+        })
         
         return {
             "success": True,
@@ -10,6 +10,7 @@ waiting for scheduled tasks.
 import logging
 from datetime import datetime
 from app import create_app
+from app.services.log_sink import log_sink
 from app.tasks.automated_distributions import (
     distribute_roi,
     distribute_referral_income,
@@ -82,7 +83,7 @@ def handle_bid_cycle_filled(cycle_id):
                 )
                 
                 # Log the activity using MongoDB insert
-                db.system_log.insert_one({
+                log_sink.write('system_log', {
                     "log_type": "bid_cycle_filled_closed",
                     "log_message": f"Bid cycle #{cycle_id} automatically closed after reaching capacity: {cycle.get('bids_filled')}/{cycle.get('total_bids_allowed')} units",
                     "created_at": datetime.utcnow()
@@ -240,7 +241,7 @@ def open_next_bid_cycle():
             logger.info(f"New bid cycle opened immediately: #{new_cycle_id} with {total_bids} units available")
             
             # Log the activity using MongoDB insert
-            db.system_log.insert_one({
+            log_sink.write('system_log', {
                 "log_type": "bid_cycle_opened_immediately",
                 "log_message": f"New bid cycle #{new_cycle_id} opened immediately after previous cycle filled",
                 "created_at": datetime.utcnow()
@@ -0,0 +1,140 @@
+# app/tasks/moralis_registration.py
+"""
+Batched Moralis Stream address registration
+
+New deposit addresses are queued in moralis_address_registrations (see
+TatumHybridService.queue_moralis_registration). flush_moralis_registrations
+drains the queue in batches through the Moralis "add address" API, and
+reconcile_moralis_stream diffs the local address set against the stream.
+
+Run manually:
+    python -m app.tasks.moralis_registration flush
+    python -m app.tasks.moralis_registration reconcile [--dry-run]
+"""
+import argparse
+import logging
+import os
+from datetime import datetime
+from app import create_app
+from app.services.log_sink import log_sink
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def _flush(batch_size=DEFAULT_BATCH_SIZE, max_batches=50):
+    """Drain due queue entries; assumes an app context is active"""
+    from app.models.moralis_address_registration import MoralisAddressRegistration
+    from app.services.tatum_hybrid_service import TatumHybridService
+
+    tatum_service = TatumHybridService()
+    stream_id = os.environ.get('MORALIS_STREAM_ID')
+    registered = failed = 0
+
+    for _ in range(max_batches):
+        batch = MoralisAddressRegistration.claim_batch(limit=batch_size)
+        if not batch:
+            break
+
+        success, error = tatum_service.add_addresses_to_moralis_stream(batch)
+        if success:
+            registered += MoralisAddressRegistration.mark_registered(batch, stream_id=stream_id)
+        else:
+            logger.warning(f"Moralis batch registration failed for {len(batch)} addresses: {error}")
+            failed += MoralisAddressRegistration.mark_failed(batch, error)
+            # Don't hammer the API while it is failing; the rest waits for the next run
+            break
+
+    if registered or failed:
+        log_sink.write('system_logs', {
+            "log_type": 'moralis_registration',
+            "log_message": f'Batched Moralis registration: {registered} registered, {failed} failed',
+            "created_at": datetime.utcnow()
+        })
+    return {"success": True, "registered": registered, "failed": failed}
+
+
+def flush_moralis_registrations(batch_size=DEFAULT_BATCH_SIZE):
+    """Register queued deposit addresses with the Moralis stream in batches"""
+    app = create_app()
+    with app.app_context():
+        try:
+            result = _flush(batch_size=batch_size)
+            if result["registered"] or result["failed"]:
+                logger.info(f"Moralis registration flush: {result}")
+            return result
+        except Exception as e:
+            logger.exception(f"Error flushing Moralis registrations: {str(e)}")
+            return {"success": False, "message": str(e)}
+
+
+def reconcile_moralis_stream(dry_run=False):
+    """
+    Diff local deposit addresses against the Moralis stream
+
+    - Local addresses missing from the stream are (re)queued for registration
+    - Addresses present on the stream are marked registered
+    - Stream addresses with no local wallet are reported, never removed
+
+    Returns:
+        dict: Counts plus samples of each discrepancy
+    """
+    app = create_app()
+    with app.app_context():
+        from app import db
+        from app.models.moralis_address_registration import MoralisAddressRegistration
+        from app.services.tatum_hybrid_service import TatumHybridService
+
+        normalize = MoralisAddressRegistration.normalize
+        try:
+            local = set()
+            cursor = db.user_wallets.find(
+                {"deposit_address": {"$nin": [None, ""]}},
+                {"deposit_address": 1}
+            ).batch_size(1000)
+            for wallet in cursor:
+                local.add(normalize(wallet["deposit_address"]))
+
+            remote = {normalize(a) for a in TatumHybridService().list_moralis_stream_addresses()}
+
+            missing = sorted(local - remote)
+            unknown = sorted(remote - local)
+            confirmed = sorted(local & remote)
+
+            if not dry_run:
+                MoralisAddressRegistration.enqueue(missing, source='reconciliation')
+                MoralisAddressRegistration.requeue(missing)
+                MoralisAddressRegistration.enqueue(confirmed, source='reconciliation')
+                MoralisAddressRegistration.mark_registered(confirmed, stream_id=os.environ.get('MORALIS_STREAM_ID'))
+
+            result = {
+                "success": True,
+                "dry_run": dry_run,
+                "local": len(local),
+                "stream": len(remote),
+                "missing_from_stream": len(missing),
+                "unknown_on_stream": len(unknown),
+                "confirmed": len(confirmed),
+                "missing_sample": missing[:20],
+                "unknown_sample": unknown[:20]
+            }
+            logger.info(f"Moralis reconciliation: {result}")
+            return result
+        except Exception as e:
+            logger.exception(f"Error reconciling Moralis stream: {str(e)}")
+            return {"success": False, "message": str(e)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Moralis Stream address registration')
+    parser.add_argument('command', choices=['flush', 'reconcile'])
+    parser.add_argument('--dry-run', action='store_true', help='Reconcile: report only, change nothing')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'flush':
+        print(flush_moralis_registrations(batch_size=args.batch_size))
+    else:
+        print(reconcile_moralis_stream(dry_run=args.dry_run))
@@ -7,6 +7,7 @@ import time
 import schedule
 import threading
 from app import create_app
+from app.services.log_sink import log_sink
 from app.services.transaction_service import TransactionService
 from app.services.token_service import TokenService
 from app.services.system_service import get_system_setting
@@ -68,14 +69,17 @@ def calculate_team_rewards():
         logger.info("Starting team rewards calculation...")
         
         try:
-            # Import ObjectId for MongoDB ID handling
-            from bson.objectid import ObjectId
+            from app.models.team_rewards import TeamReward
+            from app.services.team_reward_evaluator import (
+                load_candidates, evaluate_percentage_rewards, apply_team_rewards
+            )
             
-            # Get all users with sufficient active legs using MongoDB queries
+            # Load every user with sufficient active legs, their business
+            # volume and active leg volumes in one aggregation
             min_legs = int(get_system_setting('min_legs_for_reward', 5))
-            eligible_legs = list(db.user_legs.find({"active_legs": {"$gte": min_legs}}))
+            candidates = load_candidates(db, min_legs)
             
-            if not eligible_legs:
+            if not len(candidates):
                 logger.info("No users with sufficient active legs found")
                 return
             
@@ -84,114 +88,20 @@ def calculate_team_rewards():
             logger.info(f"Using team reward percentage: {team_reward_percentage}%")
             
             # Get team reward levels - fallback for legacy compatibility
-            reward_levels = list(db.team_rewards.find({"is_active": 1}))
+            reward_levels = TeamReward.payout_levels()
             
             if not reward_levels:
                 logger.warning("No active reward levels defined, will use fixed 2.5% calculation")
             
-            # Process each eligible user
-            transaction_service = TransactionService()
-            processed_count = 0
-            failed_count = 0
-            total_amount = 0
-            
-            for legs in eligible_legs:
-                try:
-                    user_id = legs.get('user_id')
-                    if isinstance(user_id, str):
-                        try:
-                            user_id = ObjectId(user_id)
-                        except:
-                            pass
-                    
-                    # Get user's business volume
-                    business = db.team_business.find_one({"user_id": user_id})
-                    
-                    if not business:
-                        continue
-                    
-                    # Verify equal business across all legs
-                    leg_details = list(db.user_leg_details.find({"user_id": user_id}))
-                    
-                    # Check if we have enough details to verify
-                    if not leg_details or len(leg_details) < 5:
-                        logger.info(f"User {user_id} doesn't have enough leg details to verify equal business")
-                        continue
-                    
-                    # Get business volumes for each leg
-                    leg_volumes = [leg.get('business_volume', 0) for leg in leg_details if leg.get('is_active', False)]
-                    
-                    # Check if we have at least 5 active legs with business
-                    if len(leg_volumes) < 5:
-                        logger.info(f"User {user_id} doesn't have 5+ active legs with business")
-                        continue
-                    
-                    # Check for equal business distribution
-                    # We'll allow a 10% variance to account for minor differences
-                    avg_volume = sum(leg_volumes) / len(leg_volumes)
-                    equal_business = all(abs(volume - avg_volume) <= (avg_volume * 0.1) for volume in leg_volumes)
-                    
-                    if not equal_business:
-                        logger.info(f"User {user_id} doesn't have equal business across legs")
-                        continue
-                        
-                    logger.info(f"User {user_id} has 5+ active legs with equal business distribution")
-                    
-                    # Calculate reward based on 2.5% of total business volume
-                    business_volume = business.get('business_volume', 0)
-                    reward_amount = business_volume * (team_reward_percentage / 100)
-                    rank_level = 1 # Default rank
-                    
-                    # For backward compatibility, still check reward levels if available
-                    if reward_levels:
-                        # Find matching reward level
-                        reward_level = None
-                        for level in sorted(reward_levels, key=lambda x: x.get('business_volume', 0), reverse=True):
-                            if business_volume >= level.get('business_volume', 0):
-                                reward_level = level
-                                break
-                        
-                        if reward_level:
-                            # Use the higher reward amount between calculation and table
-                            rank_level = reward_level.get('rank_level', 1)
-                            if float(reward_level.get('reward_amount', 0)) > reward_amount:
-                                reward_amount = float(reward_level.get('reward_amount', 0))
-                    
-                    # Check if we should distribute reward
-                    if reward_amount > 0:
-                        # User has enough business volume for reward
-                        result = transaction_service.process_team_reward(
-                            user_id=user_id,
-                            amount=float(reward_amount),
-                            team_level=rank_level
-                        )
-                        
-                        if result['success']:
-                            # Update rank level if using reward levels
-                            if reward_levels:
-                                db.team_business.update_one(
-                                    {"user_id": user_id},
-                                    {"$set": {"current_rank_level": rank_level}}
-                                )
-                            processed_count += 1
-                            total_amount += float(reward_amount)
-                            logger.info(f"Team reward processed for user {user_id}: rank {rank_level}, amount {reward_amount} (2.5% of {business_volume})")
-                        else:
-                            failed_count += 1
-                            logger.error(f"Failed to process team reward for user {user_id}: {result.get('message')}")
-                    
-                    # Update last calculated timestamp
-                    db.team_business.update_one(
-                        {"user_id": user_id},
-                        {"$set": {"last_calculated_at": datetime.datetime.utcnow()}}
-                    )
-                    
-                except Exception as e:
-                    logger.exception(f"Error processing team reward for user {legs.get('user_id')}: {str(e)}")
-                    failed_count += 1
-                    continue
+            # Equal-business check (10% variance) and level match for all users at once
+            decisions = evaluate_percentage_rewards(candidates, reward_levels, team_reward_percentage)
+            logger.info(f"{int(decisions['eligible'].sum())} of {len(candidates)} users have 5+ active legs with equal business distribution")
+            
+            result = apply_team_rewards(
+                db, candidates, decisions, TransactionService(), update_rank=bool(reward_levels)
+            )
             
-            logger.info(f"Team rewards calculation completed. Processed: {processed_count}, Failed: {failed_count}, Total amount: {total_amount}")
+            logger.info(f"Team rewards calculation completed. Processed: {result['processed']}, Failed: {result['failed']}, Total amount: {result['total_amount']}")
             
         except Exception as e:
             logger.exception(f"Error in team rewards calculation: {str(e)}")
@@ -233,6 +143,71 @@ def process_blockchain_transactions():
             
         logger.info("Blockchain transaction processing task finished")
 
+def refresh_dashboard_snapshot():
+    """Regenerate the admin dashboard snapshot from the platform counters"""
+    app = create_app()
+    with app.app_context():
+        from app.models.platform_counters import PlatformCounters
+        try:
+            PlatformCounters.refresh_snapshot()
+        except Exception as e:
+            logger.exception(f"Error refreshing dashboard snapshot: {str(e)}")
+
+def rebuild_platform_counters():
+    """Recompute the platform counters from the source collections to correct drift"""
+    app = create_app()
+    with app.app_context():
+        from app.models.platform_counters import PlatformCounters
+        logger.info("Rebuilding platform counters...")
+        try:
+            counters = PlatformCounters.rebuild()
+            PlatformCounters.refresh_snapshot()
+            logger.info(f"Platform counters rebuilt: {counters}")
+        except Exception as e:
+            logger.exception(f"Error rebuilding platform counters: {str(e)}")
+
+def rebuild_team_counters():
+    """Recompute per-level team counters from the referral tree to correct drift"""
+    app = create_app()
+    with app.app_context():
+        from app.models.team_counters import TeamCounters
+        logger.info("Rebuilding team counters...")
+        try:
+            count = TeamCounters.rebuild()
+            logger.info(f"Team counters rebuilt for {count} users")
+        except Exception as e:
+            logger.exception(f"Error rebuilding team counters: {str(e)}")
+
+def refresh_level_income_eligibility():
+    """Recompute every stored level income eligibility flag as a safety net"""
+    app = create_app()
+    with app.app_context():
+        from app.services.eligibility_service import refresh_all_eligibility
+        try:
+            refresh_all_eligibility()
+        except Exception as e:
+            logger.exception(f"Error refreshing level income eligibility: {str(e)}")
+
+def take_balance_snapshots():
+    """Fold recent ledger entries into balance snapshots for point-in-time reads"""
+    app = create_app()
+    with app.app_context():
+        from app.models.ledger import Ledger
+        try:
+            Ledger.take_snapshots()
+        except Exception as e:
+            logger.exception(f"Error taking balance snapshots: {str(e)}")
+
+def reconcile_balances():
+    """Continue the incremental balance reconciliation from its checkpoint"""
+    app = create_app()
+    with app.app_context():
+        from app.services.reconciliation_service import run_reconciliation
+        try:
+            run_reconciliation()
+        except Exception as e:
+            logger.exception(f"Error reconciling balances: {str(e)}")
+
 def open_daily_bid_cycle():
     """Open a new bid cycle for the day"""
     # Create a fresh app context for this task
@@ -332,7 +307,7 @@ def open_daily_bid_cycle():
                 logger.info(f"New bid cycle opened: #{new_cycle_id} with {total_bids} units available")
                 
                 # Log the activity
-                db.system_log.insert_one({
+                log_sink.write('system_log', {
                     "log_type": "bid_cycle_opened",
                     "log_message": f"New bid cycle #{new_cycle_id} opened with {total_bids} units",
                     "created_at": datetime.utcnow()
@@ -390,7 +365,7 @@ def close_bid_cycle():
                 )
                 
                 # Log the activity using MongoDB insert_one
-                db.system_log.insert_one({
+                log_sink.write('system_log', {
                     "log_type": "bid_cycle_closed",
                     "log_message": f"Bid cycle #{current_cycle.get('_id')} closed after all {current_cycle.get('total_bids_allowed')} units were sold",
                     "created_at": datetime.utcnow()
@@ -33,9 +33,16 @@ def start_scheduler():
         distribute_referral_income,
         distribute_loop_token_rewards,
         calculate_team_rewards,
-        process_blockchain_transactions
+        process_blockchain_transactions,
+        refresh_dashboard_snapshot,
+        rebuild_platform_counters,
+        rebuild_team_counters,
+        refresh_level_income_eligibility,
+        take_balance_snapshots,
+        reconcile_balances
     )
     from app.tasks.token_burn import burn_daily_tokens
+    from app.tasks.moralis_registration import flush_moralis_registrations
     
     logger.info("Initializing task scheduler...")
     
@@ -65,6 +72,28 @@ def start_scheduler():
     # Process blockchain transactions every 15 minutes
     schedule.every(15).minutes.do(process_blockchain_transactions)
     
+    # Register queued deposit addresses with Moralis in batches
+    schedule.every(1).minutes.do(flush_moralis_registrations)
+    
+    # Admin dashboard snapshot from the running counters; nightly full
+    # recount corrects any drift in the $inc-maintained totals
+    schedule.every(1).minutes.do(refresh_dashboard_snapshot)
+    schedule.every().day.at("01:00").do(rebuild_platform_counters)
+    
+    # Weekly full recount of per-level team counters, ahead of team rewards
+    schedule.every().sunday.at("11:00").do(rebuild_team_counters)
+    
+    # Stored eligibility flags are event-driven; recompute nightly before
+    # referral income is distributed in case an update path was missed
+    schedule.every().day.at("05:30").do(refresh_level_income_eligibility)
+    
+    # Balance snapshots bound how much of the ledger a point-in-time read replays
+    schedule.every().hour.do(take_balance_snapshots)
+    
+    # Jobs run inline in this loop, so each run checks users for at most
+    # 15 seconds and the next one resumes from its checkpoint
+    schedule.every(2).minutes.do(reconcile_balances)
+    
     logger.info("Scheduler initialized with all tasks")
     
     # Run continuously
@@ -1,7 +1,10 @@
 # app/tasks/transaction_processor.py
 import logging
+import os
+import socket
+import uuid
 from datetime import datetime, timedelta
-from app import create_app
+from app import create_app, socketio
 from app.services.transaction_service import TransactionService
 from app.services.tatum_hybrid_service import TatumHybridService
 
@@ -20,14 +23,23 @@ logger = logging.getLogger(__name__)
 # Don't create a global app or db connection to avoid socket issues in threads
 # Instead, create fresh connections within each function that needs them
 
-def process_pending_transactions(batch_size=10, max_retries=3):
+# Identifies this process in the worker_id of the transactions it claims
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def process_pending_transactions(batch_size=10, max_retries=3, lease_seconds=None):
     """
     Process pending blockchain transactions for P2P payments.
     This executes the actual blockchain transfers for transactions created by the distribution system.
     
+    Transactions are claimed one at a time with an atomic lease
+    (PendingTransaction.claim_next), so any number of processor runs or nodes
+    can work the queue at once without picking up the same payment, and a
+    payment whose worker died is reclaimed once its lease expires.
+    
     Args:
         batch_size: Number of transactions to process in one batch
         max_retries: Maximum number of retry attempts for failed transactions
+        lease_seconds: Lease duration per claimed transaction
     """
     # Create a fresh app context for this thread/function
     app = create_app()
@@ -46,32 +58,26 @@ def process_pending_transactions(batch_size=10, max_retries=3):
             tatum_service = TatumHybridService()
             transaction_service = TransactionService()
             
-            # Get pending transactions using MongoDB
-            pending_txs = list(db.pending_transactions.find(
-                {"status": "pending"}
-            ).sort(
-                "created_at", 1  # Sort by created_at ascending
-            ).limit(batch_size))
-            
-            if not pending_txs:
-                logger.info("No pending transactions found")
-                return {"success": True, "processed": 0, "message": "No pending transactions"}
+            from app.models.pending_transaction import PendingTransaction
+            lease_seconds = lease_seconds or PendingTransaction.LEASE_SECONDS
             
             # Process each transaction
             processed_count = 0
             failed_count = 0
             total_amount = 0
             
-            for pending_tx in pending_txs:
+            for _ in range(batch_size):
+                # Atomically claim the next transaction (pending -> processing)
+                pending_tx = PendingTransaction.claim_next(WORKER_ID, lease_seconds)
+                if pending_tx is None:
+                    break
+                
+                # Set once the transfer has been requested; a failure after that
+                # point may have sent the payment and is never retried automatically
+                sending = False
                 try:
                     tx_id = pending_tx.get('_id')
                     
-                    # Update status to processing using MongoDB
-                    db.pending_transactions.update_one(
-                        {"_id": tx_id},
-                        {"$set": {"status": "processing"}}
-                    )
-                    
                     # Get source wallet ID and convert to ObjectId if needed
                     source_wallet_id = pending_tx.get('source_wallet_id')
                     if isinstance(source_wallet_id, str):
@@ -85,26 +91,20 @@ def process_pending_transactions(batch_size=10, max_retries=3):
                     
                     if not source_wallet:
                         logger.error(f"Source wallet {source_wallet_id} not found")
-                        db.pending_transactions.update_one(
-                            {"_id": tx_id},
-                            {"$set": {
-                                "status": "failed",
-                                "error_message": "Source wallet not found"
-                            }}
-                        )
+                        PendingTransaction.finish(tx_id, WORKER_ID, {
+                            "status": "failed",
+                            "error_message": "Source wallet not found"
+                        })
                         failed_count += 1
                         continue
                     
                     # Check if we have access to the private key
                     if not source_wallet.get('encrypted_private_key'):
                         logger.error(f"No private key available for wallet {source_wallet.get('_id')}")
-                        db.pending_transactions.update_one(
-                            {"_id": tx_id},
-                            {"$set": {
-                                "status": "failed",
-                                "error_message": "No private key available"
-                            }}
-                        )
+                        PendingTransaction.finish(tx_id, WORKER_ID, {
+                            "status": "failed",
+                            "error_message": "No private key available"
+                        })
                         failed_count += 1
                         continue
                     
@@ -126,17 +126,21 @@ def process_pending_transactions(batch_size=10, max_retries=3):
                     
                     if not private_key:
                         logger.error(f"Failed to decrypt private key for wallet {source_wallet.get('_id')}")
-                        db.pending_transactions.update_one(
-                            {"_id": tx_id},
-                            {"$set": {
-                                "status": "failed",
-                                "error_message": "Failed to decrypt private key",
-                                "retry_count": pending_tx.get('retry_count', 0) + 1
-                            }}
-                        )
+                        PendingTransaction.finish(tx_id, WORKER_ID, {
+                            "status": "failed",
+                            "error_message": "Failed to decrypt private key",
+                            "retry_count": pending_tx.get('retry_count', 0) + 1
+                        })
                         failed_count += 1
                         continue
                     
+                    # Record the send before requesting it, so an expired lease
+                    # from here on goes to manual review instead of a resend
+                    if not PendingTransaction.mark_sending(tx_id, WORKER_ID):
+                        logger.warning(f"Lost the claim on transaction {tx_id} before sending it")
+                        continue
+                    sending = True
+                    
                     # Execute the blockchain transaction
                     tx_result = transaction_service.send_usdt(
                         from_address=source_wallet.get('wallet_address'),
@@ -147,14 +151,11 @@ def process_pending_transactions(batch_size=10, max_retries=3):
                     
                     if tx_result.get('success'):
                         # Mark as completed using MongoDB
-                        db.pending_transactions.update_one(
-                            {"_id": tx_id},
-                            {"$set": {
-                                "status": "completed",
-                                "processed_at": datetime.utcnow(),
-                                "blockchain_tx_hash": tx_result.get('txId')
-                            }}
-                        )
+                        PendingTransaction.finish(tx_id, WORKER_ID, {
+                            "status": "completed",
+                            "processed_at": datetime.utcnow(),
+                            "blockchain_tx_hash": tx_result.get('txId')
+                        })
                         
                         # Update the TatumTransaction record using MongoDB
                         db.tatum_transactions.update_one(
@@ -171,6 +172,19 @@ def process_pending_transactions(batch_size=10, max_retries=3):
                         processed_count += 1
                         total_amount += pending_tx.get('amount', 0)
                         
+                        # Notify the wallet owner. With a Socket.IO message queue configured
+                        # this reaches them on whichever node they are connected to.
+                        if source_wallet.get('user_id'):
+                            from app.socket_events import user_room
+                            socketio.emit('payment_processed', {
+                                "pending_transaction_id": str(tx_id),
+                                "transaction_type": pending_tx.get('transaction_type'),
+                                "amount": pending_tx.get('amount', 0),
+                                "destination_address": pending_tx.get('destination_address'),
+                                "tx_hash": tx_result.get('txId'),
+                                "timestamp": datetime.utcnow().isoformat()
+                            }, room=user_room(source_wallet.get('user_id')))
+                        
                         logger.info(f"Successfully processed P2P payment of {pending_tx.get('amount')} USDT to {pending_tx.get('destination_address')}")
                     else:
                         # Handle failure using MongoDB
@@ -186,13 +200,11 @@ def process_pending_transactions(batch_size=10, max_retries=3):
                             update_data["status"] = "failed"
                             logger.error(f"P2P payment failed after {max_retries} attempts: {error_msg}")
                         else:
-                            update_data["status"] = "pending"  # Will be retried
+                            update_data["status"] = "pending"  # Will be retried after a backoff
+                            update_data["next_attempt_at"] = PendingTransaction.retry_after(retry_count)
                             logger.warning(f"P2P payment failed, will retry ({retry_count}/{max_retries}): {error_msg}")
                         
-                        db.pending_transactions.update_one(
-                            {"_id": tx_id},
-                            {"$set": update_data}
-                        )
+                        PendingTransaction.finish(tx_id, WORKER_ID, update_data)
                         
                         failed_count += 1
                     
@@ -207,23 +219,31 @@ def process_pending_transactions(batch_size=10, max_retries=3):
                             "retry_count": retry_count
                         }
                         
-                        if retry_count >= max_retries:
+                        if sending:
+                            update_data["status"] = "failed"
+                            update_data["error_message"] = f"Error after submitting the payment; check the chain before retrying: {str(e)}"[:255]
+                        elif retry_count >= max_retries:
                             update_data["status"] = "failed"
                             update_data["error_message"] = str(e)[:255]  # Truncate if too long
                         else:
-                            update_data["status"] = "pending"  # Will be retried
+                            update_data["status"] = "pending"  # Will be retried after a backoff
+                            update_data["next_attempt_at"] = PendingTransaction.retry_after(retry_count)
                         
-                        db.pending_transactions.update_one(
-                            {"_id": pending_tx.get('_id')},
-                            {"$set": update_data}
-                        )
+                        PendingTransaction.finish(pending_tx.get('_id'), WORKER_ID, update_data)
                     except Exception as inner_e:
                         logger.exception(f"Error updating transaction status: {str(inner_e)}")
                     
                     failed_count += 1
                     continue
             
-            logger.info(f"Transaction processing completed. Processed: {processed_count}, Failed: {failed_count}, Total: {total_amount}")
+            if processed_count + failed_count == 0:
+                logger.info("No pending transactions found")
+                return {"success": True, "processed": 0, "message": "No pending transactions"}
+            
+            stats = PendingTransaction.queue_stats()
+            logger.info(f"Transaction processing completed. Processed: {processed_count}, Failed: {failed_count}, Total: {total_amount}. "
+                        f"Queue depth: {stats['queue_depth']}, expired leases: {stats['expired_leases']}, "
+                        f"avg claim latency: {stats['avg_claim_latency_seconds']:.1f}s")
             return {
                 "success": True,
                 "processed": processed_count,
@@ -235,10 +255,25 @@ def process_pending_transactions(batch_size=10, max_retries=3):
             logger.exception(f"Error in transaction processor: {str(e)}")
             return {"success": False, "message": str(e)}
 
-def cleanup_old_transactions():
+ARCHIVE_CHECKPOINT_ID = 'transaction_archive'
+
+def cleanup_old_transactions(retention_days=7, batch_size=500, max_batches=200):
     """
     Clean up old transactions that have been processed or failed.
     Moves them to an archive collection to keep the pending transactions collection small and efficient.
+    
+    Walks pending_transactions in _id order from a checkpoint, copying each
+    batch of completed/failed transactions older than ``retention_days`` into
+    transaction_archive with one insert_many and removing them with one
+    delete_many. The checkpoint (task_checkpoints) is saved after every batch,
+    so an interrupted run resumes where it stopped, and it is cleared at the
+    end of a full pass. Archive inserts are idempotent on original_id, so a
+    batch that was copied but not deleted is safe to repeat.
+    
+    Args:
+        retention_days: Age after processing before a transaction is archived
+        batch_size: Transactions per insert_many/delete_many
+        max_batches: Batches per invocation; the next run continues from the checkpoint
     """
     # Create a fresh app context for this thread/function
     app = create_app()
@@ -247,40 +282,57 @@ def cleanup_old_transactions():
     with app.app_context():
         # Get MongoDB database from the current app context
         from app import db
+        from pymongo.errors import BulkWriteError
         try:
-            # Import ObjectId for MongoDB ID handling
-            from bson.objectid import ObjectId
-            
-            # Find completed transactions older than 7 days
-            seven_days_ago = datetime.utcnow() - timedelta(days=7)
-            
-            old_txs = list(db.pending_transactions.find({
-                "status": {"$in": ["completed", "failed"]},
-                "processed_at": {"$lt": seven_days_ago}
-            }))
-            
-            if not old_txs:
-                return {"success": True, "message": "No old transactions to clean up"}
+            cutoff = datetime.utcnow() - timedelta(days=retention_days)
+            checkpoint = db.task_checkpoints.find_one({"_id": ARCHIVE_CHECKPOINT_ID}) or {}
+            last_id = checkpoint.get("last_id")
             
-            # Create archive records and delete old records
-            for tx in old_txs:
-                # Create archive record with current timestamp
-                archive_data = tx.copy()  # Copy all fields
-                archive_data["original_id"] = str(tx.get("_id"))  # Convert ObjectId to string
-                archive_data["archived_at"] = datetime.utcnow()
+            cleaned = 0
+            for _ in range(max_batches):
+                query = {
+                    "status": {"$in": ["completed", "failed"]},
+                    "processed_at": {"$lt": cutoff}
+                }
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
                 
-                # Remove _id to allow MongoDB to create a new one
-                if "_id" in archive_data:
-                    del archive_data["_id"]
+                batch = list(db.pending_transactions.find(query).sort("_id", 1).limit(batch_size))
+                if not batch:
+                    # Full pass done; the next run starts from the beginning
+                    db.task_checkpoints.delete_one({"_id": ARCHIVE_CHECKPOINT_ID})
+                    break
                 
-                # Insert into archive collection
-                db.transaction_archive.insert_one(archive_data)
+                archived_at = datetime.utcnow()
+                archive_docs = []
+                for tx in batch:
+                    archive_data = {k: v for k, v in tx.items() if k != "_id"}
+                    archive_data["original_id"] = str(tx["_id"])
+                    archive_data["archived_at"] = archived_at
+                    archive_docs.append(archive_data)
                 
-                # Delete the original
-                db.pending_transactions.delete_one({"_id": tx.get("_id")})
+                try:
+                    db.transaction_archive.insert_many(archive_docs, ordered=False)
+                except BulkWriteError as e:
+                    # Already archived by an interrupted run; anything else is a real failure
+                    if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                        raise
+                
+                db.pending_transactions.delete_many({"_id": {"$in": [tx["_id"] for tx in batch]}})
+                
+                last_id = batch[-1]["_id"]
+                db.task_checkpoints.update_one(
+                    {"_id": ARCHIVE_CHECKPOINT_ID},
+                    {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+                cleaned += len(batch)
+            
+            if not cleaned:
+                return {"success": True, "message": "No old transactions to clean up"}
             
-            logger.info(f"Cleaned up {len(old_txs)} old transactions")
-            return {"success": True, "cleaned": len(old_txs)}
+            logger.info(f"Cleaned up {cleaned} old transactions")
+            return {"success": True, "cleaned": cleaned}
             
         except Exception as e:
             logger.exception(f"Error in transaction cleanup: {str(e)}")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark: eventlet hub latency during a burst of concurrent logins
+
+Spawns N green threads that each verify a PIN (the expensive part of
+/api/auth/login) while a heartbeat green thread measures how late the hub
+wakes it up. Runs the burst twice: once hashing inline on the hub, once via
+app.services.pin_hash_service (eventlet tpool + bounded concurrency).
+
+    python benchmarks/pin_hash_hub_latency.py --logins 200
+"""
+import eventlet  # type: ignore
+eventlet.monkey_patch()
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.services import pin_hash_service
+
+HEARTBEAT_INTERVAL = 0.005
+
+
+def heartbeat(samples, stop):
+    """Record how late each wake-up is compared to the requested sleep"""
+    while not stop[0]:
+        started = time.perf_counter()
+        eventlet.sleep(HEARTBEAT_INTERVAL)
+        samples.append(time.perf_counter() - started - HEARTBEAT_INTERVAL)
+
+
+def run_burst(verify, stored_hash, logins):
+    samples, stop = [], [False]
+    monitor = eventlet.spawn(heartbeat, samples, stop)
+    eventlet.sleep(0)
+
+    started = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    for _ in range(logins):
+        pool.spawn(verify, stored_hash, '123456')
+    pool.waitall()
+    elapsed = time.perf_counter() - started
+
+    stop[0] = True
+    monitor.wait()
+    return elapsed, samples
+
+
+def report(label, elapsed, samples):
+    samples = sorted(samples) or [0.0]
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    print(f"{label:<10} total={elapsed:7.2f}s heartbeats={len(samples):5d} "
+          f"lag p50={pick(0.50):8.2f}ms p99={pick(0.99):8.2f}ms max={samples[-1] * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PIN hashing hub latency benchmark')
+    parser.add_argument('--logins', type=int, default=200, help='Concurrent logins in the burst')
+    args = parser.parse_args()
+
+    stored_hash = generate_password_hash('123456', method=pin_hash_service.PIN_HASH_METHOD)
+    print(f"{args.logins} concurrent logins, max concurrent hashes={pin_hash_service.MAX_CONCURRENT_HASHES}")
+
+    report('inline', *run_burst(check_password_hash, stored_hash, args.logins))
+    report('tpool', *run_burst(pin_hash_service.verify_pin, stored_hash, args.logins))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark: team-reward evaluation, per-user Python loop vs NumPy batch
+
+Builds N synthetic eligible users (5-12 active legs each, roughly half of
+them with balanced legs) and times the decision step of the nightly
+team-rewards job both ways. Database round trips are excluded; the old loop
+additionally paid two queries per user.
+
+    python benchmarks/team_rewards_eval.py --users 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.team_reward_evaluator import TeamRewardCandidates, evaluate_percentage_rewards
+
+REWARD_LEVELS = [
+    {"rank_level": level, "business_volume": volume, "reward_amount": amount}
+    for level, volume, amount in [
+        (1, 2000, 16.0), (2, 10000, 85.0), (3, 25000, 60.0), (4, 75000, 100.0),
+        (5, 300000, 300.0), (6, 1000000, 1000.0), (7, 4000000, 4000.0)
+    ]
+]
+
+
+def build_rows(users, seed=7):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(users):
+        legs = int(rng.integers(5, 13))
+        base = float(rng.uniform(500, 500000))
+        spread = 0.05 if rng.random() < 0.5 else 0.5
+        leg_volumes = (base * (1 + rng.uniform(-spread, spread, legs))).tolist()
+        rows.append((i, sum(leg_volumes), int(rng.integers(0, 4)), leg_volumes))
+    return rows
+
+
+def evaluate_loop(rows, reward_levels, percentage):
+    """The previous per-user logic from calculate_team_rewards, without the queries"""
+    decisions = []
+    for user_id, business_volume, current_rank, leg_volumes in rows:
+        if len(leg_volumes) < 5:
+            continue
+        avg_volume = sum(leg_volumes) / len(leg_volumes)
+        if not all(abs(volume - avg_volume) <= (avg_volume * 0.1) for volume in leg_volumes):
+            continue
+        reward_amount = business_volume * (percentage / 100)
+        rank_level = 1
+        reward_level = None
+        for level in sorted(reward_levels, key=lambda x: x.get('business_volume', 0), reverse=True):
+            if business_volume >= level.get('business_volume', 0):
+                reward_level = level
+                break
+        if reward_level:
+            rank_level = reward_level.get('rank_level', 1)
+            reward_amount = max(reward_amount, float(reward_level.get('reward_amount', 0)))
+        if reward_amount > 0:
+            decisions.append((user_id, rank_level, reward_amount))
+    return decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--percentage', type=float, default=2.5)
+    args = parser.parse_args()
+
+    rows = build_rows(args.users)
+
+    started = time.perf_counter()
+    expected = evaluate_loop(rows, REWARD_LEVELS, args.percentage)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    candidates = TeamRewardCandidates.from_rows(rows)
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    result = evaluate_percentage_rewards(candidates, REWARD_LEVELS, args.percentage)
+    eval_seconds = time.perf_counter() - started
+
+    pay = np.flatnonzero(result["pay"])
+    assert [candidates.user_ids[i] for i in pay] == [d[0] for d in expected], "payee mismatch"
+    assert np.array_equal(result["rank_level"][pay], [d[1] for d in expected]), "rank mismatch"
+    assert np.allclose(result["amount"][pay], [d[2] for d in expected]), "amount mismatch"
+
+    print(f"users: {args.users}, payees: {len(pay)}")
+    print(f"python loop:        {loop_seconds * 1000:8.1f} ms")
+    print(f"numpy (arrays):     {load_seconds * 1000:8.1f} ms  (building columns from rows)")
+    print(f"numpy (evaluate):   {eval_seconds * 1000:8.1f} ms  ({loop_seconds / eval_seconds:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.models import ledger
+from app.models.ledger import Ledger
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$lt" in condition and not (value is not None and value < condition["$lt"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def find(self, query, projection=None):
+        return [dict(doc) for doc in self.docs if _matches(doc, query)]
+
+    def find_one(self, query, projection=None):
+        return next(iter(self.find(query)), None)
+
+    def insert_one(self, doc):
+        if doc.get("entry_type") == "opening_balance" and any(
+            d.get("entry_type") == "opening_balance" and d["user_id"] == doc["user_id"] for d in self.docs
+        ):
+            raise DuplicateKeyError("opening_balance_per_user")
+        self.docs.append(dict(doc, _id=doc.get("_id", ObjectId())))
+
+    def update_one(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(update.get("$set", {}))
+                for field in update.get("$unset", {}):
+                    doc.pop(field, None)
+                return
+
+    def delete_one(self, query):
+        self.docs = [doc for doc in self.docs if not _matches(doc, query)]
+
+
+class FakeDb:
+    def __init__(self, users, entries):
+        self.users = FakeCollection(users)
+        self.collections = {Ledger.COLLECTION: FakeCollection(entries)}
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+def test_repair_commits_applied_and_deletes_unapplied_entries(monkeypatch):
+    user_id, applied_id, lost_id = ObjectId(), ObjectId(), ObjectId()
+    old = datetime.utcnow() - timedelta(minutes=10)
+    fake = FakeDb(
+        users=[{"_id": user_id, "ledger_recent": [
+            {"entry_id": applied_id, "balance_after_micros": 7000000, "opening_micros": 5000000}
+        ]}],
+        entries=[
+            {"_id": applied_id, "user_id": user_id, "entry_type": "deposit",
+             "amount_micros": 2000000, "status": "pending", "created_at": old},
+            {"_id": lost_id, "user_id": user_id, "entry_type": "deposit",
+             "amount_micros": 3000000, "status": "pending", "created_at": old},
+        ]
+    )
+    monkeypatch.setattr(ledger, "db", fake)
+
+    assert Ledger.repair_pending() == (1, 1)
+
+    entries = fake[Ledger.COLLECTION].docs
+    committed = next(e for e in entries if e["_id"] == applied_id)
+    assert "status" not in committed and committed["balance_after_micros"] == 7000000
+    assert all(e["_id"] != lost_id for e in entries)
+    assert [e["amount_micros"] for e in entries if e["entry_type"] == "opening_balance"] == [5000000]
+
+
+def test_repair_leaves_recent_pending_entries_alone(monkeypatch):
+    user_id, entry_id = ObjectId(), ObjectId()
+    fake = FakeDb(
+        users=[{"_id": user_id}],
+        entries=[{"_id": entry_id, "user_id": user_id, "entry_type": "deposit",
+                  "amount_micros": 1, "status": "pending", "created_at": datetime.utcnow()}]
+    )
+    monkeypatch.setattr(ledger, "db", fake)
+
+    assert Ledger.repair_pending() == (0, 0)
+    assert fake[Ledger.COLLECTION].docs[0]["status"] == "pending"
@@ -0,0 +1,22 @@
+from bson.objectid import ObjectId
+
+from app.services.referral_forest import ReferralForest
+
+
+def test_rowless_referrer_gets_a_root_node():
+    root, parent, child = ObjectId(), ObjectId(), ObjectId()
+    forest = ReferralForest.from_edges([parent, child], [root, parent])
+
+    r, p, c = forest.index_of(root), forest.index_of(parent), forest.index_of(child)
+    assert r >= 0
+    assert forest.parent[p] == r and forest.parent[c] == p
+    assert list(forest.depth[[r, p, c]]) == [0, 1, 2]
+    assert list(forest.level_histogram(2)[r]) == [1, 1]
+
+
+def test_values_from_sums_both_id_forms():
+    user = ObjectId()
+    forest = ReferralForest.from_edges([user], [None])
+
+    values = forest.values_from({user: 10.0, str(user): 5.0})
+    assert values[forest.index_of(user)] == 15.0
@@ -0,0 +1,88 @@
+from bson.objectid import ObjectId
+
+from app.models import team_counters
+from app.models.team_counters import TeamCounters
+
+
+class FakeReferralTree:
+    """referral_tree rows keyed by user_id, with $graphLookup emulated on exact id matches"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def _row(self, user_id):
+        return next((row for row in self.rows if row["user_id"] == user_id), None)
+
+    def aggregate(self, pipeline):
+        user_ids = pipeline[0]["$match"]["user_id"]["$in"]
+        start = next((row for row in self.rows if row["user_id"] in user_ids), None)
+        if start is None:
+            return []
+        upline = []
+        row = self._row(start.get("referrer_id"))
+        while row is not None:
+            upline.append(row)
+            row = self._row(row.get("referrer_id"))
+        return [{"referrer_id": start.get("referrer_id"), "upline": upline}]
+
+    def find_one(self, query, projection=None):
+        user_ids = query["user_id"]["$in"]
+        return next((row for row in self.rows if row["user_id"] in user_ids), None)
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.referral_tree = FakeReferralTree(rows)
+
+
+def test_upline_includes_root_without_referral_row(monkeypatch):
+    root, parent, child = ObjectId(), ObjectId(), ObjectId()
+    # The seeded root sponsor has no referral_tree row of its own
+    monkeypatch.setattr(team_counters, "db", FakeDb([
+        {"user_id": parent, "referrer_id": root},
+        {"user_id": child, "referrer_id": parent},
+    ]))
+
+    assert TeamCounters.get_upline(child) == [(parent, 1), (root, 2)]
+    assert TeamCounters.get_upline(parent) == [(root, 1)]
+
+
+def test_upline_follows_string_referrer_ids(monkeypatch):
+    root, parent, child = ObjectId(), ObjectId(), ObjectId()
+    monkeypatch.setattr(team_counters, "db", FakeDb([
+        {"user_id": parent, "referrer_id": str(root)},
+        {"user_id": child, "referrer_id": str(parent)},
+    ]))
+
+    assert TeamCounters.get_upline(str(child)) == [(parent, 1), (root, 2)]
+
+
+def test_upline_is_capped_at_requested_levels(monkeypatch):
+    ids = [ObjectId() for _ in range(5)]
+    monkeypatch.setattr(team_counters, "db", FakeDb([
+        {"user_id": ids[i], "referrer_id": ids[i - 1]} for i in range(1, 5)
+    ]))
+
+    assert TeamCounters.get_upline(ids[4], levels=2) == [(ids[3], 1), (ids[2], 2)]
+
+
+class FakeCounters:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find_one(self, query, projection=None):
+        return next((doc for doc in self.docs if all(doc.get(k) == v for k, v in query.items())), None)
+
+
+def test_counters_are_not_served_until_seeded(monkeypatch):
+    user_id = ObjectId()
+    docs = [{"user_id": user_id, "level_1": {"members": 2, "volume": 50.0}, "total_members": 2, "total_volume": 50.0}]
+    monkeypatch.setattr(team_counters, "db", {TeamCounters.COLLECTION: FakeCounters(docs)})
+    monkeypatch.setattr(TeamCounters, "_seeded", False)
+
+    assert TeamCounters.find_by_user_id(user_id) is None
+
+    docs.append({"_id": TeamCounters.STATE_ID})
+    summary = TeamCounters.find_by_user_id(str(user_id))
+    assert summary["total_members"] == 2
+    assert summary["levels"]["level_1"] == {"members": 2, "volume": 50.0}